@@ -0,0 +1,94 @@
+"""
+In-process stand-ins for the LLM server, the PlantUML JVM and pandoc,
+so the benchmarks measure our code only.
+"""
+
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from src.documenter import llm_cache, llm_client, output_backends, plantuml_renderer, render_cache, timing_history
+
+STUB_TEXT = (
+    "The architecture decomposes the system into cohesive services that communicate "
+    "through well defined interfaces. Each service owns its data and scales independently. "
+) * 4
+
+
+class StubResponse:
+    status_code = 200
+
+    def __init__(self, data: dict):
+        self._data = data
+        self.content = b""
+
+    def json(self):
+        return self._data
+
+
+class StubLLMClient:
+
+    def stream_chat(self, payload: dict, call_type: str):
+        for word in STUB_TEXT.split(" "):
+            yield word + " "
+
+    def chat(self, payload: dict, call_type: str):
+        return StubResponse({"choices": [{"message": {"content": STUB_TEXT}}]})
+
+    def completion(self, payload: dict, call_type: str):
+        return StubResponse({"choices": [{"text": '{"rules": []}'}]})
+
+    def close(self):
+        pass
+
+
+def _stub_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (255, 255, 255)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+_STUB_SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="64" height="48"/>'
+
+
+class StubRenderer:
+    backend = "plantuml"
+    version = "stub-renderer"
+
+    def __init__(self, output_format: str = "png"):
+        self.output_format = output_format
+        self._image = _STUB_SVG if output_format == "svg" else _stub_png()
+
+    def available(self) -> bool:
+        return True
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def render(self, source: str) -> bytes:
+        return self._image
+
+    def render_many(self, sources):
+        return [self._image for _ in sources]
+
+
+class StubPdfBackend(output_backends.PdfBackend):
+    """No pandoc / LaTeX: the benchmark measures the pipeline, not TeX."""
+
+    async def render(self, docs_dir: Path, output_md: Path) -> bool:
+        return True
+
+
+def install_stubs(work_dir: Path):
+    """Replaces the process-wide singletons; caches and timings live in work_dir (LLM lookups always miss)."""
+    llm_client._client = StubLLMClient()
+    llm_cache._cache = llm_cache.LLMResponseCache(work_dir / "llm", refresh=True)
+    render_cache._cache = render_cache.RenderCache(work_dir / "renders")
+    timing_history._history = timing_history.TimingHistory(work_dir / "timings.json")
+    for fmt in ("png", "svg"):
+        plantuml_renderer._renderers[fmt] = StubRenderer(fmt)
+    output_backends.BACKENDS["pdf"] = StubPdfBackend()
@@ -0,0 +1,225 @@
+"""
+Benchmark suite on synthetic architectures.
+
+    python -m benchmarks.suite                          # run, print table
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+
+Times model parsing, every generate_*_diagram function,
+analyze_sequence_structural, validate_diagram, the native renderer on
+one (bounded) diagram part, build_document_bundle and the dry-run planner with stubbed
+LLM, PlantUML renderer and pandoc. --compare exits with status 1 when
+a benchmark is slower than the baseline by more than --threshold.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.stubs import install_stubs
+from benchmarks.synthetic import MAX_CONNECTORS, synthetic_input
+
+from src.documenter.build_manifest import MANIFEST_NAME, BuildManifest
+from src.documenter.cost_planner import plan_architecture
+from src.documenter.document_builder import build_document_bundle
+from src.documenter.kb_loader import KnowledgeBase
+from src.documenter.models import ArchitectureModel
+from src.documenter.native_renderer import render_native
+from src.documenter.planner import create_documentation_plan
+from src.documenter.structural_analyzer import analyze_sequence_structural, validate_diagram
+from src.documenter.uml_generator import (
+    generate_component_diagram,
+    generate_context_diagram,
+    generate_deployment_diagram,
+    generate_security_diagram,
+    generate_sequence_diagram,
+)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+KB_PATH = BASE_DIR / "data" / "kb" / "documentation_rules.json"
+
+DEFAULT_SIZES = (10, 1000, 10000, 50000)
+CONNECTORS_PER_COMPONENT = 4
+
+# Sotto questa durata le differenze sono rumore
+MIN_COMPARABLE_SECONDS = 0.005
+
+
+def _timed(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_size(components: int, repeat: int, seed: int, work_dir: Path) -> dict:
+    connectors = min(components * CONNECTORS_PER_COMPONENT, MAX_CONNECTORS)
+    data = synthetic_input(components, connectors, seed)
+    architecture = data["architectural_views"][0]
+
+    with open(KB_PATH, "r", encoding="utf-8") as f:
+        kb = KnowledgeBase(json.load(f), KB_PATH)
+
+    out = work_dir / f"size_{components}"
+    diagrams = out / "docs" / "generated" / "diagrams"
+    diagrams.mkdir(parents=True, exist_ok=True)
+
+    results = {"parse_model": _timed(lambda: ArchitectureModel(architecture), repeat)}
+    model = ArchitectureModel(architecture)
+
+    generators = {
+        "generate_component_diagram": generate_component_diagram,
+        "generate_deployment_diagram": generate_deployment_diagram,
+        "generate_context_diagram": generate_context_diagram,
+        "generate_security_diagram": generate_security_diagram,
+    }
+    for name, fn in generators.items():
+        target = diagrams / f"{name[len('generate_'):]}.puml"
+        results[name] = _timed(lambda: fn(model, target), repeat)
+
+    # parti limitate da layout_rules.max_components_per_view (cartella a parte:
+    # il bundle qui sotto resta confrontabile con le baseline precedenti)
+    max_components = kb.max_components_per_view()
+    partitioned = out / "partitioned"
+    for name in ("generate_component_diagram", "generate_deployment_diagram"):
+        fn = generators[name]
+        target = partitioned / f"{name[len('generate_'):]}.puml"
+        results[f"{name}_partitioned"] = _timed(lambda: fn(model, target, max_components), repeat)
+
+    # renderer senza JVM su una parte (dimensione limitata da max_components)
+    part = partitioned / "component_diagram_part_1.puml"
+    part_source = (part if part.exists() else partitioned / "component_diagram.puml").read_text(encoding="utf-8")
+    for fmt in ("svg", "png"):
+        results[f"render_native_{fmt}"] = _timed(lambda: render_native(part_source, fmt), repeat)
+
+    sequence_path = diagrams / "sequence_diagram.puml"
+    results["generate_sequence_diagram"] = _timed(
+        lambda: generate_sequence_diagram(model, sequence_path, rules=["require_user_actor"]), repeat
+    )
+
+    sequence_source = sequence_path.read_text(encoding="utf-8")
+    quality_rules = kb.quality_rules_for("sequence_diagram")
+    results["analyze_sequence_structural"] = _timed(
+        lambda: analyze_sequence_structural(sequence_source), repeat
+    )
+    # la pipeline analizza l'IR del generatore, senza riparsare il .puml
+    sequence_ir = generate_sequence_diagram(model, sequence_path, rules=["require_user_actor"])
+    results["analyze_sequence_structural_ir"] = _timed(
+        lambda: analyze_sequence_structural(sequence_ir), repeat
+    )
+    results["validate_diagram_sequence"] = _timed(
+        lambda: validate_diagram(sequence_ir, quality_rules), repeat
+    )
+
+    plan = create_documentation_plan(model)
+    results["build_document_bundle"] = _timed(
+        lambda: build_document_bundle(out, plan, model, kb, data), repeat
+    )
+
+    # il planner gira anche nello stage `plan` di ogni run
+    manifest = BuildManifest(out / MANIFEST_NAME)
+    results["plan_architecture"] = _timed(
+        lambda: plan_architecture(out, kb, model, data, manifest, ("md", "pdf")), repeat
+    )
+
+    return {
+        "components": components,
+        "connectors": connectors,
+        "seconds": results,
+    }
+
+
+def run_suite(sizes, repeat: int, seed: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="documenter-bench-") as tmp:
+        work_dir = Path(tmp)
+        install_stubs(work_dir)
+
+        runs = {}
+        for components in sizes:
+            print(f"[BENCH] {components} components ...", flush=True)
+            runs[str(components)] = run_size(components, repeat, seed, work_dir)
+
+    return {
+        "seed": seed,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "runs": runs,
+    }
+
+
+def print_results(report: dict):
+    for size, run in report["runs"].items():
+        print(f"\n{size} components / {run['connectors']} connectors")
+        for name, seconds in run["seconds"].items():
+            print(f"  {name:<40} {seconds * 1000:>10.1f} ms")
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Benchmarks slower than baseline * (1 + threshold)."""
+    regressions = []
+    print(f"\n{'size':>7} {'benchmark':<40} {'baseline ms':>12} {'current ms':>11} {'ratio':>7}")
+    for size, run in report["runs"].items():
+        base_run = baseline.get("runs", {}).get(size)
+        if base_run is None:
+            continue
+        for name, seconds in run["seconds"].items():
+            base = base_run["seconds"].get(name)
+            if base is None:
+                continue
+            ratio = seconds / base if base > 0 else float("inf")
+            flag = ""
+            if seconds >= MIN_COMPARABLE_SECONDS and ratio > 1 + threshold:
+                flag = "  REGRESSION"
+                regressions.append((size, name, base, seconds))
+            print(f"{size:>7} {name:<40} {base * 1000:>12.1f} {seconds * 1000:>11.1f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Documenter benchmark suite.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES),
+                        help="Component counts (connectors = 4x, max 200k).")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", type=Path, help="Write the results as a JSON baseline.")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown before flagging a regression (0.25 = +25%%).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run_suite(args.sizes, args.repeat, args.seed)
+    print_results(report)
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[BENCH] Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n[BENCH] {len(regressions)} regression(s) over +{args.threshold:.0%}")
+            return 1
+        print("\n[BENCH] No regressions.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
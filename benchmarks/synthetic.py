@@ -0,0 +1,151 @@
+"""
+Seeded generator of synthetic architecture inputs.
+
+The output follows the schema of data/input/finalArchitecture.json
+(architectural_views, architecture_evaluation, drivers, scenarios, ...),
+so it can be fed to the model, the generators and the document builder.
+"""
+
+import json
+import random
+from pathlib import Path
+
+DOMAINS = ("Catalog", "Cart", "Order", "Payment", "Shipping", "User", "Search",
+           "Inventory", "Billing", "Notification", "Review", "Pricing")
+KINDS = ("Service", "Adapter", "Gateway", "Worker", "Store", "API")
+CONNECTOR_TYPES = ("REST", "gRPC", "async event", "database access", "space read/write")
+QUALITY_ATTRIBUTES = ("Performance", "Availability", "Scalability", "Security", "Maintainability")
+
+MAX_CONNECTORS = 200_000
+
+
+def _component_id(i: int) -> str:
+    return f"{DOMAINS[i % len(DOMAINS)]} {KINDS[(i // len(DOMAINS)) % len(KINDS)]} {i}"
+
+
+def synthetic_architecture(architecture_id: str, components: int, connectors: int,
+                           rng: random.Random) -> dict:
+    ids = [_component_id(i) for i in range(components)]
+
+    component_list = [
+        {
+            "id": cid,
+            "responsibilities": [f"Handle {cid.lower()} requests", f"Own {cid.lower()} data"],
+            "interfaces": {
+                "provided": [{"name": f"{cid} API", "protocol": "REST"}],
+                "required": [],
+            },
+        }
+        for cid in ids
+    ]
+
+    connector_list = []
+    for _ in range(min(connectors, MAX_CONNECTORS)):
+        source = rng.choice(ids)
+        connector = {"source": source, "type": rng.choice(CONNECTOR_TYPES)}
+        # ~1% di connettori incompleti, come negli input reali
+        if rng.random() >= 0.01:
+            connector["target"] = rng.choice(ids)
+        connector_list.append(connector)
+
+    node_count = max(1, int(components ** 0.5))
+    nodes = [f"Node {n}" for n in range(node_count)]
+
+    scenarios = [
+        {
+            "name": f"Scenario {s}",
+            "description": f"User interacts with {rng.choice(ids)} and {rng.choice(ids)}.",
+        }
+        for s in range(min(1000, max(1, components // 10)))
+    ]
+
+    boundaries = [f"{nodes[b]} to {nodes[(b + 1) % node_count]}" for b in range(min(node_count, 500))]
+
+    return {
+        "architecture_id": architecture_id,
+        "name": architecture_id,
+        "views": {
+            "context_view": {
+                "actors": ["End Users", "Payment Providers", "Shipping Providers"],
+                "external_systems": [f"External System {e}" for e in range(min(20, components))],
+            },
+            "logical_view": {
+                "components": component_list,
+                "connectors": connector_list,
+            },
+            "runtime_view": {"scenarios": scenarios},
+            "deployment_view": {
+                "nodes": nodes,
+                "component_mapping": {cid: rng.choice(nodes) for cid in ids},
+            },
+            "security_view": {
+                "trust_boundaries": boundaries,
+                "threats": ["Unauthorized access", "Data breaches", "Denial of service"],
+                "countermeasures": ["Authentication", "Encryption in transit and at rest", "Rate limiting"],
+            },
+        },
+    }
+
+
+def synthetic_input(components: int, connectors: int, seed: int = 42,
+                    architecture_id: str = "Synthetic Architecture") -> dict:
+    """Complete input document with one synthetic architecture."""
+    rng = random.Random(seed)
+    drivers = [
+        {
+            "id": f"FD-{d:02d}",
+            "description": f"The system shall satisfy requirement {d}.",
+            "priority": rng.choice(("high", "medium", "low")),
+            "rationale": "Synthetic driver",
+            "standard": "IEEE 1016, ADD",
+        }
+        for d in range(1, 21)
+    ]
+
+    return {
+        "architectural_drivers": drivers,
+        "quality_attribute_scenarios": [
+            {
+                "attribute": attribute,
+                "priority": "high",
+                "source": f"RNF-{i:02d}",
+                "stimulus": "Peak load",
+                "environment": "Production",
+                "artifact": "System",
+                "response": "Requests are served",
+                "measure": "p95 latency",
+                "standard": "QAW (SEI), ISO/IEC 25010",
+            }
+            for i, attribute in enumerate(QUALITY_ATTRIBUTES, start=1)
+        ],
+        "constraints": ["Technology Stack: Open-source", "Budget: limited"],
+        "stakeholders": ["End Users", "Developers", "Operations"],
+        "architectural_views": [
+            synthetic_architecture(architecture_id, components, connectors, rng)
+        ],
+        "architecture_evaluation": [
+            {
+                "architecture_id": architecture_id,
+                "name": architecture_id,
+                "driver_coverage": [
+                    {"driver_id": d["id"], "description": d["description"],
+                     "satisfied": "yes", "rationale": "Synthetic"}
+                    for d in drivers
+                ],
+                "quality_attribute_tradeoffs": [
+                    {"attributes_involved": ["Performance", "Security"],
+                     "tradeoff_description": "Encryption adds latency", "impact": "medium"}
+                ],
+                "risks_and_limitations": [{"description": "Synthetic risk", "severity": "low"}],
+                "recommended_refinements": [{"description": "Synthetic refinement", "driver_ids": ["FD-01"]}],
+            }
+        ],
+    }
+
+
+def write_synthetic_input(path: Path, components: int, connectors: int, seed: int = 42) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(synthetic_input(components, connectors, seed), f)
+    return path
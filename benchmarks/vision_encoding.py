@@ -0,0 +1,81 @@
+"""
+Encode time and payload size per diagram for each Vision image encoding.
+
+    python -m benchmarks.vision_encoding [images or .puml ...] [--repeat N]
+
+Without arguments the PNGs in docs/generated/diagrams are used.
+`.puml` sources are rendered in memory at the Vision resolution
+(requires the PlantUML jar and java).
+"""
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from src.documenter.vision_analyzer import (
+    DEFAULT_MAX_SIZE,
+    DEFAULT_QUALITY,
+    ENCODINGS,
+    encode_image_bytes,
+)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_DIAGRAMS = BASE_DIR / "docs" / "generated" / "diagrams"
+
+
+def load_images(paths):
+    images = {}
+    for path in paths:
+        if path.suffix == ".puml":
+            from src.documenter.uml_generator import render_for_vision
+            images[path.name] = render_for_vision(path.read_text(encoding="utf-8"))
+        else:
+            images[path.name] = path.read_bytes()
+    return images
+
+
+def bench_encoding(image: bytes, encoding: str, quality: int, max_size: int, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, payload = encode_image_bytes(image, max_size, encoding, quality)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(payload)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark Vision image encodings.")
+    parser.add_argument("images", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY)
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_SIZE)
+    parser.add_argument("--encodings", nargs="+", default=list(ENCODINGS), choices=list(ENCODINGS))
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    paths = args.images or sorted(DEFAULT_DIAGRAMS.glob("*.png"))
+    if not paths:
+        raise SystemExit("No diagrams to benchmark.")
+
+    images = load_images(paths)
+
+    print(f"{'diagram':<28} {'encoding':<14} {'encode ms':>10} {'payload KB':>11}")
+    totals = {encoding: [0.0, 0] for encoding in args.encodings}
+
+    for name, image in images.items():
+        for encoding in args.encodings:
+            seconds, size = bench_encoding(image, encoding, args.quality, args.max_size, args.repeat)
+            totals[encoding][0] += seconds
+            totals[encoding][1] += size
+            print(f"{name:<28} {encoding:<14} {seconds * 1000:>10.1f} {size / 1024:>11.1f}")
+
+    print()
+    for encoding, (seconds, size) in totals.items():
+        print(f"{'TOTAL':<28} {encoding:<14} {seconds * 1000:>10.1f} {size / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
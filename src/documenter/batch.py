@@ -0,0 +1,268 @@
+import os
+import re
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from src.documenter.cost_planner import WorkItem, critical_path, dedupe, estimated_seconds, work_counts
+from src.documenter.kb_loader import load_knowledge_base
+from src.documenter.llm_cache import get_llm_cache
+from src.documenter.llm_client import get_llm_client
+from src.documenter.input_index import ArchitectureInput
+from src.documenter.main import list_architecture_ids, plan_documentation, run_documentation
+from src.documenter.output_backends import DEFAULT_FORMATS, image_formats
+from src.documenter.plantuml_renderer import get_renderer, set_renderer_backend
+from src.documenter.render_cache import get_render_cache
+from src.documenter.tracing import enable_tracing, get_tracer
+
+
+# Stato per processo worker: risorse calde riusate da tutti i task
+_worker_state: Dict = {}
+
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_").lower() or "unnamed"
+
+
+def _init_worker(kb_path: Path, refresh_llm: bool, trace: bool = False,
+                 formats: Sequence[str] = DEFAULT_FORMATS, renderer: str = "auto"):
+    """Warms the per-process resources once: HTTP pool, caches, renderer, KB."""
+    if trace:
+        enable_tracing()
+    set_renderer_backend(renderer)
+
+    get_llm_client()
+    get_render_cache()
+    get_llm_cache().refresh = refresh_llm
+
+    try:
+        for fmt in image_formats(formats):
+            get_renderer(fmt).start()
+    except Exception as e:
+        print(f"[WARNING] PlantUML renderer not available: {e}")
+
+    _worker_state["kb"] = load_knowledge_base(kb_path)
+    _worker_state["inputs"] = {}
+
+
+def _load_input(input_path: Path) -> ArchitectureInput:
+    inputs = _worker_state.setdefault("inputs", {})
+    if input_path not in inputs:
+        inputs[input_path] = ArchitectureInput(input_path)
+    return inputs[input_path]
+
+
+def _cache_counters() -> Dict[str, int]:
+    render_cache = get_render_cache()
+    llm_cache = get_llm_cache()
+    return {
+        "render_hits": render_cache.hits,
+        "render_misses": render_cache.misses,
+        "llm_hits": llm_cache.hits,
+        "llm_misses": llm_cache.misses,
+    }
+
+
+def _document_one(task: dict) -> dict:
+    start = time.perf_counter()
+    before = _cache_counters()
+    tracer = get_tracer()
+
+    result = {
+        "input": str(task["input_path"]),
+        "architecture_id": task["architecture_id"],
+        "output_dir": str(task["docs_dir"]),
+        "ok": True,
+        "error": None,
+    }
+
+    try:
+        run_documentation(
+            task["docs_dir"],
+            task["kb_path"],
+            task["input_path"],
+            task["architecture_id"],
+            jobs=task["jobs"],
+            kb=_worker_state.get("kb"),
+            architecture_data=_load_input(task["input_path"]),
+            rebuild_all=task["rebuild_all"],
+            formats=task["formats"],
+        )
+    except Exception as e:
+        traceback.print_exc()
+        result["ok"] = False
+        result["error"] = str(e)
+
+    after = _cache_counters()
+    result["seconds"] = time.perf_counter() - start
+    result["counters"] = {k: after[k] - before[k] for k in after}
+    if tracer is not None:
+        result["trace_events"] = tracer.drain()
+    return result
+
+
+def plan_batch(docs_root: Path, kb_path: Path, input_paths: Sequence[Path],
+               architecture_ids: Optional[Sequence[str]], jobs: int,
+               rebuild_all: bool = False,
+               formats: Sequence[str] = DEFAULT_FORMATS) -> List[dict]:
+    """One task per (input, architecture); no ids means every architecture of the input."""
+    tasks = []
+    for input_path in input_paths:
+        input_path = Path(input_path)
+        ids = list(architecture_ids or list_architecture_ids(ArchitectureInput(input_path)))
+
+        for architecture_id in ids:
+            tasks.append({
+                "input_path": input_path,
+                "architecture_id": architecture_id,
+                "docs_dir": docs_root / slugify(input_path.stem) / slugify(architecture_id),
+                "kb_path": kb_path,
+                "jobs": jobs,
+                "rebuild_all": rebuild_all,
+                "formats": list(formats),
+            })
+    return tasks
+
+
+def estimate_batch(tasks: List[dict], kb_path: Path) -> List[List[WorkItem]]:
+    """
+    Dry-run work list of every task. Work repeated across architectures
+    (same diagram, same prompt) is counted once: the caches serve the rest.
+    """
+    kb = load_knowledge_base(kb_path)
+    inputs: Dict[Path, ArchitectureInput] = {}
+    plans = []
+    for task in tasks:
+        input_path = task["input_path"]
+        if input_path not in inputs:
+            inputs[input_path] = ArchitectureInput(input_path)
+        try:
+            items = plan_documentation(
+                task["docs_dir"], kb_path, input_path, task["architecture_id"],
+                kb=kb, architecture_data=inputs[input_path],
+                rebuild_all=task["rebuild_all"], formats=task["formats"],
+            )
+        except Exception as e:
+            print(f"[WARNING] Cannot plan {task['architecture_id']}: {e}")
+            items = []
+        plans.append(items)
+
+    dedupe([item for items in plans for item in items])
+    return plans
+
+
+def lpt_makespan(costs: Sequence[float], workers: int) -> float:
+    """Wall time of longest-first scheduling: each task goes to the least loaded worker."""
+    loads = [0.0] * max(1, workers)
+    for cost in sorted(costs, reverse=True):
+        i = loads.index(min(loads))
+        loads[i] += cost
+    return max(loads)
+
+
+def print_batch_plan(tasks: List[dict], plans: List[List[WorkItem]], workers: int):
+    print("\n[BATCH PLAN]")
+    totals = {"jvm": 0, "llm": 0, "vision": 0, "pandoc": 0}
+    for task, items in zip(tasks, plans):
+        counts = work_counts(items)
+        for k, v in counts.items():
+            totals[k] += v
+        to_run = sum(1 for i in items if i.state == "run")
+        print(f"- {task['architecture_id']} [{Path(task['input_path']).name}]: "
+              f"{to_run}/{len(items)} work items to run, ~{task['estimate']:.1f} s "
+              f"(critical path {critical_path(items)[0]:.1f} s), "
+              f"{counts['llm']} LLM call(s)")
+
+    duplicates = sum(1 for items in plans for i in items if i.state == "duplicate")
+    print(f"Shared work counted once: {duplicates} item(s)")
+    # una JVM calda per formato in ogni worker
+    print(f"JVM launches: up to {min(totals['jvm'], workers * len(image_formats(tasks[0]['formats'])))} | "
+          f"LLM calls: {totals['llm']} | Vision calls: up to {totals['vision']} | "
+          f"pandoc runs: {totals['pandoc']}")
+    print(f"Estimated wall time: ~{lpt_makespan([t['estimate'] for t in tasks], workers):.1f} s "
+          f"with {workers} worker(s), longest documents first")
+
+
+def print_batch_summary(results: List[dict], wall_seconds: float):
+    ok = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+    per_minute = len(ok) / wall_seconds * 60 if wall_seconds > 0 else 0.0
+
+    print("\n[BATCH SUMMARY]")
+    print(f"Documents: {len(ok)} ok, {len(failed)} failed")
+    print(f"Wall time: {wall_seconds:.1f} s - throughput {per_minute:.1f} docs/min")
+
+    for r in results:
+        status = "ok" if r["ok"] else f"FAILED ({r['error']})"
+        print(f"- {r['architecture_id']} [{Path(r['input']).name}]: "
+              f"{r['seconds']:.1f} s, {status} -> {r['output_dir']}")
+
+    totals = {}
+    for r in results:
+        for k, v in r["counters"].items():
+            totals[k] = totals.get(k, 0) + v
+
+    print(f"[RENDER CACHE] hits={totals.get('render_hits', 0)} "
+          f"misses={totals.get('render_misses', 0)}")
+    print(f"[LLM CACHE] hits={totals.get('llm_hits', 0)} "
+          f"misses={totals.get('llm_misses', 0)}")
+
+
+def run_batch(docs_root: Path, kb_path: Path, input_paths: Sequence[Path],
+              architecture_ids: Optional[Sequence[str]] = None,
+              workers: Optional[int] = None, jobs: int = 1,
+              refresh_llm: bool = False, rebuild_all: bool = False,
+              trace: bool = False,
+              formats: Sequence[str] = DEFAULT_FORMATS,
+              renderer: str = "auto",
+              plan_only: bool = False) -> List[dict]:
+    """
+    Documents many architectures from many input files.
+    Tasks are fanned out over a process pool; every worker keeps its own
+    warm renderer, HTTP pool, caches and KB for all the tasks it runs.
+    Tasks start longest estimated first, so the short ones fill the
+    workers at the end. `plan_only` prints the plan and runs nothing.
+    """
+    tasks = plan_batch(docs_root, kb_path, input_paths, architecture_ids, jobs, rebuild_all, formats)
+    if not tasks:
+        print("[BATCH] Nothing to document.")
+        return []
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+
+    # le stime usano lo stesso renderer dei worker
+    set_renderer_backend(renderer)
+    get_llm_cache().refresh = refresh_llm
+    plans = estimate_batch(tasks, kb_path)
+    for task, items in zip(tasks, plans):
+        task["estimate"] = estimated_seconds(items, jobs)
+
+    if plan_only:
+        print_batch_plan(tasks, plans, workers)
+        return []
+
+    tasks.sort(key=lambda t: t["estimate"], reverse=True)
+    print(f"\n[BATCH] {len(tasks)} architectures, {workers} worker(s)")
+
+    start = time.perf_counter()
+
+    if workers == 1:
+        _init_worker(kb_path, refresh_llm, trace, formats, renderer)
+        results = [_document_one(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(kb_path, refresh_llm, trace, formats, renderer),
+        ) as pool:
+            results = list(pool.map(_document_one, tasks))
+
+    tracer = get_tracer()
+    if tracer is not None:
+        for r in results:
+            tracer.merge(r.pop("trace_events", []))
+
+    print_batch_summary(results, time.perf_counter() - start)
+    return results
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from src.documenter.plantuml_renderer import renderer_fingerprint
+
+
+SOURCE_DIR = Path(__file__).resolve().parent
+
+MANIFEST_NAME = ".build_manifest.json"
+
+
+# =========================
+# FINGERPRINTS
+# =========================
+
+def fingerprint(value) -> str:
+    """Stable hash of a JSON-like value."""
+    text = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+_code_fingerprints: Dict[str, str] = {}
+_code_lock = threading.Lock()
+
+
+def code_fingerprint(*module_files: str) -> str:
+    """Hash of the generator source files an artifact depends on."""
+    with _code_lock:
+        parts = []
+        for name in module_files:
+            if name not in _code_fingerprints:
+                _code_fingerprints[name] = file_fingerprint(SOURCE_DIR / name) or ""
+            parts.append(f"{name}:{_code_fingerprints[name]}")
+        return fingerprint(parts)
+
+
+# =========================
+# INPUT SLICES PER ARTIFACT
+# =========================
+
+def _logical_view_slices(model) -> dict:
+    logical_view = model.get_view("logical_view")
+    return {
+        "logical_view.components": logical_view.get("components", []),
+        "logical_view.connectors": logical_view.get("connectors", []),
+    }
+
+
+def _learned_rules_for(kb, diagram_type: str) -> dict:
+    return {
+        name: info
+        for name, info in kb.learned_rules.items()
+        if info.get("diagram_type") == diagram_type
+    }
+
+
+# Sezioni di input lette da ciascun generatore
+DIAGRAM_INPUTS = {
+    "component_diagram": lambda model, kb: {
+        **_logical_view_slices(model),
+        "kb.layout_rules.max_components_per_view": kb.max_components_per_view(),
+    },
+    "deployment_diagram": lambda model, kb: {
+        "deployment_view": model.get_view("deployment_view"),
+        "kb.layout_rules.max_components_per_view": kb.max_components_per_view(),
+    },
+    "context_diagram": lambda model, kb: {
+        "architecture_id": model.id,
+    },
+    "security_diagram": lambda model, kb: {},
+    "sequence_diagram": lambda model, kb: {
+        **_logical_view_slices(model),
+        "kb.learned_rules.sequence_diagram": _learned_rules_for(kb, "sequence_diagram"),
+        "kb.diagram_quality_rules.sequence_diagram": kb.quality_rules_for("sequence_diagram"),
+    },
+}
+
+# Codice che produce ciascun diagramma
+DIAGRAM_CODE = {
+    "component_diagram": ("uml_generator.py", "diagram_ir.py", "models.py", "partitioning.py"),
+    "deployment_diagram": ("uml_generator.py", "diagram_ir.py", "models.py", "partitioning.py"),
+    "context_diagram": ("uml_generator.py", "diagram_ir.py", "models.py"),
+    "security_diagram": ("uml_generator.py", "diagram_ir.py"),
+    "sequence_diagram": (
+        "uml_generator.py",
+        "diagram_ir.py",
+        "models.py",
+        "structural_analyzer.py",
+        "plantuml_parser.py",
+        "vision_rule_extractor.py",
+        "kb_updater.py",
+        "main.py",
+    ),
+}
+
+
+def diagram_dependencies(diagram_type: str, model, kb) -> Dict[str, str]:
+    slices = DIAGRAM_INPUTS.get(diagram_type, lambda m, k: {})(model, kb)
+    deps = {name: fingerprint(value) for name, value in slices.items()}
+    deps["code"] = code_fingerprint(*DIAGRAM_CODE.get(diagram_type, ("uml_generator.py", "diagram_ir.py")))
+    # PlantUML o renderer nativo: cambiare backend rigenera le immagini
+    deps["renderer"] = renderer_fingerprint()
+    return deps
+
+
+def description_dependencies(prompt: str, model_name: str, params: dict) -> Dict[str, str]:
+    # il prompt contiene già id, view, componenti e prime 12 relazioni
+    return {
+        "prompt": fingerprint(prompt),
+        "llm": fingerprint({"model": model_name, "params": params}),
+        "code": code_fingerprint("lm_integration.py"),
+    }
+
+
+def document_dependencies(plan, model, kb, full_input, ordered_views: List[str],
+                          diagram_available: Dict[str, bool],
+                          descriptions: Dict[str, str],
+                          diagram_images: Optional[Dict[str, List[str]]] = None) -> Dict[str, str]:
+    """
+    Input slices read by each section of the document. `descriptions` holds
+    only the descriptions that were actually produced (view -> text): a view
+    whose description failed is missing, so the document is rebuilt once it succeeds.
+    """
+    selected_eval = None
+    for e in full_input.get("architecture_evaluation", []):
+        if e.get("architecture_id") == model.id:
+            selected_eval = e
+            break
+
+    slices = {
+        "section1.architecture_id": model.id,
+        "section2.architectural_drivers": full_input.get("architectural_drivers", []),
+        "section3.quality_attribute_scenarios": full_input.get("quality_attribute_scenarios", []),
+        "section4.constraints": full_input.get("constraints", []),
+        "section4.stakeholders": full_input.get("stakeholders", []),
+        "section5.architecture_evaluation": selected_eval,
+        "section8.views": [
+            [view, kb.view_to_diagram_mapping.get(view), bool(diagram_available.get(view))]
+            for view in ordered_views
+        ],
+        "section8.images": diagram_images or {},
+        "section8.descriptions": descriptions,
+    }
+
+    deps = {name: fingerprint(value) for name, value in slices.items()}
+    deps["code"] = code_fingerprint("document_builder.py")
+    return deps
+
+
+def output_dependencies(output_md: Path, image_paths: Iterable[Path],
+                        code_files: Iterable[str] = ("output_backends.py",)) -> Dict[str, str]:
+    """Inputs of an output format: the markdown, the images it embeds, the backend code."""
+    deps = {"markdown": file_fingerprint(output_md) or ""}
+    for image in sorted(image_paths):
+        deps[f"image:{image.name}"] = file_fingerprint(image) or ""
+    deps["code"] = code_fingerprint(*code_files)
+    return deps
+
+
+# =========================
+# MANIFEST
+# =========================
+
+class BuildManifest:
+    """
+    Records, for every artifact, the fingerprints of the inputs it read
+    and the files it produced. An artifact is fresh when its current
+    dependencies match the recorded ones and all its outputs still exist.
+    """
+
+    def __init__(self, path: Path, force: bool = False):
+        self.path = Path(path)
+        self.force = force
+        self.artifacts: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self.force or not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.artifacts = json.load(f).get("artifacts", {})
+        except (ValueError, OSError):
+            self.artifacts = {}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = {"artifacts": self.artifacts}
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def changed_dependencies(self, artifact: str, deps: Dict[str, str]) -> List[str]:
+        with self._lock:
+            entry = self.artifacts.get(artifact)
+        if self.force or entry is None:
+            return ["<new>"]
+        recorded = entry.get("deps", {})
+        return sorted(k for k in set(recorded) | set(deps) if recorded.get(k) != deps.get(k))
+
+    def is_fresh(self, artifact: str, deps: Dict[str, str], verbose: bool = True) -> bool:
+        """`verbose=False` checks without logging (the dry-run planner asks about every artifact)."""
+        changed = self.changed_dependencies(artifact, deps)
+        if changed:
+            if verbose:
+                print(f"[INCREMENTAL] rebuild {artifact}: {', '.join(changed)}")
+            return False
+
+        with self._lock:
+            outputs = self.artifacts[artifact].get("outputs", [])
+        missing = [o for o in outputs if not (self.path.parent / o).exists()]
+        if missing:
+            if verbose:
+                print(f"[INCREMENTAL] rebuild {artifact}: missing outputs")
+            return False
+
+        if verbose:
+            print(f"[INCREMENTAL] up to date: {artifact}")
+        return True
+
+    def result(self, artifact: str):
+        with self._lock:
+            return self.artifacts.get(artifact, {}).get("result")
+
+    def record(self, artifact: str, deps: Dict[str, str],
+               outputs: Iterable[Path] = (), result=None):
+        entry = {
+            "deps": deps,
+            "outputs": [os.path.relpath(o, self.path.parent) for o in outputs],
+        }
+        if result is not None:
+            entry["result"] = result
+        with self._lock:
+            self.artifacts[artifact] = entry
@@ -0,0 +1,351 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.documenter.build_manifest import (
+    DIAGRAM_INPUTS,
+    description_dependencies,
+    diagram_dependencies,
+    document_dependencies,
+    fingerprint,
+)
+from src.documenter.document_builder import FIXED_VIEW_ORDER, ordered_plan_views
+from src.documenter.llm_cache import get_llm_cache
+from src.documenter.lm_integration import DEFAULT_MODEL, DESCRIPTION_PARAMS, build_description_prompt
+from src.documenter.output_backends import BACKENDS, image_formats
+from src.documenter.planner import create_documentation_plan
+from src.documenter.plantuml_renderer import get_renderer
+from src.documenter.render_cache import get_render_cache
+from src.documenter.timing_history import TimingHistory, get_timing_history
+from src.documenter.uml_generator import RULE_DRIVEN_DIAGRAM_TYPES, diagram_files, render_work_class
+
+
+# Stato previsto di un work item:
+# run = da eseguire, fresh = manifest aggiornato, cached = risultato già in cache,
+# duplicate = lavoro identico a un altro item del piano (lo paga solo il primo),
+# unavailable = serve PlantUML, che manca (la run lo salterebbe con un warning)
+STATES = ("run", "fresh", "cached", "duplicate", "unavailable")
+
+PLANTUML_MISSING = "PlantUML not available"
+
+
+class WorkItem:
+    """
+    One unit of work a run would do: a diagram to generate or render, an LLM
+    description, a Vision analysis, an output format. `key` identifies the
+    work itself (same key = same result), `after` the items it waits for,
+    `deps` the manifest dependencies it was checked against.
+    """
+
+    __slots__ = ("name", "stage", "work_class", "resource", "key", "detail",
+                 "calls", "cost", "measured", "state", "after", "duplicate_of", "deps")
+
+    def __init__(self, name: str, work_class: str, resource: str,
+                 stage: Optional[str] = None, key: Optional[str] = None,
+                 detail: str = "", calls: int = 1, after: Sequence[str] = ()):
+        self.name = name
+        self.stage = stage
+        self.work_class = work_class
+        self.resource = resource  # cpu / jvm / native / llm / vision / pandoc
+        self.key = key
+        self.detail = detail
+        self.calls = calls
+        self.cost = 0.0
+        self.measured = False
+        self.state = "run"
+        self.after = list(after)
+        self.duplicate_of: Optional[str] = None
+        self.deps: Optional[Dict[str, str]] = None
+
+    def estimate(self, history: TimingHistory):
+        seconds, self.measured = history.estimate(self.work_class)
+        self.cost = seconds * self.calls if self.state == "run" else 0.0
+
+    def __repr__(self):
+        return f"WorkItem({self.name}, {self.state}, {self.cost:.2f}s)"
+
+
+# =========================
+# WORK LIST
+# =========================
+
+def _plantuml_available() -> bool:
+    """True when sources the native renderer cannot draw have a PlantUML to go to."""
+    renderer = get_renderer("png")
+    plantuml = renderer if renderer.backend == "plantuml" else getattr(renderer, "fallback", None)
+    return plantuml is not None and plantuml.available()
+
+
+def _render_item(view: str, diagram_type: str, puml_path: Path, generated: WorkItem,
+                 deps: Dict[str, str], render_formats: List[str]) -> Tuple[WorkItem, List[str]]:
+    """compile:<view>; returns it with the image names the document embeds."""
+    work_class = render_work_class(diagram_type)
+    resource = "jvm" if work_class.startswith("render:plantuml") else "native"
+    files = diagram_files(puml_path)
+    images = [p.with_suffix(f".{render_formats[0]}").name for p in files]
+
+    item = WorkItem(
+        f"compile:{view}", work_class, resource, stage=f"compile:{view}",
+        # il sorgente è determinato dalle dipendenze del diagramma: stesso
+        # fingerprint = stesso render, anche in un'altra architettura (render cache)
+        key=f"render:{diagram_type}:{fingerprint(deps)}:{'+'.join(render_formats)}",
+        detail="+".join(render_formats), after=[generated.name],
+    )
+    if resource == "jvm" and not _plantuml_available():
+        # compile fallirebbe: nessuna immagine nel documento, nessun costo
+        item.state = "unavailable"
+        item.detail = PLANTUML_MISSING
+        return item, []
+
+    if generated.state == "run" or not files:
+        return item, images or [puml_path.with_suffix(f".{render_formats[0]}").name]
+
+    if all(p.with_suffix(f".{fmt}").exists() for p in files for fmt in render_formats):
+        item.state = "fresh"
+        return item, images
+
+    cache = get_render_cache()
+    sources = [p.read_text(encoding="utf-8") for p in files]
+    missing = []
+    for fmt in render_formats:
+        try:
+            version = get_renderer(fmt).version
+        except FileNotFoundError:
+            missing.append(fmt)
+            continue
+        if not all(cache.contains(cache.key(s, version, fmt), fmt) for s in sources):
+            missing.append(fmt)
+
+    if missing:
+        item.detail = "+".join(missing)
+    else:
+        item.state = "cached"
+    return item, images
+
+
+def plan_architecture(docs_dir: Path, kb, model, architecture_data, manifest,
+                      formats: Sequence[str], refine_iterations: int = 0,
+                      history: Optional[TimingHistory] = None) -> List[WorkItem]:
+    """
+    Work list of one architecture, as build_pipeline would run it: the plan
+    of create_documentation_plan, the KB view mapping, the build manifest
+    (loaded) and the render / LLM caches decide what still has to run.
+    Nothing is generated, rendered or sent.
+    """
+    history = history or get_timing_history()
+    diagrams_dir = docs_dir / "diagrams"
+    render_formats = image_formats(formats)
+    plan = create_documentation_plan(model)
+    llm_cache = get_llm_cache()
+
+    items: List[WorkItem] = []
+
+    # la refinement gira prima della documentazione: fino a N analisi Vision
+    # per i tipi che imparano regole, una sola per gli altri
+    refine_items = []
+    if refine_iterations > 0:
+        plantuml_available = _plantuml_available()
+        for diagram_type in dict.fromkeys(kb.view_to_diagram_mapping.values()):
+            if diagram_type in DIAGRAM_INPUTS:
+                calls = refine_iterations if diagram_type in RULE_DRIVEN_DIAGRAM_TYPES else 1
+                refined_item = WorkItem(
+                    f"refine:{diagram_type}", f"vision:{diagram_type}", "vision",
+                    detail=f"up to {calls} call(s)", calls=calls,
+                )
+                # Vision analizza il render: senza PlantUML niente immagine da analizzare
+                if render_work_class(diagram_type).startswith("render:plantuml") and not plantuml_available:
+                    refined_item.state = "unavailable"
+                    refined_item.detail = PLANTUML_MISSING
+                refine_items.append(refined_item)
+    items.extend(refine_items)
+    refined = [i.name for i in refine_items]
+
+    diagram_images: Dict[str, List[str]] = {view: [] for view in FIXED_VIEW_ORDER}
+    description_texts: Dict[str, str] = {}
+
+    for view in FIXED_VIEW_ORDER:
+        if view not in plan.views:
+            continue
+
+        diagram_type = kb.view_to_diagram_mapping.get(view)
+        if diagram_type in DIAGRAM_INPUTS:
+            deps = diagram_dependencies(diagram_type, model, kb)
+            puml_path = diagrams_dir / f"{diagram_type}.puml"
+
+            generated = WorkItem(
+                f"generate:{view}", f"generate:{diagram_type}", "cpu", stage=f"generate:{view}",
+                key=f"generate:{puml_path}:{fingerprint(deps)}", detail=diagram_type, after=refined,
+            )
+            generated.deps = deps
+            # la refinement riscrive i sorgenti e le regole: dopo, si rigenera
+            if not refined and manifest.is_fresh(f"diagram:{diagram_type}", deps, verbose=False):
+                generated.state = "fresh"
+
+            rendered, diagram_images[view] = _render_item(
+                view, diagram_type, puml_path, generated, deps, render_formats
+            )
+            items.extend([generated, rendered])
+
+        prompt = build_description_prompt(model, view)
+        deps = description_dependencies(prompt, DEFAULT_MODEL, DESCRIPTION_PARAMS)
+        llm_key = llm_cache.key(DEFAULT_MODEL, prompt, DESCRIPTION_PARAMS)
+        described = WorkItem(
+            f"describe:{view}", f"llm:description:{view}", "llm", stage=f"describe:{view}",
+            key=f"llm:{llm_key}",
+        )
+        described.deps = deps
+        if manifest.is_fresh(f"description:{view}", deps, verbose=False):
+            described.state = "fresh"
+            description_texts[view] = manifest.result(f"description:{view}") or ""
+        elif llm_cache.contains(llm_key):
+            described.state = "cached"
+        items.append(described)
+
+    upstream = [i.name for i in items]
+    assembled = WorkItem("assemble", "assemble", "cpu", stage="assemble", after=upstream)
+    output_md = docs_dir / "documentation.md"
+
+    # con tutto l'upstream aggiornato il documento ha gli stessi input della run precedente
+    if all(i.state == "fresh" for i in items):
+        deps = document_dependencies(
+            plan, model, kb, architecture_data, ordered_plan_views(plan),
+            {v: bool(images) for v, images in diagram_images.items()},
+            {v: text for v, text in description_texts.items() if text}, diagram_images,
+        )
+        if manifest.is_fresh("document", deps, verbose=False):
+            assembled.state = "fresh"
+    items.append(assembled)
+
+    for name in formats:
+        if name == "md":
+            continue  # documentation.md è scritto da assemble
+        output = WorkItem(
+            f"output:{name}", f"output:{name}", "pandoc" if name == "pdf" else "cpu",
+            stage="outputs", after=["assemble"],
+        )
+        if assembled.state == "fresh" and output_md.exists():
+            deps = BACKENDS[name].dependencies(output_md)
+            if deps is not None and manifest.is_fresh(f"output:{name}", deps, verbose=False):
+                output.state = "fresh"
+        items.append(output)
+
+    for item in items:
+        item.estimate(history)
+    return items
+
+
+def dedupe(items: List[WorkItem]) -> List[WorkItem]:
+    """Marks items repeating the work of an earlier one (same key) as duplicates."""
+    first: Dict[str, WorkItem] = {}
+    for item in items:
+        if item.key is None or item.state in ("fresh", "cached", "unavailable"):
+            continue
+        if item.key in first:
+            item.state = "duplicate"
+            item.duplicate_of = first[item.key].name
+            item.cost = 0.0
+        else:
+            first[item.key] = item
+    return items
+
+
+# =========================
+# CRITICAL PATH
+# =========================
+
+def _finish_times(items: List[WorkItem]) -> Tuple[Dict[str, float], Dict[str, Optional[str]]]:
+    """Earliest finish of every item with unlimited workers, and its slowest predecessor."""
+    finish: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    # gli item sono elencati dopo quelli che aspettano
+    for item in items:
+        start, prev = 0.0, None
+        for name in item.after:
+            if name in finish and finish[name] > start:
+                start, prev = finish[name], name
+        finish[item.name] = start + item.cost
+        previous[item.name] = prev
+    return finish, previous
+
+
+def critical_path(items: List[WorkItem]) -> Tuple[float, List[WorkItem]]:
+    """The chain of waits that bounds the run, and its length in seconds."""
+    if not items:
+        return 0.0, []
+    finish, previous = _finish_times(items)
+    by_name = {item.name: item for item in items}
+
+    name: Optional[str] = max(finish, key=finish.get)
+    total = finish[name]
+    path = []
+    while name is not None:
+        path.append(by_name[name])
+        name = previous[name]
+    return total, path[::-1]
+
+
+def stage_ranks(items: List[WorkItem]) -> Dict[str, float]:
+    """
+    Pipeline stage -> estimated seconds from the stage's start to the end of
+    the run (its cost plus the longest chain after it): the scheduler starts
+    the stages on the longest chains first.
+    """
+    rank: Dict[str, float] = {}
+    for item in reversed(items):
+        rank[item.name] = item.cost + rank.get(item.name, 0.0)
+        for name in item.after:
+            rank[name] = max(rank.get(name, 0.0), rank[item.name])
+
+    stages: Dict[str, float] = {}
+    for item in items:
+        if item.stage is not None:
+            stages[item.stage] = max(stages.get(item.stage, 0.0), rank[item.name])
+    return stages
+
+
+def estimated_seconds(items: List[WorkItem], jobs: int = 1) -> float:
+    """Lower bound of the wall time with `jobs` workers."""
+    serial = sum(item.cost for item in items)
+    return max(critical_path(items)[0], serial / max(1, jobs))
+
+
+# =========================
+# REPORT
+# =========================
+
+def work_counts(items: List[WorkItem]) -> Dict[str, int]:
+    """External calls of the work still to run."""
+    run = [i for i in items if i.state == "run"]
+    # una JVM calda per formato (per processo)
+    jvm_formats = {fmt for i in run if i.resource == "jvm" for fmt in i.detail.split("+")}
+    vision_types = [i.work_class.split(":", 1)[1] for i in run if i.resource == "vision"]
+    if any(render_work_class(t).startswith("render:plantuml") for t in vision_types):
+        jvm_formats.add("png")  # render in memoria per Vision
+    return {
+        "jvm": len(jvm_formats),
+        "llm": sum(i.calls for i in run if i.resource == "llm"),
+        "vision": sum(i.calls for i in run if i.resource == "vision"),
+        "pandoc": sum(i.calls for i in run if i.resource == "pandoc"),
+    }
+
+
+def print_plan(title: str, items: List[WorkItem], jobs: int = 1):
+    print(f"\n[PLAN] {title}")
+    print(f"  {'STATE':<11} {'EST (s)':>9}  {'RESOURCE':<8} ITEM")
+    for item in items:
+        estimate = f"{item.cost:.2f}{'' if item.measured or item.state != 'run' else '*'}"
+        note = f"= {item.duplicate_of}" if item.duplicate_of else item.detail
+        note = f" ({note})" if note else ""
+        print(f"  {item.state:<11} {estimate:>9}  {item.resource:<8} {item.name}{note}")
+
+    states = {state: sum(1 for i in items if i.state == state) for state in STATES}
+    counts = work_counts(items)
+    total, path = critical_path(items)
+
+    print(f"[PLAN] {len(items)} work items: " + ", ".join(f"{n} {s}" for s, n in states.items()))
+    print(f"[PLAN] JVM launches: {counts['jvm']} | LLM calls: {counts['llm']} | "
+          f"Vision calls: up to {counts['vision']} | pandoc runs: {counts['pandoc']}")
+    print(f"[PLAN] Estimated time: {sum(i.cost for i in items):.1f} s serial, "
+          f"~{estimated_seconds(items, jobs):.1f} s with {jobs} job(s) "
+          "(* = default estimate, never measured)")
+    chain = " -> ".join(i.name for i in path if i.cost > 0) or "-"
+    print(f"[PLAN] Critical path ({total:.1f} s): {chain}")
@@ -0,0 +1,363 @@
+import io
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TextIO, Tuple, Union
+
+from src.documenter.plantuml_parser import Diagram as ParsedDiagram
+from src.documenter.plantuml_parser import Edge as ParsedEdge
+from src.documenter.plantuml_parser import Element
+
+
+# Buffer del writer: i diagrammi partizionati grandi vengono scritti a blocchi
+WRITE_BUFFER = 1 << 16
+
+
+class Node:
+    """A declared element: component, actor, participant, rectangle, database..."""
+
+    __slots__ = ("kind", "label", "alias", "style")
+
+    def __init__(self, kind: str, label: str, alias: Optional[str] = None, style: Optional[str] = None):
+        self.kind = kind
+        self.label = label
+        # None = dichiarazione nuda (`actor User`): il label fa da alias
+        self.alias = alias
+        self.style = style
+
+    @property
+    def ref(self) -> str:
+        return self.alias or self.label
+
+    def __repr__(self):
+        return f"Node({self.kind} {self.ref})"
+
+
+class Group:
+    """A container (deployment node, package...) holding nodes."""
+
+    __slots__ = ("kind", "label", "alias", "members")
+
+    def __init__(self, kind: str, label: str, alias: Optional[str] = None):
+        self.kind = kind
+        self.label = label
+        self.alias = alias
+        self.members: List[Node] = []
+
+    @property
+    def ref(self) -> str:
+        return self.alias or self.label
+
+    def __repr__(self):
+        return f"Group({self.kind} {self.ref}, {len(self.members)} members)"
+
+
+# Connettore o messaggio: (source, target, label, arrow), sempre source -> target.
+# Tupla semplice e non una classe: il GC smette di tracciarla, quindi
+# centinaia di migliaia di archi non innescano raccolte complete dell'heap.
+Edge = Tuple[str, str, Optional[str], str]
+
+
+class Note:
+    __slots__ = ("target", "text", "position")
+
+    def __init__(self, target: str, text: str, position: str = "right"):
+        self.target = target
+        self.text = text
+        self.position = position
+
+
+class DiagramIR:
+    """
+    Diagram built once by the generators and serialized by the emitters.
+    `roots` keeps groups and ungrouped nodes in declaration order;
+    `sequence` selects message semantics (lifelines, ordered messages).
+    Large diagrams can fill `roots` / `edges` in bulk (Node objects, Edge tuples).
+    """
+
+    __slots__ = ("sequence", "directives", "title", "roots", "edges", "notes", "comments")
+
+    def __init__(self, directives: Optional[List[str]] = None, title: Optional[str] = None,
+                 sequence: bool = False):
+        self.sequence = sequence
+        self.directives: List[str] = list(directives or [])
+        self.title = title
+        self.roots: List[Union[Node, Group]] = []
+        self.edges: List[Edge] = []
+        self.notes: List[Note] = []
+        self.comments: List[str] = []
+
+    # -----------------------------
+    # Building
+    # -----------------------------
+
+    def node(self, kind: str, label: str, alias: Optional[str] = None,
+             style: Optional[str] = None, group: Optional[Group] = None) -> Node:
+        node = Node(kind, label, alias, style)
+        (group.members if group is not None else self.roots).append(node)
+        return node
+
+    def group(self, kind: str, label: str, alias: Optional[str] = None) -> Group:
+        group = Group(kind, label, alias)
+        self.roots.append(group)
+        return group
+
+    def edge(self, source: str, target: str, label: Optional[str] = None, arrow: str = "-->") -> Edge:
+        edge = (source, target, label, arrow)
+        self.edges.append(edge)
+        return edge
+
+    def note(self, target: str, text: str, position: str = "right") -> Note:
+        note = Note(target, text, position)
+        self.notes.append(note)
+        return note
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+
+    def nodes(self) -> List[Node]:
+        """Every node, groups flattened, in declaration order."""
+        nodes = []
+        for item in self.roots:
+            if isinstance(item, Group):
+                nodes.extend(item.members)
+            else:
+                nodes.append(item)
+        return nodes
+
+    def analysis_view(self) -> ParsedDiagram:
+        """
+        The same Diagram the PlantUML parser would return for the emitted
+        text (same line numbers), built directly: analyzers and KB quality
+        rules run on generated diagrams without re-parsing them.
+        """
+        diagram = ParsedDiagram()
+        line = 2 + len(self.directives) + (self.title is not None)
+        diagram.directives = self.directives + ([f"title {self.title}"] if self.title is not None else [])
+
+        for item in self.roots:
+            line += 1
+            if isinstance(item, Group):
+                diagram.add_element(Element(item.kind, item.label, item.ref, line, None))
+                for member in item.members:
+                    line += 1
+                    diagram.add_element(Element(member.kind, member.label, member.ref, line, item.ref,
+                                                member.style))
+                if item.members:
+                    line += 1
+            else:
+                diagram.add_element(Element(item.kind, item.label, item.ref, line, None, item.style))
+
+        line += 1
+        for source, target, label, arrow in self.edges:
+            line += 1
+            diagram.edges.append(ParsedEdge(source, target, arrow, label, line))
+
+        for note in self.notes:
+            diagram.notes += 1
+            line += 2 + note.text.count("\n") + 1
+
+        line += len(self.comments) + 1
+        diagram.line_count = line
+        return diagram
+
+
+# =========================
+# EMITTERS
+# =========================
+
+def _plantuml_declaration(item: Union[Node, Group]) -> str:
+    if item.alias is None:
+        text = f"{item.kind} {item.label}"
+    else:
+        text = f'{item.kind} "{item.label}" as {item.alias}'
+    style = getattr(item, "style", None)
+    return f"{text} {style}" if style else text
+
+
+def emit_plantuml(ir: DiagramIR, out: TextIO):
+    write = out.write
+    write("@startuml\n")
+    for directive in ir.directives:
+        write(f"{directive}\n")
+    if ir.title is not None:
+        write(f"title {ir.title}\n")
+    write("\n")
+
+    lines = []
+    for item in ir.roots:
+        if isinstance(item, Group) and item.members:
+            lines.append(_plantuml_declaration(item) + " {\n")
+            lines.extend([f"  {_plantuml_declaration(member)}\n" for member in item.members])
+            lines.append("}\n")
+        elif item.alias is not None and getattr(item, "style", None) is None:
+            # caso comune, formattato in linea
+            lines.append(f'{item.kind} "{item.label}" as {item.alias}\n')
+        else:
+            lines.append(_plantuml_declaration(item) + "\n")
+    write("".join(lines))
+
+    write("\n")
+    # una write per blocco: migliaia di archi senza una chiamata per riga
+    write("".join([
+        f"{source} {arrow} {target} : {label}\n" if label else f"{source} {arrow} {target}\n"
+        for source, target, label, arrow in ir.edges
+    ]))
+
+    for note in ir.notes:
+        write(f"note {note.position} of {note.target}\n{note.text}\nend note\n")
+
+    for comment in ir.comments:
+        write(f"' {comment}\n")
+    write("@enduml\n")
+
+
+_MERMAID_ID = re.compile(r"[^A-Za-z0-9_]")
+
+_MERMAID_SHAPES = {
+    "actor": ('(["', '"])'),
+    "database": ('[("', '")]'),
+    "node": ('[["', '"]]'),
+}
+
+
+def _mermaid_id(ref: str) -> str:
+    return _MERMAID_ID.sub("_", ref)
+
+
+def _mermaid_text(label: str) -> str:
+    return label.replace('"', "#quot;").replace("\\n", "<br/>")
+
+
+def _left_to_right(ir: DiagramIR) -> bool:
+    return any(d.strip().lower() == "left to right direction" for d in ir.directives)
+
+
+def emit_mermaid(ir: DiagramIR, out: TextIO):
+    write = out.write
+
+    if ir.sequence:
+        write("sequenceDiagram\n")
+        if ir.title is not None:
+            write(f"    title {ir.title}\n")
+        for node in ir.nodes():
+            keyword = "actor" if node.kind == "actor" else "participant"
+            write(f"    {keyword} {_mermaid_id(node.ref)} as {_mermaid_text(node.label)}\n")
+        for source, target, label, arrow in ir.edges:
+            message = "-->>" if "." in arrow or "--" in arrow else "->>"
+            write(f"    {_mermaid_id(source)}{message}{_mermaid_id(target)}: "
+                  f"{_mermaid_text(label or '')}\n")
+        for note in ir.notes:
+            write(f"    Note {note.position} of {_mermaid_id(note.target)}: {_mermaid_text(note.text)}\n")
+        for comment in ir.comments:
+            write(f"    %% {comment}\n")
+        return
+
+    if ir.title is not None:
+        write(f"---\ntitle: {ir.title}\n---\n")
+    write("flowchart LR\n" if _left_to_right(ir) else "flowchart TB\n")
+
+    def declare(node: Node, indent: str):
+        start, end = _MERMAID_SHAPES.get(node.kind, ('["', '"]'))
+        write(f"{indent}{_mermaid_id(node.ref)}{start}{_mermaid_text(node.label)}{end}\n")
+
+    for item in ir.roots:
+        if isinstance(item, Group) and item.members:
+            write(f'    subgraph {_mermaid_id(item.ref)}["{_mermaid_text(item.label)}"]\n')
+            for member in item.members:
+                declare(member, "        ")
+            write("    end\n")
+        else:
+            declare(item, "    ")
+
+    for source, target, label, arrow in ir.edges:
+        link = "-.->" if "." in arrow else "-->"
+        text = f"|{_mermaid_text(label)}|" if label else ""
+        write(f"    {_mermaid_id(source)} {link}{text} {_mermaid_id(target)}\n")
+
+    for i, note in enumerate(ir.notes, start=1):
+        write(f'    note_{i}>"{_mermaid_text(note.text)}"]\n')
+        write(f"    {_mermaid_id(note.target)} -.- note_{i}\n")
+
+    for comment in ir.comments:
+        write(f"    %% {comment}\n")
+
+
+_DOT_SHAPES = {
+    "actor": "ellipse",
+    "database": "cylinder",
+    "node": "box3d",
+    "component": "component",
+}
+
+
+def _dot_text(label: str) -> str:
+    # `\n` nei label PlantUML è già l'escape di a-capo di DOT
+    return label.replace('"', '\\"')
+
+
+def emit_dot(ir: DiagramIR, out: TextIO):
+    write = out.write
+    write("digraph G {\n")
+    if _left_to_right(ir) or ir.sequence:
+        write("    rankdir=LR;\n")
+    if ir.title is not None:
+        write(f'    label="{_dot_text(ir.title)}";\n    labelloc=t;\n')
+    write("    node [shape=box];\n")
+
+    def declare(node: Node, indent: str):
+        shape = _DOT_SHAPES.get(node.kind, "box")
+        write(f'{indent}"{_dot_text(node.ref)}" [label="{_dot_text(node.label)}", shape={shape}];\n')
+
+    for item in ir.roots:
+        if isinstance(item, Group) and item.members:
+            write(f'    subgraph "cluster_{_dot_text(item.ref)}" {{\n')
+            write(f'        label="{_dot_text(item.label)}";\n')
+            for member in item.members:
+                declare(member, "        ")
+            write("    }\n")
+        elif isinstance(item, Group):
+            write(f'    "{_dot_text(item.ref)}" [label="{_dot_text(item.label)}", shape=box3d];\n')
+        else:
+            declare(item, "    ")
+
+    for source, target, label, arrow in ir.edges:
+        attrs = []
+        if label:
+            attrs.append(f'label="{_dot_text(label)}"')
+        if "." in arrow:
+            attrs.append("style=dashed")
+        suffix = f" [{', '.join(attrs)}]" if attrs else ""
+        write(f'    "{_dot_text(source)}" -> "{_dot_text(target)}"{suffix};\n')
+
+    for i, note in enumerate(ir.notes, start=1):
+        write(f'    "note_{i}" [label="{_dot_text(note.text)}", shape=note];\n')
+        write(f'    "{_dot_text(note.target)}" -> "note_{i}" [style=dashed, arrowhead=none];\n')
+
+    for comment in ir.comments:
+        write(f"    // {comment}\n")
+    write("}\n")
+
+
+EMITTERS: Dict[str, Callable[[DiagramIR, TextIO], None]] = {
+    "plantuml": emit_plantuml,
+    "mermaid": emit_mermaid,
+    "dot": emit_dot,
+}
+
+EXTENSIONS = {"plantuml": ".puml", "mermaid": ".mmd", "dot": ".dot"}
+
+
+def render_text(ir: DiagramIR, fmt: str = "plantuml") -> str:
+    buffer = io.StringIO()
+    EMITTERS[fmt](ir, buffer)
+    return buffer.getvalue()
+
+
+def write_diagram(ir: DiagramIR, path: Path, fmt: str = "plantuml") -> Path:
+    """Serializes the IR through one buffered file writer."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER) as f:
+        EMITTERS[fmt](ir, f)
+    return path
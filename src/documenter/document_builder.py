@@ -1,193 +1,208 @@
 from pathlib import Path
-import subprocess
-
-from src.documenter.lm_integration import generate_diagram_description
-from src.documenter.uml_generator import compile_plantuml
-
-
-def build_document_bundle(base_dir: Path, plan, model, kb, full_input):
-
-    docs_dir = base_dir / "docs" / "generated"
-    diagrams_dir = docs_dir / "diagrams"
-
-    docs_dir.mkdir(parents=True, exist_ok=True)
-    diagrams_dir.mkdir(parents=True, exist_ok=True)
-
-    output_md = docs_dir / "documentation.md"
-    output_pdf = docs_dir / "documentation.pdf"
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, TextIO, Union
+import hashlib
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+
+from src.documenter.build_manifest import MANIFEST_NAME, BuildManifest, code_fingerprint
+from src.documenter.lm_integration import stream_diagram_description
+from src.documenter.output_backends import DEFAULT_FORMATS, image_formats, render_outputs
+from src.documenter.tracing import span
+from src.documenter.uml_generator import compile_plantuml_files, diagram_files
+
+
+DIAGRAM_TITLES = {
+    "context_view": "Context Diagram",
+    "logical_view": "Component Diagram",
+    "deployment_view": "Deployment Diagram",
+    "runtime_view": "Sequence Diagram",
+    "security_view": "Security Diagram",
+}
+
+# Fixed order (avoids layout confusion)
+FIXED_VIEW_ORDER = [
+    "context_view",
+    "logical_view",
+    "deployment_view",
+    "runtime_view",
+    "security_view"
+]
+
+
+def ordered_plan_views(plan) -> list:
+    return [v for v in FIXED_VIEW_ORDER if v in plan.views]
+
+
+# ----------------------------------------------------------
+# Ensure the images are up to date with their .puml
+# (render cache: no JVM if the source is unchanged)
+# ----------------------------------------------------------
+def ensure_images(diagrams_dir: Path, diagram_type: str, formats: Sequence[str] = ("png",)) -> bool:
+    puml = diagrams_dir / f"{diagram_type}.puml"
+    images = [diagrams_dir / f"{diagram_type}.{fmt}" for fmt in formats]
+
+    if puml.exists():
+        try:
+            # parti e panoramiche incluse, tutti i formati in un'unica chiamata
+            compile_plantuml_files(diagram_files(puml), formats)
+            return all(p.exists() for p in images)
+        except Exception:
+            return False
 
-    # ----------------------------------------------------------
-    # Ensure PNG exists
-    # ----------------------------------------------------------
-    def ensure_png(diagram_type: str) -> bool:
-        puml = diagrams_dir / f"{diagram_type}.puml"
-        png = diagrams_dir / f"{diagram_type}.png"
+    # immagini senza sorgente: non verificabili, le usiamo così come sono
+    return all(p.exists() for p in images)
 
-        if png.exists():
-            return True
 
-        if puml.exists():
-            try:
-                compile_plantuml(puml)
-                return png.exists()
-            except Exception:
-                return False
-
-        return False
-
-    diagram_titles = {
-        "context_view": "Context Diagram",
-        "logical_view": "Component Diagram",
-        "deployment_view": "Deployment Diagram",
-        "runtime_view": "Sequence Diagram",
-        "security_view": "Security Diagram",
-    }
-
-    # Fixed order (avoids layout confusion)
-    FIXED_VIEW_ORDER = [
-        "context_view",
-        "logical_view",
-        "deployment_view",
-        "runtime_view",
-        "security_view"
-    ]
+def _image_caption(title: str, image: str) -> str:
+    """'Component Diagram – Part 3' / '– Overview 1.2' for partitioned diagrams."""
+    m = re.search(r"_part_(\d+)\.\w+$", image)
+    if m:
+        return f"{title} – Part {m.group(1)}"
+    m = re.search(r"_overview_(\d+)_(\d+)\.\w+$", image)
+    if m:
+        return f"{title} – Overview {m.group(1)}.{m.group(2)}"
+    return title
 
-    ordered_views = [v for v in FIXED_VIEW_ORDER if v in plan.views]
 
-    lines = []
-    lines.append("# Architectural Documentation\n")
-    lines.append("---\n")
+# ==========================================================
+# Sections
+# (ogni sezione è un generatore di entry: la cache dei frammenti
+#  la salta del tutto quando i suoi input non sono cambiati)
+# ==========================================================
+def _introduction_section(architecture_id: str):
+    yield "# Architectural Documentation\n"
+    yield "---\n"
 
     # ==========================================================
     # 1. Introduction
     # ==========================================================
-    lines.append("## 1. Introduction\n")
-    lines.append(
-        f"This document presents the architectural description of **{model.id}**. "
+    yield "## 1. Introduction\n"
+    yield (
+        f"This document presents the architectural description of **{architecture_id}**. "
         "The objective of this documentation is to provide a structured and comprehensive "
         "overview of the system’s architectural drivers, quality requirements, constraints, "
         "design trade-offs, and structural views.\n"
     )
-    lines.append(
+    yield (
         "The documentation follows common architectural documentation practices "
         "(inspired by IEEE 1016), aiming to support both technical understanding "
         "and design evaluation.\n"
     )
-    lines.append(
+    yield (
         "The following sections describe the key architectural drivers, quality attribute "
         "scenarios, constraints, stakeholder concerns, and the evaluation of the selected "
         "architecture. Finally, UML views are presented to visually represent the system.\n"
     )
 
-    lines.append("\n---\n")
+    yield "\n---\n"
+
 
+def _drivers_section(drivers: list):
     # ==========================================================
     # 2. Architectural Drivers
     # ==========================================================
-    lines.append("## 2. Architectural Drivers\n")
-
-    drivers = full_input.get("architectural_drivers", [])
+    yield "## 2. Architectural Drivers\n"
 
     if not drivers:
-        lines.append("_No architectural drivers available._\n")
+        yield "_No architectural drivers available._\n"
     else:
         for d in drivers:
-            lines.append(
+            yield (
                 f"### {d.get('id')} (Priority: {d.get('priority')})\n"
             )
-            lines.append(f"**Description:** {d.get('description')}\n\n")
-            lines.append(f"**Rationale:** {d.get('rationale')}\n\n")
+            yield f"**Description:** {d.get('description')}\n\n"
+            yield f"**Rationale:** {d.get('rationale')}\n\n"
+
+    yield "\n---\n"
 
-    lines.append("\n---\n")
 
+def _scenarios_section(scenarios: list):
     # ==========================================================
     # 3. Quality Attribute Scenarios
     # ==========================================================
-    lines.append("## 3. Quality Attribute Scenarios\n")
-
-    scenarios = full_input.get("quality_attribute_scenarios", [])
+    yield "## 3. Quality Attribute Scenarios\n"
 
     if not scenarios:
-        lines.append("_No quality attribute scenarios defined._\n")
+        yield "_No quality attribute scenarios defined._\n"
     else:
         for s in scenarios:
-            lines.append(
+            yield (
                 f"### {s.get('attribute')} (Priority: {s.get('priority')})\n"
             )
-            lines.append(f"- **Stimulus:** {s.get('stimulus')}\n")
-            lines.append(f"- **Environment:** {s.get('environment')}\n")
-            lines.append(f"- **Response:** {s.get('response')}\n")
-            lines.append(f"- **Measure:** {s.get('measure')}\n\n")
+            yield f"- **Stimulus:** {s.get('stimulus')}\n"
+            yield f"- **Environment:** {s.get('environment')}\n"
+            yield f"- **Response:** {s.get('response')}\n"
+            yield f"- **Measure:** {s.get('measure')}\n\n"
+
+    yield "\n---\n"
 
-    lines.append("\n---\n")
 
+def _constraints_section(constraints: list, stakeholders: list):
     # ==========================================================
     # 4. Constraints and Stakeholders
     # ==========================================================
-    lines.append("## 4. Constraints and Stakeholders\n")
+    yield "## 4. Constraints and Stakeholders\n"
 
-    lines.append("### 4.1 Constraints\n")
-    constraints = full_input.get("constraints", [])
+    yield "### 4.1 Constraints\n"
     if not constraints:
-        lines.append("_No constraints specified._\n")
+        yield "_No constraints specified._\n"
     else:
         for c in constraints:
-            lines.append(f"- {c}\n")
+            yield f"- {c}\n"
 
-    lines.append("\n### 4.2 Stakeholders\n")
-    stakeholders = full_input.get("stakeholders", [])
+    yield "\n### 4.2 Stakeholders\n"
     if not stakeholders:
-        lines.append("_No stakeholders specified._\n")
+        yield "_No stakeholders specified._\n"
     else:
         for st in stakeholders:
-            lines.append(f"- {st}\n")
+            yield f"- {st}\n"
+
+    yield "\n---\n"
 
-    lines.append("\n---\n")
 
+def _evaluation_section(selected_eval: Optional[dict]):
     # ==========================================================
     # 5. Architecture Evaluation
     # ==========================================================
-    lines.append("## 5. Architecture Evaluation\n")
-
-    evaluations = full_input.get("architecture_evaluation", [])
-    selected_eval = None
-
-    for e in evaluations:
-        if e.get("architecture_id") == model.id:
-            selected_eval = e
-            break
+    yield "## 5. Architecture Evaluation\n"
 
     if not selected_eval:
-        lines.append("_No evaluation data available for the selected architecture._\n")
+        yield "_No evaluation data available for the selected architecture._\n"
     else:
-        lines.append("### 5.1 Driver Coverage\n")
+        yield "### 5.1 Driver Coverage\n"
         for cov in selected_eval.get("driver_coverage", []):
-            lines.append(
+            yield (
                 f"- **{cov.get('driver_id')}**: {cov.get('satisfied')}\n"
             )
 
-        lines.append("\n### 5.2 Quality Attribute Trade-offs\n")
+        yield "\n### 5.2 Quality Attribute Trade-offs\n"
         for t in selected_eval.get("quality_attribute_tradeoffs", []):
             attrs = ", ".join(t.get("attributes_involved", []))
-            lines.append(f"- **{attrs}**: {t.get('tradeoff_description')}\n")
+            yield f"- **{attrs}**: {t.get('tradeoff_description')}\n"
 
-        lines.append("\n### 5.3 Risks and Limitations\n")
+        yield "\n### 5.3 Risks and Limitations\n"
         for r in selected_eval.get("risks_and_limitations", []):
-            lines.append(
+            yield (
                 f"- (**{r.get('severity')}**) {r.get('description')}\n"
             )
 
-        lines.append("\n### 5.4 Recommended Improvements\n")
+        yield "\n### 5.4 Recommended Improvements\n"
         for ref in selected_eval.get("recommended_refinements", []):
-            lines.append(f"- {ref.get('description')}\n")
+            yield f"- {ref.get('description')}\n"
+
+    yield "\n---\n"
 
-    lines.append("\n---\n")
 
-        # ==========================================================
+def _rationale_section():
+    # ==========================================================
     # 6. Architectural Style Rationale
     # ==========================================================
-    lines.append("## 6. Architectural Style Rationale\n")
-    lines.append(
+    yield "## 6. Architectural Style Rationale\n"
+    yield (
         "The selected Microservices Architecture was chosen to address key drivers "
         "such as scalability, availability, and independent deployment. "
         "By decomposing the system into autonomous services, each component can evolve, "
@@ -196,55 +211,56 @@ def build_document_bundle(base_dir: Path, plan, model, kb, full_input):
         "and technology heterogeneity, which are critical in high-load and cloud-native environments."
     )
 
-    lines.append("\n---\n")
+    yield "\n---\n"
+
 
+def _decisions_section():
     # ==========================================================
     # 7. Key Architectural Decisions
     # ==========================================================
-    lines.append("## 7. Key Architectural Decisions\n")
-    lines.append(
+    yield "## 7. Key Architectural Decisions\n"
+    yield (
         "- Adoption of microservices to isolate business capabilities and reduce coupling.\n"
         "- Independent deployment of services to improve maintainability and evolvability.\n"
         "- Cloud-native infrastructure to enable elasticity and high availability.\n"
         "- Clear separation between application logic, infrastructure, and external integrations.\n"
     )
 
-    lines.append("\n---\n")
+    yield "\n---\n"
+
 
+def _views_header_section():
     # ==========================================================
     # 8. Architectural Views
     # ==========================================================
-    lines.append("## 8. Architectural Views\n")
+    yield "## 8. Architectural Views\n"
 
-    view_section_number = 8
-    subsection_counter = 1
-
-    for view in ordered_views:
-        diagram_type = kb.view_to_diagram_mapping.get(view)
-        title = diagram_titles.get(view, view)
 
-        lines.append(f"\n### 8.{subsection_counter} {title}\n")
+def _view_section(number: int, title: str, images: List[str], description):
+    """One subsection of section 8; `images` is empty when the diagram is not available."""
+    yield f"\n### 8.{number} {title}\n"
 
-        if diagram_type and ensure_png(diagram_type):
-            lines.append(f"![{title}](diagrams/{diagram_type}.png)\n")
-        else:
-            lines.append("_Diagram not available_\n")
-
-        try:
-            desc = generate_diagram_description(model, view)
-            if desc.strip():
-                lines.append(desc + "\n")
-        except Exception:
-            pass
+    if images:
+        yield f"![{title}](diagrams/{images[0]})\n"
+        # diagramma diviso in parti: la prima immagine è la panoramica
+        for image in images[1:]:
+            yield f"![{_image_caption(title, image)}](diagrams/{image})\n"
+    else:
+        yield "_Diagram not available_\n"
 
-        subsection_counter += 1
+    if isinstance(description, str):
+        if description.strip():
+            yield description + "\n"
+    else:
+        yield description
 
 
+def _closing_section(architecture_id: str):
     # ==========================================================
     # 9. Limitations and Future Work
     # ==========================================================
-    lines.append("\n## 9. Limitations and Future Work\n")
-    lines.append(
+    yield "\n## 9. Limitations and Future Work\n"
+    yield (
         "The current architectural evaluation is primarily qualitative and based on design reasoning. "
         "No empirical performance benchmarking or resilience testing has yet been performed. "
         "Future work should include quantitative validation through load testing, failure injection experiments, "
@@ -257,9 +273,9 @@ def build_document_bundle(base_dir: Path, plan, model, kb, full_input):
     # ==========================================================
     # 10. Conclusion
     # ==========================================================
-    lines.append("\n## 10. Conclusion\n")
-    lines.append(
-        f"The **{model.id}** architecture provides a structured and scalable solution aligned with the identified "
+    yield "\n## 10. Conclusion\n"
+    yield (
+        f"The **{architecture_id}** architecture provides a structured and scalable solution aligned with the identified "
         "architectural drivers. By adopting a microservices-based decomposition, the system enables modular growth, "
         "independent deployment, and fault isolation.\n\n"
         "The evaluation highlights a deliberate balance between scalability, availability, maintainability, and "
@@ -269,28 +285,341 @@ def build_document_bundle(base_dir: Path, plan, model, kb, full_input):
         "in cloud-native, high-demand environments."
     )
 
-    # ==========================================================
-    # Write Markdown
-    # ==========================================================
-    output_md.write_text("\n".join(lines), encoding="utf-8")
-    print(f"[DOCUMENT BUILT] {output_md}")
 
-    # ==========================================================
-    # Generate PDF
-    # ==========================================================
-    try:
-        subprocess.run(
-            [
-                "pandoc",
-                str(output_md),
-                "-o",
-                str(output_pdf),
-                "--pdf-engine=xelatex",
-                "--resource-path",
-                str(docs_dir),
-            ],
-            check=True,
-        )
-        print(f"[PDF GENERATED] {output_pdf}")
-    except Exception as e:
-        print("[WARNING] PDF generation failed:", e)
\ No newline at end of file
+class DocumentSection:
+    """
+    One independently cached fragment of the document.
+    `inputs` is the slice of input the section renders (None = never cached).
+    """
+
+    __slots__ = ("name", "render", "inputs")
+
+    def __init__(self, name: str, render: Callable[[], Iterable], inputs: Optional[list]):
+        self.name = name
+        self.render = render
+        self.inputs = inputs
+
+
+def selected_evaluation(full_input, architecture_id: str) -> Optional[dict]:
+    for e in full_input.get("architecture_evaluation", []):
+        if e.get("architecture_id") == architecture_id:
+            return e
+    return None
+
+
+def document_sections(plan, model, kb, full_input,
+                      diagram_available: Dict[str, bool],
+                      descriptions: Mapping[str, Union[str, Iterable[str]]],
+                      diagram_images: Optional[Dict[str, List[str]]] = None) -> List[DocumentSection]:
+    """
+    The document as an ordered list of sections.
+    A view is keyed by its description text. A streamed description is
+    never cached (it may stop halfway): once recorded, the next run passes
+    its text and the view is cached then.
+    """
+    architecture_id = model.id
+    drivers = full_input.get("architectural_drivers", [])
+    scenarios = full_input.get("quality_attribute_scenarios", [])
+    constraints = full_input.get("constraints", [])
+    stakeholders = full_input.get("stakeholders", [])
+    selected_eval = selected_evaluation(full_input, architecture_id)
+
+    sections = [
+        DocumentSection("introduction", lambda: _introduction_section(architecture_id), [architecture_id]),
+        DocumentSection("drivers", lambda: _drivers_section(drivers), [drivers]),
+        DocumentSection("scenarios", lambda: _scenarios_section(scenarios), [scenarios]),
+        DocumentSection("constraints", lambda: _constraints_section(constraints, stakeholders),
+                        [constraints, stakeholders]),
+        DocumentSection("evaluation", lambda: _evaluation_section(selected_eval), [selected_eval]),
+        DocumentSection("rationale", _rationale_section, []),
+        DocumentSection("decisions", _decisions_section, []),
+        DocumentSection("views", _views_header_section, []),
+    ]
+
+    for number, view in enumerate(ordered_plan_views(plan), start=1):
+        diagram_type = kb.view_to_diagram_mapping.get(view)
+        title = DIAGRAM_TITLES.get(view, view)
+
+        images = []
+        if diagram_type and diagram_available.get(view):
+            images = (diagram_images or {}).get(view) or [f"{diagram_type}.png"]
+
+        description = descriptions.get(view, "")
+        inputs = None
+        if isinstance(description, str):
+            inputs = [number, title, images, description]
+        else:
+            description = StreamedEntry(description, suffix="\n")
+
+        sections.append(DocumentSection(
+            f"view:{view}",
+            lambda number=number, title=title, images=images, description=description:
+                _view_section(number, title, images, description),
+            inputs,
+        ))
+
+    sections.append(DocumentSection("closing", lambda: _closing_section(architecture_id), [architecture_id]))
+    return sections
+
+
+class StreamedEntry:
+    """A document entry produced incrementally; empty streams are skipped."""
+
+    def __init__(self, chunks: Iterable[str], suffix: str = ""):
+        self.chunks = chunks
+        self.suffix = suffix
+        self.written = False
+
+
+class MarkdownWriter:
+    """
+    Writes document entries separated by newlines, flushing after
+    every entry or streamed chunk.
+    """
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+        self._first = True
+
+    def _separator(self):
+        if not self._first:
+            self._stream.write("\n")
+        self._first = False
+
+    def write_entry(self, entry):
+        if isinstance(entry, str):
+            self._separator()
+            self._stream.write(entry)
+        else:
+            started = False
+            for chunk in entry.chunks:
+                if not chunk:
+                    continue
+                if not started:
+                    self._separator()
+                    started = True
+                self._stream.write(chunk)
+                self._stream.flush()
+            if started:
+                self._stream.write(entry.suffix)
+            entry.written = started
+
+        self._stream.flush()
+
+
+class BackgroundStream:
+    """
+    Consumes a chunk iterator on a background thread.
+    The (single) reader gets chunks as soon as they are produced.
+    Once the stream has ended, `text` holds everything produced and
+    `complete` tells whether the source finished successfully (its own
+    `complete` flag when it has one, e.g. DescriptionStream).
+    """
+
+    _END = object()
+
+    def __init__(self, factory: Callable[[], Iterable[str]]):
+        self._queue = queue.Queue()
+        self.text = ""
+        self.complete = False
+        self._thread = threading.Thread(target=self._run, args=(factory,), daemon=True)
+        self._thread.start()
+
+    def _run(self, factory):
+        parts = []
+        try:
+            chunks = factory()
+            for chunk in chunks:
+                parts.append(chunk)
+                self._queue.put(chunk)
+            self.complete = getattr(chunks, "complete", True)
+        except Exception:
+            pass
+        finally:
+            self.text = "".join(parts)
+            self._queue.put(self._END)
+
+    def join(self):
+        """Waits for the producer to end (text and complete are final after this)."""
+        self._thread.join()
+
+    def __iter__(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is self._END:
+                return
+            yield chunk
+
+
+# ==========================================================
+# Fragment cache
+# ==========================================================
+FRAGMENTS_DIR = ".fragments"
+
+# Elementi serializzati per volta nel calcolo della chiave (memoria limitata)
+KEY_CHUNK_ITEMS = 1024
+
+
+class FragmentCache:
+    """
+    Rendered sections on disk (<key>.md). The key hashes the section name,
+    the input slice it renders and the builder code, a chunk of items at
+    a time, so thousands of drivers or scenarios are never serialized at once.
+    With `reuse=False` (--rebuild-all) every section is rendered again and
+    its fragment rewritten.
+    """
+
+    def __init__(self, directory: Path, reuse: bool = True):
+        self.directory = Path(directory)
+        self.reuse = reuse
+        self._code = code_fingerprint("document_builder.py")
+
+    def key(self, section: DocumentSection) -> Optional[str]:
+        if section.inputs is None:
+            return None
+
+        h = hashlib.sha256(f"{section.name}\0{self._code}".encode("utf-8"))
+        for value in section.inputs:
+            items = value if isinstance(value, list) else [value]
+            h.update(b"[" if isinstance(value, list) else b"(")
+            for start in range(0, len(items), KEY_CHUNK_ITEMS):
+                chunk = items[start:start + KEY_CHUNK_ITEMS]
+                h.update(json.dumps(chunk, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.md"
+
+    def prune(self, keep: Iterable[str]):
+        """Drops the fragments this document no longer uses."""
+        keep = {f"{k}.md" for k in keep}
+        for fragment in self.directory.glob("*.md"):
+            if fragment.name not in keep:
+                fragment.unlink()
+
+
+class _SectionStream:
+    """
+    Text stream for one section: writes to the document (with the
+    separator from the previous section, once something is written)
+    and, when cacheable, to the fragment file.
+    """
+
+    def __init__(self, out: TextIO, separator: bool, fragment: Optional[TextIO]):
+        self._out = out
+        self._separator = separator
+        self._fragment = fragment
+        self.started = False
+
+    def write(self, text: str):
+        if not text:
+            return
+        if not self.started:
+            if self._separator:
+                self._out.write("\n")
+            self.started = True
+        self._out.write(text)
+        if self._fragment is not None:
+            self._fragment.write(text)
+
+    def flush(self):
+        self._out.flush()
+
+
+def write_document(docs_dir: Path, sections: List[DocumentSection],
+                   cache: Optional[FragmentCache] = None) -> Path:
+    """
+    Streams the sections to documentation.md. Sections whose fragment is
+    cached are copied from disk without being rendered; the others are
+    written to the document and to their fragment at the same time.
+    """
+    docs_dir.mkdir(parents=True, exist_ok=True)
+    output_md = docs_dir / "documentation.md"
+    if cache is not None:
+        cache.directory.mkdir(parents=True, exist_ok=True)
+
+    used = []
+    reused = 0
+    written = False
+
+    with open(output_md, "w", encoding="utf-8") as out:
+        for section in sections:
+            key = cache.key(section) if cache is not None else None
+            fragment_path = cache.path(key) if key else None
+
+            if fragment_path is not None and cache.reuse and fragment_path.exists():
+                with open(fragment_path, "r", encoding="utf-8") as f:
+                    first = f.read(1)
+                    if first:
+                        if written:
+                            out.write("\n")
+                        out.write(first)
+                        shutil.copyfileobj(f, out)
+                        written = True
+                out.flush()
+                used.append(key)
+                reused += 1
+                continue
+
+            tmp = fragment_path.with_name(f"{fragment_path.name}.{os.getpid()}.tmp") if fragment_path else None
+            fragment = open(tmp, "w", encoding="utf-8") if tmp else None
+            rendered = False
+            try:
+                stream = _SectionStream(out, written, fragment)
+                writer = MarkdownWriter(stream)
+                with span("document.section", "document", section=section.name):
+                    for entry in section.render():
+                        writer.write_entry(entry)
+                written = written or stream.started
+                rendered = True
+            finally:
+                if fragment is not None:
+                    fragment.close()
+                    # frammento parziale (errore durante il render): mai in cache
+                    if rendered:
+                        os.replace(tmp, fragment_path)
+                        used.append(key)
+                    else:
+                        tmp.unlink()
+
+    if cache is not None:
+        cache.prune(used)
+
+    print(f"[DOCUMENT BUILT] {output_md} ({reused}/{len(sections)} sections reused)")
+    return output_md
+
+
+def build_document_bundle(base_dir: Path, plan, model, kb, full_input, formats=DEFAULT_FORMATS):
+    """
+    Serial build: diagrams, markdown, output formats (PDF by default).
+    View descriptions are streamed into documentation.md as tokens arrive.
+    """
+
+    docs_dir = base_dir / "docs" / "generated"
+    diagrams_dir = docs_dir / "diagrams"
+
+    docs_dir.mkdir(parents=True, exist_ok=True)
+    diagrams_dir.mkdir(parents=True, exist_ok=True)
+
+    diagram_available = {}
+    diagram_images = {}
+    descriptions = {}
+    render_formats = image_formats(formats)
+
+    for view in ordered_plan_views(plan):
+        diagram_type = kb.view_to_diagram_mapping.get(view)
+        diagram_available[view] = bool(diagram_type) and ensure_images(diagrams_dir, diagram_type, render_formats)
+        if diagram_available[view]:
+            diagram_images[view] = [
+                p.with_suffix(f".{render_formats[0]}").name
+                for p in diagram_files(diagrams_dir / f"{diagram_type}.puml")
+            ]
+        descriptions[view] = stream_diagram_description(model, view)
+
+    sections = document_sections(plan, model, kb, full_input, diagram_available,
+                                 descriptions, diagram_images)
+    output_md = write_document(docs_dir, sections, FragmentCache(docs_dir / FRAGMENTS_DIR))
+
+    manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+    render_outputs(docs_dir, output_md, formats, manifest)
+    manifest.save()
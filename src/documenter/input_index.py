@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_INDEX_DIR = BASE_DIR / ".cache" / "input_index"
+
+INDEX_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+# Fuori dalle stringhe interessano solo i caratteri strutturali;
+# dentro le stringhe solo la chiusura e gli escape.
+_STRUCTURAL = re.compile(rb'[{}\[\]",:]')
+_IN_STRING = re.compile(rb'["\\]')
+
+Span = Tuple[int, int]
+
+
+# =========================
+# STREAMING SCANNER
+# =========================
+
+def scan_json_layout(f, chunk_size: int = CHUNK_SIZE) -> Tuple[Dict[str, Span], Dict[str, List[Span]]]:
+    """
+    Single streaming pass over a JSON document whose root is an object.
+
+    Returns:
+    - sections: top-level key -> byte span of its value
+    - items:    top-level key -> byte spans of the elements, for array values
+    Memory use is independent of the file size (only keys are buffered).
+    """
+    sections: Dict[str, Span] = {}
+    items: Dict[str, List[Span]] = {}
+
+    stack = []
+    in_string = False
+    escape = False
+    capturing = False
+    key_buf = bytearray()
+
+    expecting_key = False
+    current_key: Optional[str] = None
+    value_start = -1
+    item_start = -1
+
+    offset = 0
+    started = False
+
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+
+        pos = 0
+        n = len(chunk)
+
+        while pos < n:
+            if in_string:
+                if escape:
+                    escape = False
+                    if capturing:
+                        key_buf += chunk[pos:pos + 1]
+                    pos += 1
+                    continue
+
+                m = _IN_STRING.search(chunk, pos)
+                if m is None:
+                    if capturing:
+                        key_buf += chunk[pos:]
+                    pos = n
+                    break
+
+                if capturing:
+                    key_buf += chunk[pos:m.start()]
+                pos = m.end()
+
+                if m.group() == b"\\":
+                    escape = True
+                    if capturing:
+                        key_buf += b"\\"
+                    continue
+
+                in_string = False
+                if capturing:
+                    capturing = False
+                    current_key = json.loads(b'"' + bytes(key_buf) + b'"')
+                continue
+
+            m = _STRUCTURAL.search(chunk, pos)
+            if m is None:
+                pos = n
+                break
+
+            c = m.group()
+            here = offset + m.start()
+            pos = m.end()
+            depth = len(stack)
+
+            if c == b'"':
+                in_string = True
+                if depth == 1 and expecting_key:
+                    capturing = True
+                    key_buf = bytearray()
+                    expecting_key = False
+
+            elif c == b"{" or c == b"[":
+                if depth == 0:
+                    if c != b"{" or started:
+                        raise ValueError("Architecture input must be a single JSON object.")
+                    started = True
+                    expecting_key = True
+                elif depth == 1 and c == b"[":
+                    items[current_key] = []
+                    item_start = here + 1
+                stack.append(c)
+
+            elif c == b"}" or c == b"]":
+                if not stack:
+                    raise ValueError("Unbalanced JSON document.")
+                stack.pop()
+                depth = len(stack)
+
+                if depth == 1 and c == b"]":
+                    items[current_key].append((item_start, here))
+                elif depth == 0:
+                    if current_key is not None and value_start >= 0:
+                        sections[current_key] = (value_start, here)
+
+            elif c == b":":
+                if depth == 1:
+                    value_start = here + 1
+
+            elif c == b",":
+                if depth == 1:
+                    sections[current_key] = (value_start, here)
+                    value_start = -1
+                    expecting_key = True
+                elif depth == 2 and stack[1] == b"[":
+                    items[current_key].append((item_start, here))
+                    item_start = here + 1
+
+        offset += n
+
+    if stack or in_string:
+        raise ValueError("Truncated JSON document.")
+
+    return sections, items
+
+
+# =========================
+# INDEXED INPUT
+# =========================
+
+class ArchitectureInput:
+    """
+    Lazy view over an architecture input file.
+
+    A byte-offset index (top-level sections, and array elements keyed by
+    architecture_id) is built with one streaming pass and persisted; later
+    loads only parse the sections and the architecture actually requested.
+    """
+
+    def __init__(self, path: Path, index_dir: Path = DEFAULT_INDEX_DIR):
+        self.path = Path(path)
+        self.index_dir = Path(index_dir)
+
+        if not self.path.exists():
+            raise FileNotFoundError(f"File not found: {self.path}")
+
+        self._index: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Index
+    # -----------------------------
+
+    def _index_path(self) -> Path:
+        digest = hashlib.sha256(str(self.path.resolve()).encode("utf-8")).hexdigest()
+        return self.index_dir / f"{digest[:24]}.json"
+
+    def _file_signature(self) -> dict:
+        st = self.path.stat()
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    @property
+    def index(self) -> dict:
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_index() or self._build_index()
+            return self._index
+
+    def _load_index(self) -> Optional[dict]:
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if index.get("version") != INDEX_VERSION:
+            return None
+        if index.get("signature") != self._file_signature():
+            return None
+        return index
+
+    def _build_index(self) -> dict:
+        signature = self._file_signature()
+
+        with open(self.path, "rb") as f:
+            sections, items = scan_json_layout(f)
+
+            # Elementi indicizzati per architecture_id (un elemento alla volta)
+            by_id: Dict[str, Dict[str, List[Span]]] = {}
+            for section, spans in items.items():
+                section_index: Dict[str, List[Span]] = {}
+                for span in spans:
+                    raw = self._read_span(f, span).strip()
+                    if not raw:
+                        continue
+                    if not raw.startswith(b"{"):
+                        break
+                    element = json.loads(raw)
+                    arch_id = element.get("architecture_id")
+                    if arch_id is None:
+                        break
+                    section_index.setdefault(arch_id, []).append(list(span))
+                if section_index:
+                    by_id[section] = section_index
+
+        index = {
+            "version": INDEX_VERSION,
+            "signature": signature,
+            "sections": {k: list(v) for k, v in sections.items()},
+            "by_architecture": by_id,
+        }
+
+        index_path = self._index_path()
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as out:
+                json.dump(index, out)
+            os.replace(tmp, index_path)
+        except OSError as e:
+            print(f"[WARNING] Could not persist input index: {e}")
+
+        return index
+
+    @staticmethod
+    def _read_span(f, span) -> bytes:
+        start, end = span
+        f.seek(start)
+        return f.read(end - start)
+
+    def _parse_spans(self, spans) -> list:
+        with open(self.path, "rb") as f:
+            return [json.loads(self._read_span(f, span)) for span in spans]
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+
+    def section_names(self) -> List[str]:
+        return list(self.index["sections"].keys())
+
+    def section(self, name: str, default=None):
+        span = self.index["sections"].get(name)
+        if span is None:
+            return default
+        return self._parse_spans([span])[0]
+
+    def architecture_ids(self) -> List[str]:
+        return list(self.index["by_architecture"].get("architectural_views", {}).keys())
+
+    def items_for(self, section: str, architecture_id: str) -> list:
+        spans = self.index["by_architecture"].get(section, {}).get(architecture_id, [])
+        return self._parse_spans(spans)
+
+    def architecture(self, architecture_id: str) -> dict:
+        found = self.items_for("architectural_views", architecture_id)
+        if not found:
+            raise ValueError(f"Architecture '{architecture_id}' not found.")
+        return found[0]
+
+    def is_indexed_by_architecture(self, section: str) -> bool:
+        return section in self.index["by_architecture"]
+
+    def scoped(self, architecture_id: str) -> "ScopedInput":
+        return ScopedInput(self, architecture_id)
+
+
+class ScopedInput(Mapping):
+    """
+    Read-only mapping over the input, restricted to one architecture.
+
+    Sections whose elements carry an architecture_id (architectural_views,
+    architecture_evaluation, ...) only contain that architecture's entries;
+    the other sections are parsed on first access and memoized.
+    """
+
+    def __init__(self, source: ArchitectureInput, architecture_id: str):
+        self.source = source
+        self.architecture_id = architecture_id
+        self._loaded: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: str):
+        with self._lock:
+            if key not in self._loaded:
+                if key not in self.source.index["sections"]:
+                    raise KeyError(key)
+                if self.source.is_indexed_by_architecture(key):
+                    value = self.source.items_for(key, self.architecture_id)
+                else:
+                    value = self.source.section(key)
+                self._loaded[key] = value
+            return self._loaded[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.source.section_names())
+
+    def __len__(self) -> int:
+        return len(self.source.index["sections"])
@@ -1,10 +1,67 @@
 import json
+import os
+import threading
+import time
+import uuid
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Oltre questa soglia il journal viene consolidato nel JSON
+COMPACT_AFTER_ENTRIES = 64
+
+# Componenti per diagramma quando layout_rules non lo specifica
+DEFAULT_MAX_COMPONENTS_PER_VIEW = 10
+
+
+class FileLock:
+    """Cross-process exclusive lock on a side file (`<kb>.lock`)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
 
 
 class KnowledgeBase:
     """
     Static + Learned Knowledge Base for documentation rules.
+
+    One in-memory instance is the source of truth for a run. Learned rules
+    are appended to a journal (`<kb>.journal.jsonl`) under a cross-process
+    lock and replayed on load/refresh; the journal is periodically
+    compacted into the JSON file. A compacted journal starts with a unique
+    header line, so other processes notice the compaction even when the
+    new file reuses the old inode number.
     """
 
     def __init__(self, kb_data: dict, path: Path):
@@ -13,12 +70,202 @@ class KnowledgeBase:
 
         self.view_to_diagram_mapping = kb_data.get("view_to_diagram_mapping", {})
         self.layout_rules = kb_data.get("layout_rules", {})
-        self.learned_rules = kb_data.get("learned_rules", {})
+        self.diagram_quality_rules = kb_data.get("diagram_quality_rules", {})
+        self.learned_rules = kb_data.setdefault("learned_rules", {})
+
+        self.journal_path = path.with_name(f"{path.stem}.journal.jsonl")
+        self.lock_path = path.with_name(f"{path.name}.lock")
+
+        self._rules_by_diagram: Dict[str, List[str]] = {}
+        self._reindex()
+
+        # Posizione nel journal già applicata; inode e prima riga identificano
+        # il journal (entrambi cambiano dopo una compattazione)
+        self._journal_inode = None
+        self._journal_head: Optional[bytes] = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+        self._lock = threading.RLock()
+
+    # -----------------------------
+    # Lookups
+    # -----------------------------
+
+    def _reindex(self):
+        index: Dict[str, List[str]] = {}
+        for rule_name, rule_info in self.learned_rules.items():
+            if rule_info.get("active", False):
+                index.setdefault(rule_info.get("diagram_type"), []).append(rule_name)
+        self._rules_by_diagram = index
+
+    def rules_for(self, diagram_type: str) -> List[str]:
+        """Active learned rules for a diagram type."""
+        return list(self._rules_by_diagram.get(diagram_type, []))
+
+    def quality_rules_for(self, diagram_type: str) -> dict:
+        """`diagram_quality_rules` entry of a diagram type (rule -> enabled)."""
+        return self.diagram_quality_rules.get(diagram_type, {})
+
+    def max_components_per_view(self) -> int:
+        """
+        `layout_rules.max_components_per_view`, or DEFAULT_MAX_COMPONENTS_PER_VIEW.
+        Raises ValueError below 2: a part must hold both ends of a connector.
+        """
+        limit = self.layout_rules.get("max_components_per_view", DEFAULT_MAX_COMPONENTS_PER_VIEW)
+        if not isinstance(limit, int) or limit < 2:
+            raise ValueError(f"layout_rules.max_components_per_view must be an integer >= 2, got {limit!r}")
+        return limit
+
+    # -----------------------------
+    # Journal
+    # -----------------------------
+
+    def _apply(self, entry: dict):
+        if entry.get("op") == "learn_rule":
+            self.learned_rules[entry["rule"]] = {
+                "diagram_type": entry.get("diagram_type"),
+                "active": entry.get("active", True),
+            }
+
+    def _read_head(self) -> bytes:
+        with open(self.journal_path, "rb") as f:
+            return f.readline()
+
+    def _replay_journal(self):
+        """
+        Applies journal entries written since the last replay (also by other processes).
+        Called under the file lock: when no journal position is known yet the
+        JSON is (re)read here too, so a compaction can never fall between
+        reading the JSON and replaying the journal.
+        """
+        try:
+            st = os.stat(self.journal_path)
+            head = self._read_head()
+        except FileNotFoundError:
+            st, head = None, None
+
+        # posizione ignota, oppure journal compattato da un altro processo:
+        # si riparte dal JSON
+        if (self._journal_inode is None or st is None or st.st_ino != self._journal_inode
+                or head != self._journal_head):
+            self._reload_base()
+            self._journal_offset = 0
+            self._journal_entries = 0
+            self._reindex()
+
+        self._journal_inode = st.st_ino if st is not None else None
+        self._journal_head = head
+        if st is None or st.st_size <= self._journal_offset:
+            return
+
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # scrittura incompleta
+                self._journal_offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(entry)
+                if entry.get("op") == "learn_rule":
+                    self._journal_entries += 1
+
+        self._reindex()
+
+    def _reload_base(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # Sezione learned_rules inizializzata se mancante
+        data.setdefault("learned_rules", {})
+        self.raw_data = data
+        self.view_to_diagram_mapping = data.get("view_to_diagram_mapping", {})
+        self.layout_rules = data.get("layout_rules", {})
+        self.diagram_quality_rules = data.get("diagram_quality_rules", {})
+        self.learned_rules = data.setdefault("learned_rules", {})
+
+    def refresh(self):
+        """Picks up rules learned by other processes."""
+        with self._lock, FileLock(self.lock_path):
+            self._replay_journal()
+
+    def learn_rules(self, diagram_type: str, rules: Iterable[str]) -> List[str]:
+        """
+        Persists new learned rules (append-only) and returns the ones
+        that were actually new.
+        """
+        with self._lock, FileLock(self.lock_path):
+            self._replay_journal()
+
+            added = []
+            lines = []
+            for rule in rules:
+                if rule in self.learned_rules or rule in added:
+                    continue
+                entry = {
+                    "op": "learn_rule",
+                    "rule": rule,
+                    "diagram_type": diagram_type,
+                    "active": True,
+                    "ts": time.time(),
+                }
+                lines.append(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._apply(entry)
+                added.append(rule)
+
+            if not added:
+                return []
+
+            with open(self.journal_path, "ab") as f:
+                f.write("".join(lines).encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+            st = os.stat(self.journal_path)
+            self._journal_inode = st.st_ino
+            self._journal_head = self._read_head()
+            self._journal_offset = st.st_size
+            self._journal_entries += len(added)
+            self._reindex()
+
+            if self._journal_entries >= COMPACT_AFTER_ENTRIES:
+                self._compact_locked()
+
+            return added
+
+    def _compact_locked(self):
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.raw_data, f, indent=4)
+        os.replace(tmp, self.path)
+
+        # journal nuovo con intestazione univoca: gli altri processi se ne
+        # accorgono anche se il filesystem riusa lo stesso inode
+        header = (json.dumps({"op": "compacted", "id": uuid.uuid4().hex, "ts": time.time()}) + "\n").encode("utf-8")
+        fresh = self.journal_path.with_name(f"{self.journal_path.name}.{os.getpid()}.tmp")
+        fresh.write_bytes(header)
+        os.replace(fresh, self.journal_path)
+
+        st = os.stat(self.journal_path)
+        self._journal_inode = st.st_ino
+        self._journal_head = header
+        self._journal_offset = len(header)
+        self._journal_entries = 0
+
+    def compact(self):
+        """Folds the journal into the JSON file."""
+        with self._lock, FileLock(self.lock_path):
+            self._replay_journal()
+            self._compact_locked()
 
     def save(self):
         """Persist KB su disco."""
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(self.raw_data, f, indent=4)
+        self.compact()
         print("[KB SAVED] Persisted to disk.")
 
 
@@ -26,11 +273,7 @@ def load_knowledge_base(path: Path) -> KnowledgeBase:
     if not path.exists():
         raise FileNotFoundError(f"KB file not found: {path}")
 
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # Sezione learned_rules inizializzata se mancante
-    if "learned_rules" not in data:
-        data["learned_rules"] = {}
-
-    return KnowledgeBase(data, path)
\ No newline at end of file
+    # il JSON viene letto da refresh(), sotto lo stesso lock del journal
+    kb = KnowledgeBase({}, path)
+    kb.refresh()
+    return kb
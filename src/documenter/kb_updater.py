@@ -1,26 +1,22 @@
-def update_kb_from_feedback(kb_path, diagram_type, new_rules):
+from pathlib import Path
+
+from src.documenter.kb_loader import KnowledgeBase, load_knowledge_base
+
+
+def update_kb_from_feedback(kb, diagram_type, new_rules):
     """
     Aggiorna la Knowledge Base persistendo nuove regole strutturali.
-    """
-    import json
-
-    with open(kb_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
 
-    if "learned_rules" not in data:
-        data["learned_rules"] = {}
+    `kb` è l'istanza KnowledgeBase condivisa (o il path del file KB):
+    le regole vanno nel journal append-only, senza riscrivere il JSON.
+    Ritorna le regole effettivamente nuove.
+    """
+    if not isinstance(kb, KnowledgeBase):
+        kb = load_knowledge_base(Path(kb))
 
-    updated = False
+    added = kb.learn_rules(diagram_type, new_rules)
 
-    for rule in new_rules:
-        if rule not in data["learned_rules"]:
-            data["learned_rules"][rule] = {
-                "diagram_type": diagram_type,
-                "active": True
-            }
-            updated = True
+    if added:
+        print("[KB UPDATED] Persisted new structural rules.")
 
-    if updated:
-        with open(kb_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
-        print("[KB UPDATED] Persisted new structural rules.")
\ No newline at end of file
+    return added
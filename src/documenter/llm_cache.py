@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_CACHE_DIR = BASE_DIR / ".cache" / "llm"
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+class LLMResponseCache:
+    """
+    Disk-backed cache of LLM completions.
+
+    Key: model name + prompt hash + sampling parameters.
+    Entries expire after `ttl_seconds`; beyond `max_entries` the least
+    recently used ones are evicted. With `refresh=True` lookups always
+    miss, so every response is fetched again and re-stored.
+    """
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 refresh: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.refresh = refresh
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+
+    @staticmethod
+    def key(model: str, prompt: str, params: dict) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        params_text = json.dumps(params, sort_keys=True)
+        raw = f"{model}\0{prompt_hash}\0{params_text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[str]:
+        if self.refresh:
+            self._count(False)
+            return None
+
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._count(False)
+            return None
+
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self._count(False)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self._count(True)
+        return entry.get("response")
+
+    def contains(self, key: str) -> bool:
+        """Whether get() would hit, without counting or touching the entry (dry-run planning)."""
+        if self.refresh:
+            return False
+        try:
+            with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        return time.time() - entry.get("created", 0) <= self.ttl_seconds
+
+    def put(self, key: str, model: str, response: str):
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        entry = {
+            "created": time.time(),
+            "model": model,
+            "response": response,
+        }
+
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= 50:
+                self._puts_since_evict = 0
+                self.evict()
+
+    def evict(self):
+        """Drops expired entries, then the least recently used beyond max_entries."""
+        if not self.cache_dir.exists():
+            return
+
+        now = time.time()
+        entries = []
+
+        for p in self.cache_dir.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, p))
+
+        entries.sort()
+        excess = len(entries) - self.max_entries
+
+        # le più vecchie prima: oltre il limite oppure non usate da più del TTL
+        # (get() verifica comunque il TTL sulla data di creazione)
+        for i, (mtime, p) in enumerate(entries):
+            if i < excess or now - mtime > self.ttl_seconds:
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def stats_line(self) -> str:
+        return f"[LLM CACHE] hits={self.hits} misses={self.misses}"
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.documenter.tracing import span
+
+
+# Local OpenAI-compatible endpoint (LM Studio)
+LM_BASE_URL = "http://127.0.0.1:1234/v1"
+
+# Timeout (seconds) per tipo di chiamata
+DEFAULT_TIMEOUTS: Dict[str, float] = {
+    "description": 120,
+    "vision": 60,
+    "rule_extraction": 25,
+}
+
+TRANSIENT_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class LLMClient:
+    """
+    Shared HTTP client for the local LLM/vision endpoint.
+
+    - keep-alive connection pooling (one requests.Session)
+    - retries with exponential backoff on connection errors and
+      transient status codes
+    - per-call-type timeouts
+    - async interface; `max_concurrency` bounds in-flight async calls
+    """
+
+    def __init__(self,
+                 base_url: str = LM_BASE_URL,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 max_concurrency: int = 4,
+                 retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 pool_size: int = 16):
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+        self.max_concurrency = max(1, max_concurrency)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # una risposta lenta non va ripetuta: raddoppierebbe l'attesa
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=TRANSIENT_STATUS_CODES,
+            allowed_methods=None,  # anche POST
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def timeout_for(self, call_type: str) -> float:
+        return self.timeouts.get(call_type, 60)
+
+    # -----------------------------
+    # Sync interface
+    # -----------------------------
+
+    def post(self, endpoint: str, payload: dict, call_type: str) -> requests.Response:
+        with span(f"llm.{call_type}", "http", endpoint=endpoint) as s:
+            response = self.session.post(
+                f"{self.base_url}/{endpoint.lstrip('/')}",
+                json=payload,
+                timeout=self.timeout_for(call_type),
+            )
+            s.set(status=response.status_code, bytes=len(response.content))
+            return response
+
+    def chat(self, payload: dict, call_type: str) -> requests.Response:
+        return self.post("chat/completions", payload, call_type)
+
+    def completion(self, payload: dict, call_type: str) -> requests.Response:
+        return self.post("completions", payload, call_type)
+
+    def stream_chat(self, payload: dict, call_type: str) -> Iterator[str]:
+        """
+        Streamed (SSE) chat completion: yields content deltas as they arrive.
+        Raises requests.HTTPError on a non-200 response and
+        requests.ConnectionError when the stream ends before `[DONE]`
+        or a finish_reason (server closed the connection mid-answer).
+        """
+        with span(f"llm.{call_type}.stream", "http", endpoint="chat/completions") as s, \
+                self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    json=dict(payload, stream=True),
+                    timeout=self.timeout_for(call_type),
+                    stream=True,
+                ) as response:
+            s.set(status=response.status_code)
+            tokens = 0  # delta SSE ~ token
+            size = 0
+            finished = False
+
+            if response.status_code != 200:
+                raise requests.HTTPError(
+                    f"Streaming request failed with status {response.status_code}",
+                    response=response,
+                )
+
+            if response.encoding is None:
+                response.encoding = "utf-8"
+
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        finished = True
+                        break
+
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        continue
+
+                    choices = event.get("choices") or []
+                    if not choices:
+                        continue
+
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        tokens += 1
+                        size += len(content)
+                        yield content
+                    if choices[0].get("finish_reason"):
+                        finished = True
+            finally:
+                s.set(tokens=tokens, bytes=size)
+
+            if not finished:
+                raise requests.ConnectionError("Stream ended before the response was complete")
+
+    # -----------------------------
+    # Async interface
+    # -----------------------------
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # il numero di worker è il limite di concorrenza
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="llm-client",
+                )
+            return self._executor
+
+    async def post_async(self, endpoint: str, payload: dict, call_type: str) -> requests.Response:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), self.post, endpoint, payload, call_type
+        )
+
+    async def chat_async(self, payload: dict, call_type: str) -> requests.Response:
+        return await self.post_async("chat/completions", payload, call_type)
+
+    async def completion_async(self, payload: dict, call_type: str) -> requests.Response:
+        return await self.post_async("completions", payload, call_type)
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.session.close()
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Returns the process-wide client (created lazily)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
@@ -1,19 +1,25 @@
-import requests
 import json
 import re
+import time
+from typing import Iterator, Optional
+
+from src.documenter.llm_cache import get_llm_cache
+from src.documenter.llm_client import get_llm_client
+from src.documenter.timing_history import get_timing_history
 
-LM_API_URL = "http://127.0.0.1:1234/v1/chat/completions"
 DEFAULT_MODEL = "qwen2.5-coder-1.5b-instruct"
 
+DESCRIPTION_PARAMS = {
+    "temperature": 0.2,
+    "max_tokens": 380
+}
 
-def generate_diagram_description(model, view: str) -> str:
+
+def build_description_prompt(model, view: str) -> str:
     """
-    Generates a professional architectural description using an LLM.
-    Output:
-    - Formal technical English
-    - 220–260 words
-    - No markdown formatting
-    - Continuous academic paragraphs
+    Builds the description prompt.
+    Fully determined by the model id, the view, the components
+    and the first 12 relationships.
     """
 
     # -----------------------------
@@ -33,7 +39,7 @@ def generate_diagram_description(model, view: str) -> str:
                 "target": getattr(conn, "target", ""),
                 "type": getattr(conn, "type", "")
             }
-            for conn in connectors
+            for conn in connectors[:12]
         ]
     except Exception:
         relationships = []
@@ -84,54 +90,201 @@ Focus:
 {focus_instruction}
 """
 
-    payload = {
-        "model": DEFAULT_MODEL,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.2,
-        "max_tokens": 380
-    }
+    return prompt
 
-    try:
-        response = requests.post(
-            LM_API_URL,
-            json=payload,
-            timeout=120
-        )
 
-        if response.status_code != 200:
-            return ""
+# -----------------------------
+# Safety cleaning (streamed, line by line)
+# -----------------------------
 
-        data = response.json()
+def _clean_line(line: str) -> str:
+    # Remove markdown headings
+    line = re.sub(r"#{1,6}\s*", "", line)
 
-        if "choices" not in data or not data["choices"]:
-            return ""
+    # Remove bullet markers
+    line = re.sub(r"^\s*[-*•]\s+", "", line)
 
-        raw_text = data["choices"][0]["message"]["content"].strip()
+    # Remove numbered lists
+    line = re.sub(r"^\s*\d+\.\s+", "", line)
 
-        # -----------------------------
-        # Safety cleaning
-        # -----------------------------
-        cleaned = raw_text
+    # Remove bold markers
+    return line.replace("**", "")
 
-        # Remove markdown headings
-        cleaned = re.sub(r"#{1,6}\s*", "", cleaned)
 
-        # Remove bullet markers
-        cleaned = re.sub(r"^\s*[-*•]\s+", "", cleaned, flags=re.MULTILINE)
+# Run di `#` (con gli spazi che seguono) in fondo alla riga: il prossimo token può allungarlo
+_OPEN_HEADING = re.compile(r"#[#\s]*$")
+# Inizio riga che _clean_line può togliere (bullet, poi numerazione)
+_LINE_PREFIX = re.compile(r"^\s*(?:[-*•]\s+)?(?:\d+\.\s+)?")
+# Resto che può ancora diventare un bullet o un numero
+_OPEN_PREFIX = re.compile(r"[-*•]|\d+\.?")
 
-        # Remove numbered lists
-        cleaned = re.sub(r"^\s*\d+\.\s+", "", cleaned, flags=re.MULTILINE)
 
-        # Remove bold markers
-        cleaned = cleaned.replace("**", "")
+def _settled_clean(partial: str) -> Optional[str]:
+    """
+    Cleaned text of an incomplete line that no further token can change
+    (a prefix of the final cleaned line); None while the start of the line
+    (heading, bullet, numbering) is still undecided.
+    """
+    heading = _OPEN_HEADING.search(partial)
+    if heading:
+        partial = partial[:heading.start()]
 
-        # Normalize spacing
-        cleaned = re.sub(r"\n{3,}", "\n\n", cleaned)
+    text = re.sub(r"#{1,6}\s*", "", partial)
+    rest = text[_LINE_PREFIX.match(text).end():]
+    if not rest or _OPEN_PREFIX.fullmatch(rest):
+        return None
 
-        return cleaned.strip()
+    cleaned = _clean_line(partial)
+    if partial.endswith("*"):
+        cleaned = cleaned.rstrip("*")  # `*` spaiato: può chiudere un `**`
+    # spazi finali trattenuti: in fondo alla descrizione vengono tolti
+    return cleaned.rstrip()
 
-    except Exception:
-        # Never break the document if LLM fails
-        return ""
\ No newline at end of file
+
+class DescriptionCleaner:
+    """
+    Applies the markdown cleanup to a token stream.
+
+    The cleanup only rewrites `#` runs, the start of a line (bullets,
+    numbering) and `**` pairs: once the start of a line is settled, its
+    text is released as tokens arrive, holding back only what the next
+    token could still change (an open `#` run, an unpaired `*`, trailing
+    spaces). Leading blank lines are dropped, runs of blank lines
+    collapse to one and trailing blank lines are never emitted.
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._pending_blank = 0
+        self._started = False
+        # riga corrente: già aperta (separatore emesso), spazi iniziali saltati, caratteri inviati
+        self._line_open = False
+        self._lead = 0
+        self._sent = 0
+
+    def _release(self, cleaned: str) -> str:
+        """The part of the current line's cleaned text not released yet."""
+        if not self._line_open:
+            if not cleaned.strip():
+                return ""
+            self._line_open = True
+            if not self._started:
+                self._started = True
+                prefix = ""
+                self._lead = len(cleaned) - len(cleaned.lstrip())
+            else:
+                # Normalize spacing (max one blank line)
+                prefix = "\n" * min(self._pending_blank + 1, 2)
+                self._pending_blank = 0
+                self._lead = 0
+        else:
+            prefix = ""
+
+        text = cleaned[self._lead:]
+        piece, self._sent = text[self._sent:], len(text)
+        return prefix + piece
+
+    def _end_line(self, line: str) -> str:
+        cleaned = _clean_line(line)
+        if not self._line_open and not cleaned.strip():
+            if self._started:
+                self._pending_blank += 1
+            piece = ""
+        else:
+            piece = self._release(cleaned)
+
+        self._line_open = False
+        self._lead = self._sent = 0
+        return piece
+
+    def feed(self, chunk: str) -> str:
+        text = self._partial + chunk
+        *complete, self._partial = text.split("\n")
+        pieces = [self._end_line(line) for line in complete]
+
+        settled = _settled_clean(self._partial)
+        if settled:
+            pieces.append(self._release(settled))
+        return "".join(pieces)
+
+    def flush(self) -> str:
+        last, self._partial = self._partial, ""
+        return self._end_line(last.rstrip())
+
+
+class DescriptionStream:
+    """
+    The cleaned chunks of one description, yielded as tokens arrive.
+    `complete` becomes True only when the whole response arrived (or came
+    from the cache): an LLM failure ends the stream quietly, with whatever
+    text was already yielded and `complete` still False.
+    """
+
+    def __init__(self, model, view: str):
+        self.model = model
+        self.view = view
+        self.complete = False
+
+    def __iter__(self) -> Iterator[str]:
+        prompt = build_description_prompt(self.model, self.view)
+
+        cache = get_llm_cache()
+        cache_key = cache.key(DEFAULT_MODEL, prompt, DESCRIPTION_PARAMS)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            self.complete = True
+            return
+
+        payload = {
+            "model": DEFAULT_MODEL,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            **DESCRIPTION_PARAMS
+        }
+
+        cleaner = DescriptionCleaner()
+        parts = []
+        start = time.perf_counter()
+
+        try:
+            for token in get_llm_client().stream_chat(payload, call_type="description"):
+                piece = cleaner.feed(token)
+                if piece:
+                    parts.append(piece)
+                    yield piece
+
+            piece = cleaner.flush()
+            if piece:
+                parts.append(piece)
+                yield piece
+
+        except Exception:
+            # Never break the document if LLM fails
+            return
+
+        cleaned = "".join(parts)
+        if cleaned:
+            get_timing_history().record(f"llm:description:{self.view}", time.perf_counter() - start)
+            cache.put(cache_key, DEFAULT_MODEL, cleaned)
+            self.complete = True
+
+
+def stream_diagram_description(model, view: str) -> DescriptionStream:
+    """
+    Streams a professional architectural description from the LLM.
+    Output:
+    - Formal technical English
+    - 220–260 words
+    - No markdown formatting
+    - Continuous academic paragraphs
+    Cleaned text is yielded as tokens arrive; the complete response is
+    cached on disk, so an unchanged prompt costs no round-trip.
+    """
+    return DescriptionStream(model, view)
+
+
+def generate_diagram_description(model, view: str) -> str:
+    """Non-streaming variant: the whole cleaned description."""
+    return "".join(stream_diagram_description(model, view))
@@ -1,7 +1,12 @@
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+import argparse
 import json
+import os
+import time
 
 from src.documenter.kb_loader import load_knowledge_base
+from src.documenter.input_index import ArchitectureInput
 from src.documenter.planner import create_documentation_plan
 from src.documenter.models import ArchitectureModel
 
@@ -12,13 +17,55 @@ from src.documenter.uml_generator import (
     generate_deployment_diagram,
     generate_component_diagram,
     regenerate_sequence_with_feedback,
-    compile_plantuml,
+    compile_plantuml_files,
+    diagram_files,
 )
 
-from src.documenter.structural_analyzer import analyze_sequence_structural
+from src.documenter.structural_analyzer import (
+    analyze_sequence_structural,
+    format_quality_report,
+    validate_diagram,
+)
 from src.documenter.vision_rule_extractor import extract_rules_from_feedback
 from src.documenter.kb_updater import update_kb_from_feedback
-from src.documenter.document_builder import build_document_bundle
+from src.documenter.document_builder import (
+    FIXED_VIEW_ORDER,
+    FRAGMENTS_DIR,
+    BackgroundStream,
+    FragmentCache,
+    document_sections,
+    ordered_plan_views,
+    write_document,
+)
+from src.documenter.lm_integration import (
+    DEFAULT_MODEL,
+    DESCRIPTION_PARAMS,
+    build_description_prompt,
+    stream_diagram_description,
+)
+from src.documenter.build_manifest import (
+    DIAGRAM_INPUTS,
+    MANIFEST_NAME,
+    BuildManifest,
+    description_dependencies,
+    diagram_dependencies,
+    document_dependencies,
+)
+from src.documenter.cost_planner import (
+    WorkItem,
+    critical_path,
+    dedupe,
+    plan_architecture,
+    print_plan,
+    stage_ranks,
+)
+from src.documenter.output_backends import DEFAULT_FORMATS, image_formats, parse_formats, render_outputs_async
+from src.documenter.pipeline import PipelineExecutor, Stage
+from src.documenter.plantuml_renderer import RENDERER_BACKENDS, set_renderer_backend
+from src.documenter.llm_cache import get_llm_cache
+from src.documenter.render_cache import get_render_cache
+from src.documenter.timing_history import get_timing_history
+from src.documenter.tracing import enable_tracing, get_tracer
 
 
 def load_architecture(path: Path) -> dict:
@@ -28,199 +75,648 @@ def load_architecture(path: Path) -> dict:
         return json.load(f)
 
 
-def select_architecture(data: dict, architecture_id: str) -> dict:
+def select_architecture(data, architecture_id: str) -> dict:
+    if isinstance(data, ArchitectureInput):
+        return data.architecture(architecture_id)
+
     for arch in data.get("architectural_views", []):
         if arch.get("architecture_id") == architecture_id:
             return arch
     raise ValueError(f"Architecture '{architecture_id}' not found.")
 
 
-def safe_compile(puml_path: Path) -> bool:
+def safe_compile(puml_paths: List[Path], formats: Sequence[str] = ("png",)) -> bool:
+    """Compila il diagramma e le sue eventuali parti, in tutti i formati, in un'unica chiamata."""
     try:
-        compile_plantuml(puml_path)
-        return puml_path.with_suffix(".png").exists()
+        images = compile_plantuml_files(puml_paths, formats)
+        return all(p.exists() for p in images)
     except Exception as e:
-        print(f"[WARNING] Compile failed for {puml_path.name}: {e}")
+        print(f"[WARNING] Compile failed for {puml_paths[0].name}: {e}")
         return False
 
 
-if __name__ == "__main__":
+def generate_view_diagram(model: ArchitectureModel, kb, view: str,
+                          diagrams_dir: Path) -> Optional[Path]:
+    """
+    Genera il .puml di una view.
+    Per il sequence diagram esegue anche il ciclo self-evolving
+    (analisi strutturale -> regole -> rigenerazione), quindi il file
+    restituito è sempre la versione finale da compilare.
+    """
+    diagram_type = kb.view_to_diagram_mapping.get(view)
+    print(f"\n[DEBUG] View: {view}")
+    print(f"[DEBUG] Diagram type from KB: {diagram_type}")
 
-    BASE_DIR = Path(__file__).resolve().parent.parent.parent
+    puml_path = diagrams_dir / f"{diagram_type}.puml"
 
-    # =============================
-    # 1️⃣ Knowledge Base
-    # =============================
+    # oltre questo limite component/deployment vengono divisi in parti
+    max_components = kb.max_components_per_view()
 
-    kb_path = BASE_DIR / "data" / "kb" / "documentation_rules.json"
-    kb = load_knowledge_base(kb_path)
+    # -----------------------------
+    # STRUCTURAL DIAGRAMS
+    # -----------------------------
 
-    print("\nKnowledge Base loaded.")
-    for view, diagram in kb.view_to_diagram_mapping.items():
-        print(f"- {view} -> {diagram}")
+    # IR del file principale, quando il generatore lo restituisce:
+    # le regole di qualità lo valutano senza riparsare il .puml
+    ir = None
 
-    # =============================
-    # 2️⃣ Architecture
-    # =============================
+    if diagram_type == "component_diagram":
+        generate_component_diagram(model, puml_path, max_components)
 
-    input_path = BASE_DIR / "data" / "input" / "finalArchitecture.json"
-    architecture_data = load_architecture(input_path)
+    elif diagram_type == "deployment_diagram":
+        generate_deployment_diagram(model, puml_path, max_components)
 
-    selected_id = "Microservices Architecture"
-    selected_architecture = select_architecture(architecture_data, selected_id)
-    selected_model = ArchitectureModel(selected_architecture)
+    elif diagram_type == "context_diagram":
+        ir = generate_context_diagram(model, puml_path)
 
-    print(f"\nSelected architecture: {selected_model.id}")
+    elif diagram_type == "security_diagram":
+        ir = generate_security_diagram(model, puml_path)
 
-    # =============================
-    # 3️⃣ Documentation Plan
-    # =============================
+    # -----------------------------
+    # SEQUENCE DIAGRAM (SELF-EVOLVING)
+    # -----------------------------
 
-    plan = create_documentation_plan(selected_model)
-    print("\nDocumentation Plan:")
-    for view in plan.views:
-        print(f"- {view}")
+    elif diagram_type == "sequence_diagram":
 
-    # =============================
-    # 4️⃣ Layout check
-    # =============================
+        # 🔹 Regole apprese dalla KB in memoria (indicizzate per diagram type)
+        sequence_rules = kb.rules_for("sequence_diagram")
 
-    max_components = kb.layout_rules.get("max_components_per_view", 10)
-    components = selected_model.get_logical_components()
+        # 🔹 Generazione base con regole apprese
+        print("Loaded learned rules:", len(kb.learned_rules))
+        print("Sequence rules applied:", sequence_rules)
 
-    if len(components) > max_components:
-        print("\n[LAYOUT WARNING] Logical view exceeds max components per view.")
-    else:
-        print("\nLayout check passed.")
+        ir = generate_sequence_diagram(
+            model,
+            puml_path,
+            rules=sequence_rules
+        )
 
-    # =============================
-    # Output dirs
-    # =============================
+        # 🔹 Analisi strutturale (lavora sull'IR, non serve né il PNG né il parsing)
+        try:
+            structural_feedback = analyze_sequence_structural(ir)
 
-    diagrams_dir = BASE_DIR / "docs" / "generated" / "diagrams"
-    diagrams_dir.mkdir(parents=True, exist_ok=True)
+            print("\n[STRUCTURAL FEEDBACK]:\n", structural_feedback)
 
-    generated_files = []
+            # 🔹 LLM → Estrazione regole strutturate (solo se c'è qualcosa da correggere)
+            new_rules = []
+            if structural_feedback != "Structure OK.":
+                new_rules = extract_rules_from_feedback(
+                    "sequence_diagram",
+                    structural_feedback
+                )
+
+            if new_rules:
+                # Journal append-only: la KB in memoria è già aggiornata
+                added = update_kb_from_feedback(
+                    kb,
+                    "sequence_diagram",
+                    new_rules
+                )
+
+                # 🔹 Rigenerazione migliorata, solo se le regole sono cambiate:
+                # altrimenti il diagramma sarebbe identico a quello appena generato
+                if added:
+                    print("[KB UPDATED] Nuove regole salvate:", added)
+                    ir = regenerate_sequence_with_feedback(
+                        model,
+                        structural_feedback,
+                        puml_path
+                    )
+
+        except Exception as e:
+            print("[STRUCTURAL ANALYSIS ERROR]", e)
+
+    else:
+        print(f"[INFO] Diagram type '{diagram_type}' not implemented.")
+
+    # -----------------------------
+    # KB QUALITY RULES (tutti i tipi)
+    # -----------------------------
+
+    quality_rules = kb.quality_rules_for(diagram_type)
+    files = diagram_files(puml_path)
+    if quality_rules and files:
+        results = {}
+        for path in files:
+            source = ir if ir is not None and path == puml_path else path.read_text(encoding="utf-8")
+            for rule_name, issues in validate_diagram(source, quality_rules).items():
+                prefix = f"{path.stem}: " if len(files) > 1 else ""
+                results.setdefault(rule_name, []).extend(prefix + issue for issue in issues)
+        print(format_quality_report(diagram_type, results))
+
+    return puml_path
+
+
+def list_architecture_ids(data) -> List[str]:
+    if isinstance(data, ArchitectureInput):
+        return data.architecture_ids()
+
+    return [
+        arch.get("architecture_id")
+        for arch in data.get("architectural_views", [])
+        if arch.get("architecture_id")
+    ]
+
+
+class DiagramResult:
+    """
+    Output of a generate stage: the main .puml, all the .puml files of the
+    diagram (parts and overviews included) and the dependencies it was built from.
+    """
+
+    def __init__(self, puml_path: Path, artifact: str, deps: dict, fresh: bool):
+        self.puml_path = puml_path
+        self.files = diagram_files(puml_path)
+        self.artifact = artifact
+        self.artifact_type = artifact.split(":", 1)[1]
+        self.deps = deps
+        self.fresh = fresh
+
+
+def build_pipeline(docs_dir: Path, kb_path: Path, input_path: Path,
+                   architecture_id: str, kb=None,
+                   architecture_data=None,
+                   manifest: Optional[BuildManifest] = None,
+                   formats: Sequence[str] = DEFAULT_FORMATS) -> List[Stage]:
+    """
+    Pipeline come grafo di stage:
+    load -> plan -> generate:<view> -> compile:<view> ┐
+                 └> describe:<view> ──────────────────┴> assemble -> outputs
+    describe:<view> avvia lo streaming della descrizione; assemble scrive
+    documentation.md in ordine, man mano che arrivano i token.
+    Le view non presenti nel piano producono stage vuoti.
+    `kb` e `architecture_data` (dict o ArchitectureInput) già caricati
+    vengono riusati (batch mode).
+    `outputs` produce i formati richiesti (md, html, pdf) in parallelo.
+    `plan` stima il costo del lavoro rimasto (cost_planner) e dà priorità
+    agli stage sulle catene più lunghe.
+    Ogni artefatto registra nel build manifest le sezioni di input lette:
+    alla run successiva viene ricostruito solo se queste sono cambiate.
+    """
+    diagrams_dir = docs_dir / "diagrams"
+    # svg nel documento quando un formato lo usa, png solo se serve (PDF)
+    render_formats = image_formats(formats)
+    if manifest is None:
+        manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+    # work item per nome, dallo stage plan: generate/describe ne riusano le dipendenze
+    planned: Dict[str, WorkItem] = {}
 
     # =============================
-    # 5️⃣ Generate diagrams
+    # 1️⃣ Knowledge Base + Architecture
     # =============================
 
-    for view in plan.views:
-        print("PLAN VIEWS", plan.views)
-        diagram_type = kb.view_to_diagram_mapping.get(view)
-        print(f"\n[DEBUG] View: {view}")
-        print(f"[DEBUG] Diagram type from KB: {diagram_type}")
-
-        puml_path = diagrams_dir / f"{diagram_type}.puml"
+    def load():
+        if kb is not None:
+            # KB condivisa (batch): recupera le regole apprese da altri processi
+            loaded_kb = kb
+            loaded_kb.refresh()
+        else:
+            loaded_kb = load_knowledge_base(kb_path)
 
-        # -----------------------------
-        # STRUCTURAL DIAGRAMS
-        # -----------------------------
+        print("\nKnowledge Base loaded.")
+        for view, diagram in loaded_kb.view_to_diagram_mapping.items():
+            print(f"- {view} -> {diagram}")
 
-        if diagram_type == "component_diagram":
-            generate_component_diagram(selected_model, puml_path)
-            safe_compile(puml_path)
+        # Input indicizzato: si parsano solo l'architettura scelta
+        # e le sezioni effettivamente lette dal builder
+        source = architecture_data
+        if source is None:
+            source = ArchitectureInput(input_path)
 
-        elif diagram_type == "deployment_diagram":
-            generate_deployment_diagram(selected_model, puml_path)
-            safe_compile(puml_path)
+        selected_architecture = select_architecture(source, architecture_id)
+        model = ArchitectureModel(selected_architecture)
 
-        elif diagram_type == "context_diagram":
-            generate_context_diagram(selected_model, puml_path)
-            safe_compile(puml_path)
+        data = source
+        if isinstance(source, ArchitectureInput):
+            data = source.scoped(architecture_id)
 
-        elif diagram_type == "security_diagram":
-            generate_security_diagram(selected_model, puml_path)
-            safe_compile(puml_path)
+        print(f"\nSelected architecture: {model.id}")
 
-        # -----------------------------
-        # SEQUENCE DIAGRAM (SELF-EVOLVING)
-        # -----------------------------
+        manifest.load()
+        return loaded_kb, data, model
 
-        elif diagram_type == "sequence_diagram":
+    # =============================
+    # 2️⃣ Documentation Plan + layout check
+    # =============================
 
-            # 🔹 Carica regole apprese dalla KB
-            sequence_rules = []
+    def plan_stage(loaded):
+        kb, data, model = loaded
 
-            with open(kb_path, "r", encoding="utf-8") as f:
-                kb_data = json.load(f)
+        plan = create_documentation_plan(model)
+        print("\nDocumentation Plan:")
+        for view in plan.views:
+            print(f"- {view}")
 
-            learned = kb_data.get("learned_rules", {})
+        max_components = kb.max_components_per_view()
+        components = model.get_logical_components()
 
-            for rule_name, rule_info in learned.items():
-                if (
-                    rule_info.get("diagram_type") == "sequence_diagram"
-                    and rule_info.get("active", False)
-                ):
-                    sequence_rules.append(rule_name)
+        if len(components) > max_components:
+            print("\n[LAYOUT WARNING] Logical view exceeds max components per view: "
+                  f"large diagrams are split into parts of at most {max_components}.")
+        else:
+            print("\nLayout check passed.")
+
+        # costi stimati dalla timing history: con più stage pronti che worker
+        # partono prima quelli sulle catene più lunghe (es. le descrizioni LLM)
+        items = dedupe(plan_architecture(docs_dir, kb, model, data, manifest, formats))
+        planned.update((item.name, item) for item in items)
+        ranks = stage_ranks(items)
+        for stage in stages:
+            stage.priority = ranks.get(stage.name, 0.0)
+            # il tipo di diagramma si conosce solo dalla KB caricata
+            view = stage.attrs.get("view")
+            if view is not None:
+                stage.attrs["diagram_type"] = kb.view_to_diagram_mapping.get(view)
+        total, path = critical_path(items)
+        print(f"\n[PLAN] {sum(i.state == 'run' for i in items)} of {len(items)} work items to run; "
+              f"critical path ~{total:.1f} s: {' -> '.join(i.name for i in path if i.cost > 0) or '-'}")
+
+        diagrams_dir.mkdir(parents=True, exist_ok=True)
+        return plan
+
+    stages = [
+        Stage("load", load),
+        Stage("plan", plan_stage, deps=["load"]),
+    ]
 
-            # 🔹 Generazione base con regole apprese
-            print("Loaded learned rules:", learned)
-            print("Sequence rules applied:", sequence_rules)
+    # =============================
+    # 3️⃣ Per-view stages
+    # (saltati se il manifest dice che gli input non sono cambiati)
+    # =============================
 
-            generate_sequence_diagram(
-                selected_model,
-                puml_path,
-                rules=sequence_rules
+    for view in FIXED_VIEW_ORDER:
+
+        def generate(loaded, plan, view=view):
+            if view not in plan.views:
+                return None
+            kb, _, model = loaded
+
+            diagram_type = kb.view_to_diagram_mapping.get(view)
+            artifact = f"diagram:{diagram_type}"
+            item = planned.get(f"generate:{view}")
+            deps = item.deps if item is not None else diagram_dependencies(diagram_type, model, kb)
+            puml_path = diagrams_dir / f"{diagram_type}.puml"
+
+            if diagram_type in DIAGRAM_INPUTS and manifest.is_fresh(artifact, deps):
+                return DiagramResult(puml_path, artifact, deps, fresh=True)
+
+            start = time.perf_counter()
+            puml_path = generate_view_diagram(model, kb, view, diagrams_dir)
+            get_timing_history().record(f"generate:{diagram_type}", time.perf_counter() - start)
+            return DiagramResult(puml_path, artifact, deps, fresh=False)
+
+        def compile_view(diagram):
+            """Returns the image names embedded for the view (main diagram first); [] if unavailable."""
+            if diagram is None or not diagram.files:
+                return []
+            outputs = [p.with_suffix(f".{fmt}") for p in diagram.files for fmt in render_formats]
+            images = [p.with_suffix(f".{render_formats[0]}").name for p in diagram.files]
+            # un formato richiesto per la prima volta va renderizzato anche se il sorgente è invariato
+            if diagram.fresh and all(p.exists() for p in outputs):
+                return images
+
+            if not safe_compile(diagram.files, render_formats):
+                return []
+            if diagram.artifact_type in DIAGRAM_INPUTS:
+                manifest.record(
+                    diagram.artifact,
+                    diagram.deps,
+                    outputs=diagram.files + outputs,
+                )
+            return images
+
+        def describe(loaded, plan, view=view):
+            if view not in plan.views:
+                return "", None
+            _, _, model = loaded
+
+            artifact = f"description:{view}"
+            item = planned.get(f"describe:{view}")
+            deps = item.deps if item is not None else description_dependencies(
+                build_description_prompt(model, view),
+                DEFAULT_MODEL,
+                DESCRIPTION_PARAMS,
             )
 
-            safe_compile(puml_path)
+            if manifest.is_fresh(artifact, deps):
+                return manifest.result(artifact) or "", deps
 
-            # 🔹 Analisi strutturale
-            try:
-                with open(puml_path, "r", encoding="utf-8") as f:
-                    uml_code = f.read()
+            # parte subito in background; assemble scrive i token man mano
+            # e registra la descrizione solo se è arrivata per intero
+            return BackgroundStream(lambda: stream_diagram_description(model, view)), deps
 
-                structural_feedback = analyze_sequence_structural(uml_code)
+        stages.append(Stage(f"generate:{view}", generate, deps=["load", "plan"], attrs={"view": view}))
+        stages.append(Stage(f"compile:{view}", compile_view, deps=[f"generate:{view}"], attrs={"view": view}))
+        stages.append(Stage(f"describe:{view}", describe, deps=["load", "plan"], attrs={"view": view}))
 
-                print("\n[STRUCTURAL FEEDBACK]:\n", structural_feedback)
+    # =============================
+    # 4️⃣ Document
+    # =============================
 
-                # 🔹 LLM → Estrazione regole strutturate
-                new_rules = extract_rules_from_feedback(
-                    "sequence_diagram",
-                    structural_feedback
-                )
+    def assemble(loaded, plan, *view_results):
+        kb, architecture_data, model = loaded
+
+        n = len(FIXED_VIEW_ORDER)
+        diagram_images = dict(zip(FIXED_VIEW_ORDER, view_results[:n]))
+        diagram_available = {v: bool(images) for v, images in diagram_images.items()}
+        descriptions = {v: r[0] for v, r in zip(FIXED_VIEW_ORDER, view_results[n:])}
+        description_deps = {
+            v: r[1] for v, r in zip(FIXED_VIEW_ORDER, view_results[n:]) if r[1]
+        }
+
+        def dependencies(texts):
+            return document_dependencies(
+                plan, model, kb, architecture_data,
+                ordered_plan_views(plan), diagram_available, texts,
+                diagram_images,
+            )
 
-                if new_rules:
-                    update_kb_from_feedback(
-                        kb_path,
-                        "sequence_diagram",
-                        new_rules
-                    )
-                    print("[KB UPDATED] Nuove regole salvate:", new_rules)
+        output_md = docs_dir / "documentation.md"
+        streams = {v: d for v, d in descriptions.items() if isinstance(d, BackgroundStream)}
+        texts = {v: d for v, d in descriptions.items() if isinstance(d, str) and d}
+
+        # una descrizione in arrivo è testo nuovo: il documento va comunque riscritto
+        # (e gli stream vanno consumati, non abbandonati)
+        if not streams and manifest.is_fresh("document", dependencies(texts)):
+            return output_md
+
+        sections = document_sections(
+            plan,
+            model,
+            kb,
+            architecture_data,  # ← JSON completo passato al builder
+            diagram_available,
+            descriptions,
+            diagram_images,
+        )
+        # sezioni invariate: copiate dai frammenti senza essere rigenerate
+        # (--rebuild-all le riscrive tutte)
+        fragments = FragmentCache(docs_dir / FRAGMENTS_DIR, reuse=not manifest.force)
+        output_md = write_document(docs_dir, sections, fragments)
+
+        # registrate qui e non sul thread dello stream: dopo assemble nessun
+        # thread scrive nel manifest, che `outputs` salva
+        for view, stream in streams.items():
+            stream.join()
+            if stream.complete and stream.text:
+                manifest.record(f"description:{view}", description_deps[view], result=stream.text)
+                texts[view] = stream.text
+
+        manifest.record("document", dependencies(texts), outputs=[output_md])
+        return output_md
+
+    async def outputs(output_md):
+        # ogni formato è ricostruito solo se markdown o immagini sono cambiati
+        produced = await render_outputs_async(docs_dir, output_md, formats, manifest)
+        manifest.save()
+        return produced
+
+    stages.append(Stage(
+        "assemble",
+        assemble,
+        deps=["load", "plan"]
+        + [f"compile:{v}" for v in FIXED_VIEW_ORDER]
+        + [f"describe:{v}" for v in FIXED_VIEW_ORDER],
+    ))
+    stages.append(Stage("outputs", outputs, deps=["assemble"], kind="async"))
+
+    return stages
+
+
+def run_documentation(docs_dir: Path, kb_path: Path, input_path: Path,
+                      architecture_id: str, jobs: int = 1, kb=None,
+                      architecture_data=None,
+                      rebuild_all: bool = False,
+                      formats: Sequence[str] = DEFAULT_FORMATS) -> List[Path]:
+    """Documents one architecture into docs_dir; returns the .puml files of the plan."""
+    manifest = BuildManifest(docs_dir / MANIFEST_NAME, force=rebuild_all)
+
+    stages = build_pipeline(
+        docs_dir, kb_path, input_path, architecture_id,
+        kb=kb, architecture_data=architecture_data, manifest=manifest,
+        formats=formats,
+    )
+    results = PipelineExecutor(jobs=jobs).run(stages)
+    get_timing_history().save()
+
+    return [
+        results[f"generate:{view}"].puml_path
+        for view in FIXED_VIEW_ORDER
+        if results[f"generate:{view}"] is not None
+    ]
+
+
+def plan_documentation(docs_dir: Path, kb_path: Path, input_path: Path,
+                       architecture_id: str, kb=None,
+                       architecture_data=None,
+                       rebuild_all: bool = False,
+                       formats: Sequence[str] = DEFAULT_FORMATS,
+                       refine_iterations: int = 0) -> List[WorkItem]:
+    """Dry run of run_documentation: the work it would do and its estimated cost; nothing is written."""
+    if kb is None:
+        kb = load_knowledge_base(kb_path)
+    source = architecture_data if architecture_data is not None else ArchitectureInput(input_path)
+    model = ArchitectureModel(select_architecture(source, architecture_id))
+    data = source.scoped(architecture_id) if isinstance(source, ArchitectureInput) else source
+
+    manifest = BuildManifest(docs_dir / MANIFEST_NAME, force=rebuild_all)
+    manifest.load()
+    return dedupe(plan_architecture(docs_dir, kb, model, data, manifest, formats, refine_iterations))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Documenter Agent")
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="Parallel workers for the pipeline (1 = serial execution).",
+    )
+    parser.add_argument(
+        "--refresh-llm",
+        action="store_true",
+        help="Ignore cached LLM responses and fetch them again.",
+    )
+    parser.add_argument(
+        "--rebuild-all",
+        action="store_true",
+        help="Ignore the build manifest and rebuild every artifact.",
+    )
+    parser.add_argument(
+        "--formats",
+        type=parse_formats,
+        default=list(DEFAULT_FORMATS),
+        help="Comma-separated output formats: md, html, pdf (default: md,pdf). "
+             "html is a self-contained page built without external tools.",
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=RENDERER_BACKENDS,
+        default="auto",
+        help="Diagram renderer: plantuml (JVM), native (in-process, component/"
+             "deployment/context diagrams; PlantUML for the others) or auto "
+             "(PlantUML when tools/plantuml.jar and java exist, native otherwise).",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Dry run: print the work the run would do (diagrams, renders, LLM and "
+             "Vision calls, outputs), what the manifest and caches already cover, "
+             "the estimated cost from recorded timings and the critical path; then exit.",
+    )
+    parser.add_argument(
+        "--input",
+        action="append",
+        type=Path,
+        help="Architecture input file (repeatable).",
+    )
+    parser.add_argument(
+        "--architecture",
+        action="append",
+        help="Architecture id to document (repeatable). "
+             "In batch mode the default is every architecture of each input.",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Document every selected architecture of every input "
+             "into docs/generated/<input>/<architecture>/.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for batch mode (default: CPU count).",
+    )
+    parser.add_argument(
+        "--refine",
+        action="store_true",
+        help="Run the Vision refinement loop on every diagram type before "
+             "documenting (learned rules go to the KB).",
+    )
+    parser.add_argument(
+        "--refine-iterations",
+        type=int,
+        default=3,
+        help="Maximum refinement iterations per diagram.",
+    )
+    parser.add_argument(
+        "--refine-budget",
+        type=float,
+        default=300.0,
+        help="Global time budget for refinement, in seconds.",
+    )
+    parser.add_argument(
+        "--refine-in-flight",
+        type=int,
+        default=2,
+        help="Maximum concurrent Vision requests during refinement.",
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        type=Path,
+        const=Path("docs/generated/trace.json"),
+        default=None,
+        help="Record per-stage timings; writes a Chrome trace-event JSON "
+             "(default docs/generated/trace.json) and prints a summary table.",
+    )
+    args = parser.parse_args(argv)
 
-                    # 🔥 RICARICA KB (QUESTO È IL FIX IMPORTANTE)
-                    kb = load_knowledge_base(kb_path)
+    if args.batch and args.refine:
+        # run_batch non ha un passo di refinement: meglio rifiutare che ignorarlo
+        parser.error("--refine is not supported with --batch; refine one architecture at a time")
+    if not args.batch:
+        for option, values in (("--input", args.input), ("--architecture", args.architecture)):
+            if values and len(values) > 1:
+                parser.error(f"{option} can be given only once without --batch")
+    return args
 
-                    # 🔹 Rigenerazione migliorata
-                    regenerate_sequence_with_feedback(
-                        selected_model,
-                        structural_feedback,
-                        puml_path
-                    )
-                    safe_compile(puml_path)
 
-            except Exception as e:
-                print("[STRUCTURAL ANALYSIS ERROR]", e)
+if __name__ == "__main__":
 
-        else:
-            print(f"[INFO] Diagram type '{diagram_type}' not implemented.")
+    args = parse_args()
+    get_llm_cache().refresh = args.refresh_llm
+    set_renderer_backend(args.renderer)
 
-        generated_files.append(puml_path)
+    if args.trace is not None:
+        enable_tracing()
 
-    # =============================
-    # 6️⃣ Build document
-    # =============================
+    BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
-    build_document_bundle(
-        BASE_DIR,
-        plan,
-        selected_model,
-        kb,
-        architecture_data  # ← JSON completo passato al builder
-    )
+    kb_path = BASE_DIR / "data" / "kb" / "documentation_rules.json"
+    input_paths = args.input or [BASE_DIR / "data" / "input" / "finalArchitecture.json"]
+
+    if args.batch:
+        from src.documenter.batch import run_batch
+
+        run_batch(
+            BASE_DIR / "docs" / "generated",
+            kb_path,
+            input_paths,
+            architecture_ids=args.architecture,
+            workers=args.workers,
+            jobs=args.jobs,
+            refresh_llm=args.refresh_llm,
+            rebuild_all=args.rebuild_all,
+            trace=args.trace is not None,
+            formats=args.formats,
+            renderer=args.renderer,
+            plan_only=args.plan,
+        )
+
+    elif args.plan:
+        selected_id = (args.architecture or ["Microservices Architecture"])[0]
+        items = plan_documentation(
+            BASE_DIR / "docs" / "generated",
+            kb_path,
+            input_paths[0],
+            selected_id,
+            rebuild_all=args.rebuild_all,
+            formats=args.formats,
+            refine_iterations=args.refine_iterations if args.refine else 0,
+        )
+        print_plan(selected_id, items, args.jobs)
+
+    else:
+        selected_id = (args.architecture or ["Microservices Architecture"])[0]
+        kb = load_knowledge_base(kb_path)
+
+        if args.refine:
+            from src.documenter.refinement import run_refinement
+
+            architecture_input = ArchitectureInput(input_paths[0])
+            run_refinement(
+                BASE_DIR / "docs" / "generated" / "refinement",
+                kb,
+                ArchitectureModel(select_architecture(architecture_input, selected_id)),
+                history_base_dir=BASE_DIR,
+                max_in_flight=args.refine_in_flight,
+                max_iterations=args.refine_iterations,
+                time_budget=args.refine_budget,
+            )
 
-    print("\nGenerated artifacts:")
-    for f in generated_files:
-        print(f"- {f}")
\ No newline at end of file
+        generated_files = run_documentation(
+            BASE_DIR / "docs" / "generated",
+            kb_path,
+            input_paths[0],
+            selected_id,
+            jobs=args.jobs,
+            kb=kb,
+            rebuild_all=args.rebuild_all,
+            formats=args.formats,
+        )
+
+        print("\nGenerated artifacts:")
+        for f in generated_files:
+            print(f"- {f}")
+
+        print(get_render_cache().stats_line())
+        print(get_llm_cache().stats_line())
+
+    tracer = get_tracer()
+    if tracer is not None:
+        trace_path = args.trace if args.trace.is_absolute() else BASE_DIR / args.trace
+        print("\n[TRACE SUMMARY]")
+        print(tracer.summary_table())
+        print(f"[TRACE] Chrome trace written to {tracer.export_chrome_trace(trace_path)}")
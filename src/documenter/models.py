@@ -1,4 +1,10 @@
-from typing import Dict, List
+import sys
+import threading
+from typing import Dict, List, Optional
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
 
 
 class Component:
@@ -6,8 +12,10 @@ class Component:
     Internal representation of a logical component.
     """
 
+    __slots__ = ("id", "responsibilities", "interfaces")
+
     def __init__(self, component_data: dict):
-        self.id: str = component_data.get("id")
+        self.id: str = _intern(component_data.get("id"))
         self.responsibilities: List[str] = component_data.get("responsibilities", [])
         self.interfaces: Dict = component_data.get("interfaces", {})
 
@@ -19,17 +27,77 @@ class Connector:
     Internal representation of a relationship between components.
     """
 
+    __slots__ = ("source", "target", "type")
+
     def __init__(self, connector_data: dict):
-        self.source: str = connector_data.get("source") or connector_data.get("name")
-        self.target: str = connector_data.get("target")
-        self.type: str = connector_data.get("type")
+        self.source: str = _intern(connector_data.get("source") or connector_data.get("name"))
+        self.target: str = _intern(connector_data.get("target"))
+        self.type: str = _intern(connector_data.get("type"))
 
     def __repr__(self):
         return f"Connector({self.source} -> {self.target})"
 
+
+class AliasTable:
+    """
+    Interned name -> PlantUML alias table, shared by all generators.
+
+    The alias is the name without spaces; when two different names would
+    get the same alias, the later one receives a numeric suffix and the
+    collision is recorded.
+    """
+
+    __slots__ = ("_by_name", "_by_alias", "collisions", "_lock")
+
+    def __init__(self):
+        self._by_name: Dict[str, str] = {}
+        self._by_alias: Dict[str, str] = {}
+        self.collisions: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def alias(self, name: str) -> str:
+        found = self._by_name.get(name)
+        if found is not None:
+            return found
+
+        with self._lock:
+            found = self._by_name.get(name)
+            if found is not None:
+                return found
+
+            base = name.replace(" ", "")
+            alias = base
+            suffix = 2
+            while alias in self._by_alias:
+                alias = f"{base}_{suffix}"
+                suffix += 1
+
+            if alias != base:
+                self.collisions.append((name, self._by_alias[base], alias))
+                print(f"[ALIAS WARNING] '{name}' collides with '{self._by_alias[base]}' "
+                      f"on alias '{base}', using '{alias}'.")
+
+            alias = sys.intern(alias)
+            self._by_name[name] = alias
+            self._by_alias[alias] = name
+            return alias
+
+    def name_for(self, alias: str) -> Optional[str]:
+        return self._by_alias.get(alias)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+
 class ArchitectureModel:
     """
     Internal representation of a selected architecture.
+
+    The logical view is parsed once: components, connectors, the alias
+    table and the connector adjacency indexes are shared by every caller.
     """
 
     def __init__(self, architecture_data: dict):
@@ -37,6 +105,56 @@ class ArchitectureModel:
         self.name: str = architecture_data.get("name")
         self.views: Dict = architecture_data.get("views", {})
 
+        logical_view = self.views.get("logical_view", {})
+        self._components: List[Component] = [
+            Component(c) for c in logical_view.get("components", [])
+        ]
+        self._connectors: List[Connector] = [
+            Connector(c) for c in logical_view.get("connectors", [])
+        ]
+
+        self._components_by_id: Dict[str, Component] = {}
+        for comp in self._components:
+            self._components_by_id.setdefault(comp.id, comp)
+
+        # Solo connettori completi (source e target) negli indici
+        self._edges: List[Connector] = []
+        self._outgoing: Dict[str, List[Connector]] = {}
+        self._incoming: Dict[str, List[Connector]] = {}
+        for conn in self._connectors:
+            if conn.source and conn.target:
+                self._edges.append(conn)
+                self._outgoing.setdefault(conn.source, []).append(conn)
+                self._incoming.setdefault(conn.target, []).append(conn)
+
+        self.aliases = AliasTable()
+        self._register_aliases()
+
+    def _register_aliases(self):
+        # Ordine deterministico: le collisioni non dipendono da quale
+        # generatore chiede per primo un alias
+        for comp in self._components:
+            if comp.id:
+                self.aliases.alias(comp.id)
+
+        for conn in self._edges:
+            self.aliases.alias(conn.source)
+            self.aliases.alias(conn.target)
+
+        deployment_view = self.views.get("deployment_view", {})
+        for node in deployment_view.get("nodes", []):
+            if isinstance(node, dict):
+                if node.get("name"):
+                    self.aliases.alias(node["name"])
+                for comp in node.get("components", []):
+                    self.aliases.alias(comp)
+            elif node:
+                self.aliases.alias(node)
+
+        for comp, node in deployment_view.get("component_mapping", {}).items():
+            self.aliases.alias(comp)
+            self.aliases.alias(node)
+
     def get_view_names(self) -> List[str]:
         return list(self.views.keys())
 
@@ -44,14 +162,26 @@ class ArchitectureModel:
         return self.views.get(view_name, {})
 
     def get_logical_components(self) -> List[Component]:
-        logical_view = self.views.get("logical_view", {})
-        components_data = logical_view.get("components", [])
-        return [Component(c) for c in components_data]
-    
+        return self._components
+
     def get_logical_connectors(self) -> List[Connector]:
-        logical_view = self.views.get("logical_view", {})
-        connectors_data = logical_view.get("connectors", [])
-        return [Connector(c) for c in connectors_data]
+        return self._connectors
+
+    def get_logical_edges(self) -> List[Connector]:
+        """Connectors with both source and target."""
+        return self._edges
+
+    def get_component(self, component_id: str) -> Optional[Component]:
+        return self._components_by_id.get(component_id)
+
+    def outgoing(self, component_id: str) -> List[Connector]:
+        return self._outgoing.get(component_id, [])
+
+    def incoming(self, component_id: str) -> List[Connector]:
+        return self._incoming.get(component_id, [])
+
+    def alias(self, name: str) -> str:
+        return self.aliases.alias(name)
 
     def to_dict(self) -> dict:
         return {
@@ -0,0 +1,837 @@
+import functools
+import io
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from src.documenter.build_manifest import code_fingerprint
+from src.documenter.plantuml_parser import Diagram, parse_plantuml
+from src.documenter.tracing import span
+
+
+# Formati prodotti senza JVM
+NATIVE_FORMATS = ("svg", "png")
+
+# Elementi che solo PlantUML sa disegnare (lifeline dei diagrammi di sequenza)
+SEQUENCE_KINDS = {"participant", "boundary", "control", "entity", "collections", "queue"}
+
+# Elementi che fanno di un sorgente un diagramma strutturale (component, deployment, contesto)
+STRUCTURAL_KINDS = {
+    "component", "node", "rectangle", "package", "cloud", "frame", "folder",
+    "interface", "usecase", "artifact", "storage", "agent", "system",
+}
+
+FONT_SIZE = 13
+LINE_HEIGHT = 16
+PAD_X, PAD_Y = 14, 10
+MIN_WIDTH = 60
+NODE_GAP = 36          # tra elementi dello stesso layer
+LAYER_GAP = 64         # tra layer consecutivi
+GROUP_PAD = 16
+GROUP_HEADER = 26
+MARGIN = 16
+DEPTH = 8              # profondità 3D dei node
+CYLINDER = 12          # altezza delle ellissi dei database
+TAB = 10               # linguetta di package / folder
+ACTOR_HEIGHT = 46
+# Layer più lunghi vanno a capo: diagrammi non partizionati restano leggibili
+MAX_ROW = 12
+SWEEPS = 4
+# Archi lunghi passano per vertici fittizi (uno per layer attraversato), finché
+# il loro numero resta entro BEND_LIMIT volte gli elementi; oltre, archi diretti
+BEND = "_bend"
+BEND_SIZE = 4
+BEND_LIMIT = 4
+# Lato massimo dei PNG, come PLANTUML_LIMIT_SIZE (qui l'immagine viene ridotta, non tagliata)
+PNG_LIMIT = 4096
+
+FILL = "#F1F1F1"
+GROUP_FILL = "#FFFFFF"
+STROKE = "#181818"
+EDGE_STROKE = "#181818"
+LABEL_FILL = "#FFFFFF"
+
+_SCALE = re.compile(
+    r"^scale\s+(?:(?P<max>max)\s+)?(?P<w>\d+(?:\.\d+)?)"
+    r"(?:\s*\*\s*(?P<h>\d+(?:\.\d+)?)|\s+(?P<unit>width|height))?\s*$",
+    re.IGNORECASE,
+)
+
+
+# =========================
+# TEXT METRICS
+# =========================
+
+@functools.lru_cache(maxsize=16)
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except (TypeError, OSError):
+        # Pillow senza FreeType: font bitmap a dimensione fissa
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=4096)
+def _text_width(text: str) -> float:
+    return _font(FONT_SIZE).getlength(text)
+
+
+def _lines(label: Optional[str]) -> List[str]:
+    # `\n` letterale nei label PlantUML = a capo
+    return (label or "").replace("\\n", "\n").split("\n")
+
+
+def _block_width(lines: List[str]) -> float:
+    return max((_text_width(line) for line in lines), default=0.0)
+
+
+def _color(style: Optional[str], default: str) -> str:
+    if not style:
+        return default
+    value = style.lstrip("#")
+    if len(value) in (3, 6) and all(c in "0123456789abcdefABCDEF" for c in value):
+        return f"#{value}"
+    try:
+        ImageColor.getrgb(value)
+    except ValueError:
+        return default
+    return value.lower()
+
+
+# =========================
+# MODEL
+# =========================
+
+class _Box:
+    """An element (or a container with its children) with its layout."""
+
+    __slots__ = ("key", "kind", "lines", "fill", "children", "parent", "x", "y", "w", "h", "loop")
+
+    def __init__(self, key: str, kind: str, label: str, fill: str, parent: Optional["_Box"] = None):
+        self.key = key
+        self.kind = kind
+        self.lines = _lines(label)
+        self.fill = fill
+        self.children: List["_Box"] = []
+        self.parent = parent
+        self.x = self.y = 0.0
+        self.w = self.h = 0.0
+        # spazio a destra per gli archi verso sé stesso e il loro label
+        self.loop = 0.0
+
+    def path(self) -> List["_Box"]:
+        chain = []
+        box = self
+        while box is not None:
+            chain.append(box)
+            box = box.parent
+        chain.reverse()
+        return chain
+
+    def center(self) -> Tuple[float, float]:
+        return self.x + self.w / 2, self.y + self.h / 2
+
+
+def supports(diagram: Diagram) -> bool:
+    """
+    True for the description diagrams drawn here: at least one structural
+    element, no sequence participants and no notes (their placement is
+    left to PlantUML).
+    """
+    if diagram.notes:
+        return False
+    kinds = {e.kind for e in diagram.elements}
+    return bool(kinds & STRUCTURAL_KINDS) and not kinds & SEQUENCE_KINDS
+
+
+def _build(diagram: Diagram, node_style: Optional[str] = None) -> Tuple[List[_Box], Dict[str, _Box]]:
+    boxes: Dict[str, _Box] = {}
+    roots: List[_Box] = []
+    for element in diagram.elements:
+        if element.alias in boxes:
+            continue
+        parent = boxes.get(element.parent) if element.parent else None
+        fill = _color(element.style, FILL)
+        # `skinparam nodeStyle rectangle`: i node perdono la forma 3D
+        kind = node_style if element.kind == "node" and node_style else element.kind
+        box = _Box(element.alias, kind, element.name, fill, parent)
+        boxes[element.alias] = box
+        # un name senza alias è raggiungibile anche per nome
+        boxes.setdefault(element.name, box)
+        (parent.children if parent is not None else roots).append(box)
+
+    # estremi non dichiarati: PlantUML li crea implicitamente
+    for edge in diagram.edges:
+        for name in (edge.source, edge.target):
+            if name not in boxes:
+                box = _Box(name, "component", name, FILL)
+                boxes[name] = box
+                roots.append(box)
+    return roots, boxes
+
+
+# =========================
+# LAYERED LAYOUT
+# =========================
+
+def _acyclic(count: int, edges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Reverses the back edges found by an (iterative) DFS in declaration order."""
+    successors: List[List[int]] = [[] for _ in range(count)]
+    for a, b in edges:
+        successors[a].append(b)
+
+    state = [0] * count  # 0 = nuovo, 1 = sullo stack, 2 = chiuso
+    back = set()
+    for root in range(count):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, iter(successors[root]))]
+        while stack:
+            v, it = stack[-1]
+            for n in it:
+                if state[n] == 0:
+                    state[n] = 1
+                    stack.append((n, iter(successors[n])))
+                    break
+                if state[n] == 1:
+                    back.add((v, n))
+            else:
+                state[v] = 2
+                stack.pop()
+
+    return [(b, a) if (a, b) in back else (a, b) for a, b in edges]
+
+
+def _layers(count: int, edges: List[Tuple[int, int]]) -> List[int]:
+    """Longest-path layering (Kahn order): every edge points to a later layer."""
+    successors: List[List[int]] = [[] for _ in range(count)]
+    indegree = [0] * count
+    for a, b in edges:
+        successors[a].append(b)
+        indegree[b] += 1
+
+    layer = [0] * count
+    queue = [v for v in range(count) if indegree[v] == 0]
+    for v in queue:
+        for n in successors[v]:
+            layer[n] = max(layer[n], layer[v] + 1)
+            indegree[n] -= 1
+            if indegree[n] == 0:
+                queue.append(n)
+    return layer
+
+
+def _order(layer_of: List[int], edges: List[Tuple[int, int]]) -> List[List[int]]:
+    """Barycenter crossing reduction, alternating downward and upward sweeps."""
+    depth = max(layer_of, default=-1) + 1
+    layers: List[List[int]] = [[] for _ in range(depth)]
+    for v, layer in enumerate(layer_of):
+        layers[layer].append(v)
+
+    up: List[List[int]] = [[] for _ in layer_of]
+    down: List[List[int]] = [[] for _ in layer_of]
+    for a, b in edges:
+        down[a].append(b)
+        up[b].append(a)
+
+    position = [0.0] * len(layer_of)
+    for members in layers:
+        for i, v in enumerate(members):
+            position[v] = i
+
+    for sweep in range(SWEEPS):
+        neighbours = up if sweep % 2 == 0 else down
+        sequence = layers[1:] if sweep % 2 == 0 else layers[-2::-1]
+        for members in sequence:
+            def barycenter(v):
+                linked = neighbours[v]
+                if not linked:
+                    return position[v]
+                return sum(position[n] for n in linked) / len(linked)
+            members.sort(key=lambda v: (barycenter(v), position[v]))
+            for i, v in enumerate(members):
+                position[v] = i
+    return layers
+
+
+def _measure(box: _Box):
+    text_w = _block_width(box.lines)
+    text_h = len(box.lines) * LINE_HEIGHT
+    if box.kind == "actor":
+        box.w = max(text_w, 30.0)
+        box.h = ACTOR_HEIGHT + text_h
+        return
+    box.w = max(text_w + 2 * PAD_X, MIN_WIDTH)
+    box.h = text_h + 2 * PAD_Y
+    if box.kind == "component":
+        box.w += 16   # icona
+    elif box.kind == "node":
+        box.w += DEPTH
+        box.h += DEPTH
+    elif box.kind == "database":
+        box.h += CYLINDER
+    elif box.kind == "usecase":
+        box.w *= 1.3
+        box.h += PAD_Y
+
+
+def _bends(items: List[_Box], pairs: List[Tuple[int, int]], layer_of: List[int],
+           routes: Dict[Tuple[int, int], List[_Box]]) -> List[Tuple[int, int]]:
+    """
+    Splits the edges spanning several layers with one bend vertex per layer
+    crossed (appended to `items`); records each route in source -> target
+    order. Returns the edges of the proper layered graph.
+    """
+    original = pairs
+    acyclic = _acyclic(len(items), pairs)
+    layer_of[:] = _layers(len(items), acyclic)
+    crossed = sum(max(0, layer_of[b] - layer_of[a] - 1) for a, b in acyclic)
+    if crossed > BEND_LIMIT * len(items):
+        return acyclic
+
+    edges = []
+    for (a, b), (source, target) in zip(acyclic, original):
+        if layer_of[b] - layer_of[a] <= 1:
+            edges.append((a, b))
+            continue
+        route, previous = [], a
+        for layer in range(layer_of[a] + 1, layer_of[b]):
+            bend = _Box("", BEND, "", FILL)
+            bend.w = bend.h = BEND_SIZE
+            edges.append((previous, len(items)))
+            previous = len(items)
+            items.append(bend)
+            layer_of.append(layer)
+            route.append(bend)
+        edges.append((previous, b))
+        routes[(id(items[source]), id(items[target]))] = route if a == source else route[::-1]
+    return edges
+
+
+def _inset(box: _Box) -> Tuple[float, float]:
+    """Extra width (3D side) and extra header height of a container's shape."""
+    if box.kind == "node":
+        return DEPTH, DEPTH
+    if box.kind in ("package", "folder"):
+        return 0, TAB
+    return 0, 0
+
+
+def _layout(items: List[_Box], edges: Sequence[Tuple[_Box, _Box, float, float]],
+            lr: bool, routes: Dict[Tuple[int, int], List[_Box]]) -> Tuple[float, float]:
+    """
+    Places `items` (sizes already known) in layers; positions are relative
+    to the container. `edges` carry the size of their label, which widens
+    the gap between layers. Bend vertices of long edges are appended to
+    `items` and their routes stored in `routes`.
+    Returns the width and height of the arrangement.
+    """
+    if not items:
+        return 0.0, 0.0
+    index = {id(box): i for i, box in enumerate(items)}
+    pairs = list(dict.fromkeys(
+        (index[id(a)], index[id(b)]) for a, b, _, _ in edges if a is not b
+    ))
+    # i label stanno tra due layer: la distanza deve contenerli
+    gap = max([LAYER_GAP] + [(w if lr else h) + 24 for _, _, w, h in edges])
+    layer_of: List[int] = []
+    pairs = _bends(items, pairs, layer_of, routes)
+    layers = _order(layer_of, pairs)
+
+    # a capo ogni MAX_ROW elementi reali (i vertici fittizi non contano)
+    rows: List[List[_Box]] = []
+    for members in layers:
+        row, real = [], 0
+        for v in members:
+            if real == MAX_ROW:
+                rows.append(row)
+                row, real = [], 0
+            row.append(items[v])
+            real += items[v].kind != BEND
+        rows.append(row)
+
+    # asse principale = direzione dei layer (y se top-down, x se left-to-right)
+    def along(box):
+        return box.w if lr else box.h
+
+    def across(box):
+        return box.h if lr else box.w
+
+    def gap_after(box):
+        return NODE_GAP + (0.0 if lr else box.loop)
+
+    extents = [sum(across(b) + gap_after(b) for b in row) - gap_after(row[-1]) for row in rows]
+    breadth = max(extents)
+    offset = 0.0
+    for row, extent in zip(rows, extents):
+        thickness = max(along(b) for b in row)
+        cursor = (breadth - extent) / 2
+        for box in row:
+            main = offset + (thickness - along(box)) / 2
+            if lr:
+                box.x, box.y = main, cursor
+            else:
+                box.x, box.y = cursor, main
+            cursor += across(box) + gap_after(box)
+        offset += thickness + gap
+    length = offset - gap
+    return (length, breadth) if lr else (breadth, length)
+
+
+def _arrange(roots: List[_Box], edges, lr: bool) -> Tuple[float, float, List[List[_Box]]]:
+    """
+    Compound layout: containers are laid out bottom-up (children first),
+    then each level is a layered graph of its direct children. An edge is
+    routed at the level of the lowest container holding both endpoints.
+    Returns the size and, per edge, the bend vertices it passes through.
+    """
+    by_container: Dict[int, List[Tuple[_Box, _Box, float, float]]] = {}
+    keys: List[Optional[Tuple[int, int]]] = []
+    for source, target, label in edges:
+        if source is target:
+            source.loop = max(source.loop, 28 + (_block_width(_lines(label)) + 10 if label else 0))
+        path_a, path_b = source.path(), target.path()
+        k = 0
+        while k < len(path_a) and k < len(path_b) and path_a[k] is path_b[k]:
+            k += 1
+        if k == len(path_a) or k == len(path_b):
+            keys.append(None)
+            continue   # arco verso il proprio contenitore
+        container = path_a[k - 1] if k else None
+        lines = _lines(label) if label else []
+        by_container.setdefault(id(container), []).append(
+            (path_a[k], path_b[k], _block_width(lines), len(lines) * LINE_HEIGHT)
+        )
+        keys.append((id(path_a[k]), id(path_b[k])))
+
+    routes: Dict[Tuple[int, int], List[_Box]] = {}
+
+    def place(items: List[_Box], container: Optional[_Box]) -> Tuple[float, float]:
+        for box in items:
+            _measure(box)
+            if box.children:
+                inner_w, inner_h = place(box.children, box)
+                label_w = _block_width(box.lines) + 2 * PAD_X
+                side, header = _inset(box)
+                box.w = max(inner_w + 2 * GROUP_PAD, label_w) + side
+                box.h = GROUP_HEADER + (len(box.lines) - 1) * LINE_HEIGHT + header + inner_h + GROUP_PAD
+        return _layout(items, by_container.get(id(container), ()), lr, routes)
+
+    width, height = place(roots, None)
+    return width, height, [routes.get(key, []) if key else [] for key in keys]
+
+
+def _absolute(items: List[_Box], dx: float, dy: float):
+    for box in items:
+        box.x += dx
+        box.y += dy
+        if box.children:
+            inner_w = max(c.x + c.w for c in box.children)
+            side, header = _inset(box)
+            shift = (box.w - side - inner_w) / 2
+            top = GROUP_HEADER + (len(box.lines) - 1) * LINE_HEIGHT + header
+            _absolute(box.children, box.x + shift, box.y + top)
+
+
+# =========================
+# DISPLAY LIST
+# =========================
+# Primitive condivise da SVG e PNG:
+#   ("rect", x, y, w, h, fill, stroke, radius)
+#   ("poly", points, fill, stroke)
+#   ("line", points, stroke, dashed)
+#   ("ellipse", cx, cy, rx, ry, fill, stroke)
+#   ("text", x, baseline, text, anchor, bold)
+
+def _text_block(ops, lines: List[str], cx: float, top: float, bold: bool = False,
+                anchor: str = "middle"):
+    for i, line in enumerate(lines):
+        ops.append(("text", cx, top + i * LINE_HEIGHT + FONT_SIZE, line, anchor, bold))
+
+
+def _draw_box(ops, box: _Box, rounded: bool):
+    x, y, w, h = box.x, box.y, box.w, box.h
+    container = bool(box.children)
+    fill = GROUP_FILL if container and box.fill == FILL else box.fill
+    text_h = len(box.lines) * LINE_HEIGHT
+
+    if box.kind == "actor":
+        cx = x + w / 2
+        ops.append(("ellipse", cx, y + 8, 7, 7, fill, STROKE))
+        ops.append(("line", [(cx, y + 15), (cx, y + 31)], STROKE, False))
+        ops.append(("line", [(cx - 11, y + 21), (cx + 11, y + 21)], STROKE, False))
+        ops.append(("line", [(cx - 9, y + 42), (cx, y + 31), (cx + 9, y + 42)], STROKE, False))
+        _text_block(ops, box.lines, cx, y + ACTOR_HEIGHT)
+        return
+
+    if box.kind == "node":
+        front_w, front_h = w - DEPTH, h - DEPTH
+        ops.append(("poly", [(x, y + DEPTH), (x + DEPTH, y), (x + w, y), (x + front_w, y + DEPTH)], fill, STROKE))
+        ops.append(("poly", [(x + front_w, y + DEPTH), (x + w, y), (x + w, y + front_h), (x + front_w, y + h)], fill, STROKE))
+        ops.append(("rect", x, y + DEPTH, front_w, front_h, fill, STROKE, 0))
+        if container:
+            _text_block(ops, box.lines, x + 8, y + DEPTH + 6, bold=True, anchor="start")
+        else:
+            _text_block(ops, box.lines, x + front_w / 2, y + DEPTH + (front_h - text_h) / 2)
+        return
+
+    if box.kind == "database":
+        ry = CYLINDER / 2
+        ops.append(("ellipse", x + w / 2, y + h - ry, w / 2, ry, fill, STROKE))
+        ops.append(("rect", x, y + ry, w, h - CYLINDER, fill, None, 0))
+        ops.append(("line", [(x, y + ry), (x, y + h - ry)], STROKE, False))
+        ops.append(("line", [(x + w, y + ry), (x + w, y + h - ry)], STROKE, False))
+        ops.append(("ellipse", x + w / 2, y + ry, w / 2, ry, fill, STROKE))
+        _text_block(ops, box.lines, x + w / 2, y + CYLINDER + (h - CYLINDER - text_h) / 2)
+        return
+
+    if box.kind == "usecase" and not container:
+        ops.append(("ellipse", x + w / 2, y + h / 2, w / 2, h / 2, fill, STROKE))
+        _text_block(ops, box.lines, x + w / 2, y + (h - text_h) / 2)
+        return
+
+    if box.kind in ("package", "folder"):
+        tab_w = min(w / 2, _block_width(box.lines[:1]) + 2 * PAD_X if container else 40)
+        ops.append(("rect", x, y, tab_w, TAB, fill, STROKE, 0))
+        ops.append(("rect", x, y + TAB, w, h - TAB, fill, STROKE, 0))
+        top = y + TAB
+    else:
+        radius = 20 if box.kind == "cloud" else 6 if rounded and box.kind == "rectangle" else 0
+        ops.append(("rect", x, y, w, h, fill, STROKE, radius))
+        top = y
+        if box.kind == "component":
+            ix, iy = x + w - 22, y + 6
+            ops.append(("rect", ix, iy, 14, 12, fill, STROKE, 0))
+            ops.append(("rect", ix - 3, iy + 2, 6, 3, fill, STROKE, 0))
+            ops.append(("rect", ix - 3, iy + 7, 6, 3, fill, STROKE, 0))
+
+    if container:
+        _text_block(ops, box.lines, x + 8, top + 6, bold=True, anchor="start")
+    else:
+        inner_w = w - (16 if box.kind == "component" else 0)
+        _text_block(ops, box.lines, x + inner_w / 2, top + (y + h - top - text_h) / 2)
+
+
+def _clip(box: _Box, px: float, py: float) -> Tuple[float, float]:
+    """Point where the segment from the box center towards (px, py) leaves the box."""
+    cx, cy = box.center()
+    dx, dy = px - cx, py - cy
+    if dx == 0 and dy == 0:
+        return cx, cy
+    hw, hh = box.w / 2, box.h / 2
+    t = min(hw / abs(dx) if dx else math.inf, hh / abs(dy) if dy else math.inf)
+    return cx + dx * t, cy + dy * t
+
+
+def _arrowhead(ops, tip: Tuple[float, float], tail: Tuple[float, float]):
+    (x, y), (tx, ty) = tip, tail
+    angle = math.atan2(y - ty, x - tx)
+    length, spread = 10, 0.4
+    left = (x - length * math.cos(angle - spread), y - length * math.sin(angle - spread))
+    right = (x - length * math.cos(angle + spread), y - length * math.sin(angle + spread))
+    ops.append(("poly", [tip, left, right], EDGE_STROKE, EDGE_STROKE))
+
+
+# Posizioni provate lungo l'arco per un label, dal centro verso gli estremi
+LABEL_POSITIONS = (0.5, 0.35, 0.65, 0.25, 0.75, 0.15, 0.85)
+# Oltre questo numero di label non si cercano sovrapposizioni (costo quadratico)
+LABEL_CHECK_LIMIT = 200
+
+
+def _overlaps(rect, placed) -> bool:
+    x, y, w, h = rect
+    return any(x < px + pw and px < x + w and y < py + ph and py < y + h for px, py, pw, ph in placed)
+
+
+def _draw_edges(ops, diagram: Diagram, boxes: Dict[str, _Box], routes: List[List[_Box]],
+                canvas_width: float):
+    labels = []
+    placed = [(b.x, b.y, b.w, b.h) for b in boxes.values() if not b.children]
+    check = len(diagram.edges) <= LABEL_CHECK_LIMIT
+    for edge, route in zip(diagram.edges, routes):
+        source, target = boxes[edge.source], boxes[edge.target]
+        style = edge.style
+        dashed = "." in style
+
+        if source is target:
+            x, cy = source.x + source.w, source.y + source.h / 2
+            points = [(x, cy - 10), (x + 24, cy - 10), (x + 24, cy + 10), (x, cy + 10)]
+        else:
+            bends = [bend.center() for bend in route]
+            first = bends[0] if bends else target.center()
+            last = bends[-1] if bends else source.center()
+            points = [_clip(source, *first)] + bends + [_clip(target, *last)]
+        ops.append(("line", points, EDGE_STROKE, dashed))
+        if style.endswith(">"):
+            _arrowhead(ops, points[-1], points[-2])
+        if style.startswith("<"):
+            _arrowhead(ops, points[0], points[1])
+
+        if edge.label:
+            lines = _lines(edge.label)
+            label_w, label_h = _block_width(lines) + 6, len(lines) * LINE_HEIGHT
+            middle = (len(points) - 2) // 2
+            (ax, ay), (bx, by) = points[middle], points[middle + 1]
+            if source is target:
+                # a destra dell'anello
+                ax = bx = ax + label_w / 2 + 4
+            candidates = []
+            for lift in (0, label_h / 2 + 2):
+                for t in LABEL_POSITIONS if check else LABEL_POSITIONS[:1]:
+                    # dentro l'immagine anche vicino ai bordi
+                    mx = min(max(ax + (bx - ax) * t, label_w / 2 + 2), canvas_width - label_w / 2 - 2)
+                    my = ay + (by - ay) * t - lift
+                    candidates.append((mx, (mx - label_w / 2, my - label_h / 2, label_w, label_h)))
+            # nessuna posizione libera: al centro dell'arco
+            mx, rect = next((c for c in candidates if not check or not _overlaps(c[1], placed)),
+                            candidates[0])
+            placed.append(rect)
+            labels.append(("rect", *rect, LABEL_FILL, None, 0))
+            _text_block(labels, lines, mx, rect[1] - 2)
+    # i label sopra a tutte le linee
+    ops.extend(labels)
+
+
+def _scale_factor(diagram: Diagram, width: float, height: float) -> float:
+    for directive in diagram.directives:
+        m = _SCALE.match(directive.strip())
+        if not m:
+            continue
+        w = float(m.group("w"))
+        h = float(m.group("h")) if m.group("h") else None
+        if m.group("unit") == "width":
+            factor = w / width
+        elif m.group("unit") == "height":
+            factor = w / height
+        elif h is not None:
+            factor = min(w / width, h / height)
+        else:
+            factor = w
+            if m.group("max"):
+                factor = w / max(width, height)
+        return min(factor, 1.0) if m.group("max") else factor
+    return 1.0
+
+
+def layout_diagram(diagram: Diagram) -> Tuple[list, float, float, float]:
+    """Display list, width, height and output scale of a parsed structural diagram."""
+    directives = [d.strip().lower() for d in diagram.directives]
+    lr = "left to right direction" in directives
+    rounded = "skinparam rectanglestyle rounded" in directives
+    node_style = "rectangle" if "skinparam nodestyle rectangle" in directives else None
+    title = next((d.strip()[6:].strip() for d in diagram.directives
+                  if d.strip().lower().startswith("title ")), None)
+
+    roots, boxes = _build(diagram, node_style)
+    edges = [(boxes[e.source], boxes[e.target], e.label) for e in diagram.edges]
+    width, height, routes = _arrange(roots, edges, lr)
+
+    top = MARGIN
+    ops: list = []
+    if title:
+        title_lines = _lines(title)
+        width = max(width, _block_width(title_lines))
+        _text_block(ops, title_lines, MARGIN + width / 2, MARGIN, bold=True)
+        top += len(title_lines) * LINE_HEIGHT + 12
+    _absolute(roots, MARGIN + (width - max((b.x + b.w for b in roots), default=0)) / 2, top)
+
+    def draw(items):
+        for box in items:
+            if box.kind != BEND:
+                _draw_box(ops, box, rounded)
+                draw(box.children)
+
+    draw(roots)
+    width += 2 * MARGIN
+    _draw_edges(ops, diagram, boxes, routes, width)
+
+    height += top + MARGIN
+    return ops, width, height, _scale_factor(diagram, width, height)
+
+
+# =========================
+# PAINTERS
+# =========================
+
+def _xml(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def _svg_points(points) -> str:
+    return " ".join(f"{x:.1f},{y:.1f}" for x, y in points)
+
+
+def paint_svg(ops: list, width: float, height: float, scale: float = 1.0) -> bytes:
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width * scale:.0f}" '
+        f'height="{height * scale:.0f}" viewBox="0 0 {width:.1f} {height:.1f}">',
+        f'<style>text{{font-family:sans-serif;font-size:{FONT_SIZE}px;fill:{STROKE}}}</style>',
+        '<rect width="100%" height="100%" fill="#FFFFFF"/>',
+    ]
+    append = out.append
+    for op in ops:
+        kind = op[0]
+        if kind == "rect":
+            _, x, y, w, h, fill, stroke, radius = op
+            rx = f' rx="{radius}"' if radius else ""
+            line = f' stroke="{stroke}"' if stroke else ""
+            append(f'<rect x="{x:.1f}" y="{y:.1f}" width="{w:.1f}" height="{h:.1f}"{rx} fill="{fill}"{line}/>')
+        elif kind == "poly":
+            _, points, fill, stroke = op
+            append(f'<polygon points="{_svg_points(points)}" fill="{fill}" stroke="{stroke}"/>')
+        elif kind == "line":
+            _, points, stroke, dashed = op
+            dash = ' stroke-dasharray="6 4"' if dashed else ""
+            append(f'<polyline points="{_svg_points(points)}" fill="none" stroke="{stroke}"{dash}/>')
+        elif kind == "ellipse":
+            _, cx, cy, rx, ry, fill, stroke = op
+            append(f'<ellipse cx="{cx:.1f}" cy="{cy:.1f}" rx="{rx:.1f}" ry="{ry:.1f}" '
+                   f'fill="{fill}" stroke="{stroke}"/>')
+        elif kind == "text":
+            _, x, y, text, anchor, bold = op
+            weight = ' font-weight="bold"' if bold else ""
+            append(f'<text x="{x:.1f}" y="{y:.1f}" text-anchor="{anchor}"{weight}>{_xml(text)}</text>')
+    append("</svg>\n")
+    return "\n".join(out).encode("utf-8")
+
+
+def _dashes(points, on: float = 6, off: float = 4):
+    for (ax, ay), (bx, by) in zip(points, points[1:]):
+        length = math.hypot(bx - ax, by - ay)
+        if not length:
+            continue
+        ux, uy = (bx - ax) / length, (by - ay) / length
+        d = 0.0
+        while d < length:
+            e = min(d + on, length)
+            yield [(ax + ux * d, ay + uy * d), (ax + ux * e, ay + uy * e)]
+            d = e + off
+
+
+def paint_png(ops: list, width: float, height: float, scale: float = 1.0) -> bytes:
+    scale = min(scale, PNG_LIMIT / width, PNG_LIMIT / height)
+    image = Image.new("RGB", (max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))), "white")
+    draw = ImageDraw.Draw(image)
+    stroke_w = max(1, round(scale))
+    font = _font(max(6, round(FONT_SIZE * scale)))
+
+    def pt(points):
+        return [(x * scale, y * scale) for x, y in points]
+
+    for op in ops:
+        kind = op[0]
+        if kind == "rect":
+            _, x, y, w, h, fill, stroke, radius = op
+            box = [x * scale, y * scale, (x + w) * scale, (y + h) * scale]
+            if radius:
+                draw.rounded_rectangle(box, radius * scale, fill=fill, outline=stroke, width=stroke_w)
+            else:
+                draw.rectangle(box, fill=fill, outline=stroke, width=stroke_w)
+        elif kind == "poly":
+            _, points, fill, stroke = op
+            draw.polygon(pt(points), fill=fill, outline=stroke)
+        elif kind == "line":
+            _, points, stroke, dashed = op
+            for segment in (_dashes(points) if dashed else [points]):
+                draw.line(pt(segment), fill=stroke, width=stroke_w)
+        elif kind == "ellipse":
+            _, cx, cy, rx, ry, fill, stroke = op
+            draw.ellipse([(cx - rx) * scale, (cy - ry) * scale, (cx + rx) * scale, (cy + ry) * scale],
+                         fill=fill, outline=stroke, width=stroke_w)
+        elif kind == "text":
+            _, x, y, text, anchor, bold = op
+            anchor = "ms" if anchor == "middle" else "ls"
+            draw.text((x * scale, y * scale), text, fill=STROKE, font=font, anchor=anchor)
+            if bold:
+                # il font di default non ha il grassetto: seconda passata spostata
+                draw.text((x * scale + 1, y * scale), text, fill=STROKE, font=font, anchor=anchor)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+PAINTERS = {"svg": paint_svg, "png": paint_png}
+
+
+def _paint(diagram: Diagram, output_format: str) -> bytes:
+    ops, width, height, scale = layout_diagram(diagram)
+    return PAINTERS[output_format](ops, width, height, scale)
+
+
+def render_native(source: str, output_format: str = "png") -> bytes:
+    """Renders a structural PlantUML source in-process; ValueError if it is not one."""
+    if output_format not in PAINTERS:
+        raise ValueError(f"Native renderer supports {', '.join(NATIVE_FORMATS)}, not {output_format}")
+    diagram = parse_plantuml(source)
+    if not supports(diagram):
+        raise ValueError("Not a structural diagram (sequence diagrams and notes need PlantUML)")
+    return _paint(diagram, output_format)
+
+
+# =========================
+# RENDERER
+# =========================
+
+class NativeRenderer:
+    """
+    Same interface as PlantUMLRenderer, without a JVM: component, deployment
+    and context diagrams are laid out and painted in-process.
+    Sources it cannot draw (sequence diagrams, notes, other formats) go to
+    `fallback` (a PlantUMLRenderer) when PlantUML is available.
+    """
+
+    backend = "native"
+
+    def __init__(self, output_format: str = "png", fallback=None):
+        self.output_format = output_format
+        self.fallback = fallback
+        self._version: Optional[str] = None
+
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            version = f"native-{code_fingerprint('native_renderer.py', 'plantuml_parser.py')[:16]}"
+            if self.fallback is not None:
+                version += f"+{self.fallback.version}"
+            self._version = version
+        return self._version
+
+    def start(self):
+        # la JVM di fallback parte solo se arriva un sorgente che la richiede
+        pass
+
+    def close(self):
+        if self.fallback is not None:
+            self.fallback.close()
+
+    def _native(self, source: str) -> Optional[bytes]:
+        if self.output_format not in PAINTERS:
+            return None
+        diagram = parse_plantuml(source)
+        return _paint(diagram, self.output_format) if supports(diagram) else None
+
+    def render(self, source: str) -> bytes:
+        """Renders one source and returns the image bytes."""
+        return self.render_many([source])[0]
+
+    def render_many(self, sources: Iterable[str]) -> List[bytes]:
+        """Draws the structural sources here; the others go to PlantUML in one batch."""
+        sources = list(sources)
+        with span("native.render_many", "render", format=self.output_format, count=len(sources)) as s:
+            images: List[Optional[bytes]] = [self._native(source) for source in sources]
+            s.set(bytes=sum(len(i) for i in images if i is not None))
+
+        delegated = [i for i, image in enumerate(images) if image is None]
+        if delegated:
+            if self.fallback is None:
+                raise RuntimeError(
+                    "Native renderer cannot draw this diagram (sequence diagrams and notes "
+                    "need PlantUML) and PlantUML is not available (tools/plantuml.jar + java)."
+                )
+            for i, image in zip(delegated, self.fallback.render_many([sources[i] for i in delegated])):
+                images[i] = image
+        return images
@@ -0,0 +1,429 @@
+import asyncio
+import base64
+import hashlib
+import html
+import os
+import re
+import shutil
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from src.documenter.build_manifest import output_dependencies
+from src.documenter.timing_history import get_timing_history
+from src.documenter.tracing import span
+
+
+DEFAULT_FORMATS = ("md", "pdf")
+
+# Formati precompilati del preambolo LaTeX (uno per preambolo distinto)
+LATEX_DIR = ".latex"
+
+_IMAGE_LINE = re.compile(r"^!\[(?P<alt>[^\]]*)\]\((?P<src>[^)\s]+)\)\s*$")
+_HEADING = re.compile(r"^(?P<level>#{1,6})\s+(?P<text>.*?)\s*#*$")
+_BULLET = re.compile(r"^[-*]\s+(?P<text>.*)$")
+
+_INLINE = (
+    (re.compile(r"\*\*(.+?)\*\*"), r"<strong>\1</strong>"),
+    (re.compile(r"(?<![\w\\])_(.+?)_(?!\w)"), r"<em>\1</em>"),
+    (re.compile(r"`([^`]+)`"), r"<code>\1</code>"),
+)
+
+_MIME_TYPES = {
+    ".png": "image/png",
+    ".svg": "image/svg+xml",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".pdf": "application/pdf",
+}
+
+HTML_STYLE = """
+body { max-width: 58rem; margin: 2rem auto; padding: 0 1rem;
+       font: 16px/1.55 -apple-system, "Segoe UI", Helvetica, Arial, sans-serif; color: #1f2328; }
+h1, h2, h3 { line-height: 1.25; }
+h2 { border-bottom: 1px solid #d8dee4; padding-bottom: .3rem; margin-top: 2rem; }
+hr { border: 0; border-top: 1px solid #d8dee4; margin: 2rem 0; }
+figure { margin: 1rem 0; text-align: center; }
+figure img { max-width: 100%; height: auto; }
+figcaption { font-size: .9rem; color: #59636e; }
+code { background: #f6f8fa; padding: .1rem .3rem; border-radius: 4px; }
+""".strip()
+
+
+def referenced_images(output_md: Path, image_format: Optional[str] = None) -> List[Path]:
+    """
+    Local images embedded by the markdown (one line per image, as the builder
+    writes them). With `image_format`, the same images in that format.
+    """
+    output_md = Path(output_md)
+    images = []
+    with open(output_md, "r", encoding="utf-8") as f:
+        for line in f:
+            m = _IMAGE_LINE.match(line.strip())
+            if m and "://" not in m.group("src"):
+                image = output_md.parent / m.group("src")
+                images.append(image.with_suffix(f".{image_format}") if image_format else image)
+    return list(dict.fromkeys(images))
+
+
+def _with_image_format(output_md: Path, image_format: str, target: Path) -> Path:
+    """
+    Markdown whose diagram images point to `image_format` (e.g. png for
+    LaTeX, which cannot include svg). Returns output_md itself when every
+    image already has that format.
+    """
+    suffix = f".{image_format}"
+    with open(output_md, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+
+    changed = False
+    for i, line in enumerate(lines):
+        m = _IMAGE_LINE.match(line.strip())
+        if m and "://" not in m.group("src") and not m.group("src").endswith(suffix):
+            source = str(Path(m.group("src")).with_suffix(suffix))
+            lines[i] = f"![{m.group('alt')}]({source})\n"
+            changed = True
+
+    if not changed:
+        return output_md
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text("".join(lines), encoding="utf-8")
+    return target
+
+
+# =========================
+# HTML
+# =========================
+
+def _inline(text: str) -> str:
+    text = html.escape(text, quote=False)
+    for pattern, replacement in _INLINE:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _data_uri(path: Path) -> Optional[str]:
+    mime = _MIME_TYPES.get(path.suffix.lower())
+    if mime is None or not path.exists():
+        return None
+    return f"data:{mime};base64," + base64.b64encode(path.read_bytes()).decode("ascii")
+
+
+def write_html(output_md: Path, output_html: Path, title: str = "Architectural Documentation") -> Path:
+    """
+    Self-contained HTML from the builder's markdown, in one streaming pass
+    (headings, rules, bullet lists, paragraphs, bold/italic/code, images
+    inlined as data URIs). No external process.
+    """
+    output_md, output_html = Path(output_md), Path(output_html)
+    tmp = output_html.with_name(f"{output_html.name}.{os.getpid()}.tmp")
+
+    with open(output_md, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as out:
+        out.write(
+            "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{html.escape(title)}</title>\n<style>\n{HTML_STYLE}\n</style>\n"
+            "</head>\n<body>\n"
+        )
+
+        paragraph: List[str] = []
+        in_list = False
+
+        def end_blocks():
+            nonlocal in_list
+            if paragraph:
+                out.write("<p>" + "<br>\n".join(_inline(l) for l in paragraph) + "</p>\n")
+                paragraph.clear()
+            if in_list:
+                out.write("</ul>\n")
+                in_list = False
+
+        for raw in src:
+            line = raw.strip()
+
+            if not line:
+                end_blocks()
+                continue
+
+            if line == "---":
+                end_blocks()
+                out.write("<hr>\n")
+                continue
+
+            m = _HEADING.match(line)
+            if m:
+                end_blocks()
+                level = len(m.group("level"))
+                out.write(f"<h{level}>{_inline(m.group('text'))}</h{level}>\n")
+                continue
+
+            m = _IMAGE_LINE.match(line)
+            if m:
+                end_blocks()
+                alt = m.group("alt")
+                source = m.group("src")
+                uri = None if "://" in source else _data_uri(output_md.parent / source)
+                out.write(
+                    f"<figure><img src=\"{html.escape(uri or source)}\" alt=\"{html.escape(alt)}\">"
+                    f"<figcaption>{_inline(alt)}</figcaption></figure>\n"
+                )
+                continue
+
+            m = _BULLET.match(line)
+            if m:
+                if paragraph:
+                    end_blocks()
+                if not in_list:
+                    out.write("<ul>\n")
+                    in_list = True
+                out.write(f"<li>{_inline(m.group('text'))}</li>\n")
+                continue
+
+            if in_list:
+                end_blocks()
+            paragraph.append(line)
+
+        end_blocks()
+        out.write("</body>\n</html>\n")
+
+    os.replace(tmp, output_html)
+    return output_html
+
+
+# =========================
+# PDF (pandoc + xelatex)
+# =========================
+
+def _pandoc_command(docs_dir: Path, output_md: Path, output_pdf: Path) -> list:
+    return [
+        "pandoc",
+        str(output_md),
+        "-o",
+        str(output_pdf),
+        "--pdf-engine=xelatex",
+        "--resource-path",
+        str(docs_dir),
+    ]
+
+
+async def generate_pdf_async(docs_dir: Path, output_md: Path) -> bool:
+    """Converts output_md to documentation.pdf with pandoc (run as an asyncio subprocess)."""
+    output_pdf = docs_dir / "documentation.pdf"
+    try:
+        with span("pandoc", "subprocess") as s:
+            proc = await asyncio.create_subprocess_exec(
+                *_pandoc_command(docs_dir, output_md, output_pdf)
+            )
+            returncode = await proc.wait()
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, "pandoc")
+            s.set(bytes=output_pdf.stat().st_size)
+        print(f"[PDF GENERATED] {output_pdf}")
+        return True
+    except Exception as e:
+        print("[WARNING] PDF generation failed:", e)
+        return False
+
+
+async def _run_quiet(cmd: list, cwd: Path, env: Optional[dict] = None) -> int:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, cwd=str(cwd), env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    return await proc.wait()
+
+
+async def generate_pdf_precompiled(docs_dir: Path, output_md: Path) -> bool:
+    """
+    pandoc -> LaTeX only (no engine run), then xelatex on the body with the
+    preamble loaded from a precompiled format (mylatexformat). The format is
+    built once per distinct preamble and kept in <docs>/.latex/.
+    Returns False when the toolchain cannot do it; the caller falls back to
+    plain pandoc.
+    """
+    if shutil.which("pandoc") is None or shutil.which("xelatex") is None:
+        return False
+
+    latex_dir = docs_dir / LATEX_DIR
+    latex_dir.mkdir(parents=True, exist_ok=True)
+    tex_path = latex_dir / "documentation.tex"
+    output_pdf = docs_dir / "documentation.pdf"
+
+    with span("pandoc.latex", "subprocess"):
+        if await _run_quiet(["pandoc", str(output_md), "-s", "-t", "latex", "-o", str(tex_path)], docs_dir) != 0:
+            return False
+
+    tex = tex_path.read_text(encoding="utf-8")
+    split = tex.find("\\begin{document}")
+    if split < 0:
+        return False
+    preamble, body = tex[:split], tex[split:]
+
+    fmt_name = "preamble-" + hashlib.sha256(preamble.encode("utf-8")).hexdigest()[:16]
+    fmt_file = latex_dir / f"{fmt_name}.fmt"
+    failed = latex_dir / f"{fmt_name}.failed"
+    if failed.exists():
+        return False
+
+    if not fmt_file.exists():
+        (latex_dir / f"{fmt_name}.tex").write_text(
+            preamble + "\\begin{document}\n\\end{document}\n", encoding="utf-8"
+        )
+        with span("xelatex.format", "subprocess"):
+            rc = await _run_quiet(
+                ["xelatex", "-ini", "-interaction=nonstopmode", f"-jobname={fmt_name}",
+                 "&xelatex", "mylatexformat.ltx", f"{fmt_name}.tex"],
+                latex_dir,
+            )
+        if rc != 0 or not fmt_file.exists():
+            # preambolo non precompilabile (es. font nativi): non si riprova
+            failed.touch()
+            return False
+        for stale in latex_dir.glob("preamble-*.fmt"):
+            if stale != fmt_file:
+                stale.unlink()
+
+    tex_path.write_text(f"%&{fmt_name}\n{body}", encoding="utf-8")
+    env = dict(os.environ, TEXFORMATS=f"{latex_dir}{os.pathsep}")
+
+    with span("xelatex", "subprocess") as s:
+        rc = await _run_quiet(
+            ["xelatex", "-interaction=nonstopmode", "-halt-on-error", f"-fmt={fmt_name}",
+             f"-output-directory={latex_dir}", str(tex_path)],
+            docs_dir, env,
+        )
+        built = latex_dir / "documentation.pdf"
+        if rc != 0 or not built.exists():
+            return False
+        os.replace(built, output_pdf)
+        s.set(bytes=output_pdf.stat().st_size)
+
+    print(f"[PDF GENERATED] {output_pdf} (precompiled preamble)")
+    return True
+
+
+# =========================
+# BACKENDS
+# =========================
+
+class OutputBackend:
+    """Turns documentation.md into one output format, using diagrams in `image_format`."""
+
+    name = ""
+    suffix = ""
+    image_format = "png"
+
+    def output_path(self, output_md: Path) -> Path:
+        return output_md.with_suffix(self.suffix)
+
+    def dependencies(self, output_md: Path) -> Optional[Dict[str, str]]:
+        """None = nothing to gate (the output is the markdown itself)."""
+        return output_dependencies(output_md, referenced_images(output_md, self.image_format))
+
+    async def render(self, docs_dir: Path, output_md: Path) -> bool:
+        raise NotImplementedError
+
+
+class MarkdownBackend(OutputBackend):
+    """documentation.md is written by the assemble stage."""
+
+    name = "md"
+    suffix = ".md"
+    image_format = "svg"
+
+    def dependencies(self, output_md: Path) -> Optional[Dict[str, str]]:
+        return None
+
+    async def render(self, docs_dir: Path, output_md: Path) -> bool:
+        return output_md.exists()
+
+
+class HtmlBackend(OutputBackend):
+    name = "html"
+    suffix = ".html"
+    image_format = "svg"
+
+    async def render(self, docs_dir: Path, output_md: Path) -> bool:
+        try:
+            output_html = await asyncio.to_thread(write_html, output_md, self.output_path(output_md))
+            print(f"[HTML GENERATED] {output_html}")
+            return True
+        except Exception as e:
+            print("[WARNING] HTML generation failed:", e)
+            return False
+
+
+class PdfBackend(OutputBackend):
+    name = "pdf"
+    suffix = ".pdf"
+    image_format = "png"
+
+    async def render(self, docs_dir: Path, output_md: Path) -> bool:
+        output_md = _with_image_format(output_md, self.image_format, docs_dir / LATEX_DIR / output_md.name)
+        try:
+            if await generate_pdf_precompiled(docs_dir, output_md):
+                return True
+        except Exception as e:
+            print("[WARNING] Precompiled PDF path failed, using pandoc:", e)
+        return await generate_pdf_async(docs_dir, output_md)
+
+
+BACKENDS: Dict[str, OutputBackend] = {
+    "md": MarkdownBackend(),
+    "html": HtmlBackend(),
+    "pdf": PdfBackend(),
+}
+
+
+def image_formats(formats: Sequence[str]) -> List[str]:
+    """Diagram formats to render for these outputs; the first one is embedded in the markdown."""
+    needed = {BACKENDS[name].image_format for name in formats}
+    # vettoriale per il documento quando qualche formato lo usa
+    return sorted(needed, key=lambda fmt: (fmt != "svg", fmt))
+
+
+def parse_formats(value: str) -> List[str]:
+    """'md,html,pdf' -> ['md', 'html', 'pdf'] (order kept, duplicates dropped)."""
+    formats = list(dict.fromkeys(f.strip().lower() for f in value.split(",") if f.strip()))
+    unknown = [f for f in formats if f not in BACKENDS]
+    if unknown or not formats:
+        raise ValueError(f"unknown output format(s): {', '.join(unknown) or value!r}; "
+                         f"choose from {', '.join(BACKENDS)}")
+    return formats
+
+
+async def render_outputs_async(docs_dir: Path, output_md: Path, formats: Sequence[str] = DEFAULT_FORMATS,
+                               manifest=None) -> Dict[str, Optional[Path]]:
+    """
+    Renders the requested formats concurrently. With a manifest, a format
+    whose markdown, images and backend code are unchanged is skipped.
+    Returns format -> output path (None if it failed).
+    """
+
+    async def one(name: str) -> Optional[Path]:
+        backend = BACKENDS[name]
+        output = backend.output_path(output_md)
+        artifact = f"output:{name}"
+        deps = backend.dependencies(output_md) if manifest is not None else None
+
+        if deps is not None and manifest.is_fresh(artifact, deps):
+            return output
+
+        start = time.perf_counter()
+        with span(f"output.{name}", "output"):
+            ok = await backend.render(docs_dir, output_md)
+
+        if ok:
+            get_timing_history().record(artifact, time.perf_counter() - start)
+        if ok and deps is not None:
+            manifest.record(artifact, deps, outputs=[output])
+        return output if ok else None
+
+    results = await asyncio.gather(*(one(name) for name in formats))
+    return dict(zip(formats, results))
+
+
+def render_outputs(docs_dir: Path, output_md: Path, formats: Sequence[str] = DEFAULT_FORMATS,
+                   manifest=None) -> Dict[str, Optional[Path]]:
+    return asyncio.run(render_outputs_async(docs_dir, output_md, formats, manifest))
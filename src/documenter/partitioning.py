@@ -0,0 +1,210 @@
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+
+
+# Passate di raffinamento (spostamento dei singoli vertici) dopo la crescita greedy
+REFINE_PASSES = 2
+
+
+def _adjacency(vertices: Sequence[Hashable],
+               edges: Iterable[Tuple[Hashable, Hashable, float]]) -> Dict[Hashable, Dict[Hashable, float]]:
+    adjacency: Dict[Hashable, Dict[Hashable, float]] = {v: {} for v in vertices}
+    for a, b, weight in edges:
+        if a == b or a not in adjacency or b not in adjacency:
+            continue
+        adjacency[a][b] = adjacency[a].get(b, 0) + weight
+        adjacency[b][a] = adjacency[b].get(a, 0) + weight
+    return adjacency
+
+
+def _grow(adjacency, order, max_size) -> Dict[Hashable, int]:
+    """
+    Greedy growth: seed = highest-degree unassigned vertex, then repeatedly
+    add the frontier vertex with the most edge weight into the part.
+    """
+    rank = {v: i for i, v in enumerate(order)}
+    part_of: Dict[Hashable, int] = {}
+    part = 0
+
+    for seed in order:
+        if seed in part_of:
+            continue
+        part_of[seed] = part
+        size = 1
+        frontier: Dict[Hashable, float] = {}
+        for n, w in adjacency[seed].items():
+            if n not in part_of:
+                frontier[n] = frontier.get(n, 0) + w
+
+        while size < max_size and frontier:
+            best = max(frontier, key=lambda v: (frontier[v], -rank[v]))
+            del frontier[best]
+            part_of[best] = part
+            size += 1
+            for n, w in adjacency[best].items():
+                if n not in part_of:
+                    frontier[n] = frontier.get(n, 0) + w
+
+        part += 1
+
+    return part_of
+
+
+def _refine(adjacency, order, part_of, max_size):
+    """Moves a vertex to the neighbouring part holding most of its edges, if it has room."""
+    sizes: Dict[int, int] = {}
+    for p in part_of.values():
+        sizes[p] = sizes.get(p, 0) + 1
+
+    for _ in range(REFINE_PASSES):
+        moved = 0
+        for v in order:
+            current = part_of[v]
+            weights: Dict[int, float] = {}
+            for n, w in adjacency[v].items():
+                p = part_of[n]
+                weights[p] = weights.get(p, 0) + w
+            if not weights:
+                continue
+
+            best, best_weight = current, weights.get(current, 0)
+            for p, w in weights.items():
+                if w > best_weight and sizes[p] < max_size:
+                    best, best_weight = p, w
+
+            if best != current:
+                part_of[v] = best
+                sizes[current] -= 1
+                sizes[best] += 1
+                moved += 1
+        if not moved:
+            break
+
+
+def _collect(order, part_of) -> List[List[Hashable]]:
+    parts: Dict[int, List[Hashable]] = {}
+    for v in order:
+        parts.setdefault(part_of[v], []).append(v)
+    return list(parts.values())
+
+
+def _merge(parts: List[List[Hashable]], adjacency, max_size) -> List[List[Hashable]]:
+    """
+    Merges undersized parts into the neighbour they share most edges with,
+    then packs what is left (first-fit decreasing: no new cut edges).
+    """
+    part_of = {v: i for i, members in enumerate(parts) for v in members}
+    alive = {i: list(members) for i, members in enumerate(parts)}
+
+    for i in sorted(alive, key=lambda i: (len(alive[i]), i)):
+        members = alive.get(i)
+        if members is None or len(members) >= max_size:
+            continue
+
+        links: Dict[int, float] = {}
+        for v in members:
+            for n, w in adjacency[v].items():
+                p = part_of[n]
+                if p != i:
+                    links[p] = links.get(p, 0) + w
+
+        candidates = [
+            p for p in links
+            if len(alive[p]) + len(members) <= max_size
+        ]
+        if not candidates:
+            continue
+
+        target = max(candidates, key=lambda p: (links[p], -p))
+        alive[target].extend(members)
+        for v in members:
+            part_of[v] = target
+        del alive[i]
+
+    full = [m for m in alive.values() if len(m) >= max_size]
+    bins: List[List[Hashable]] = []
+    # best fit: bin aperti indicizzati per spazio libero (al più max_size chiavi)
+    by_free: Dict[int, List[int]] = {}
+    for members in sorted((m for m in alive.values() if len(m) < max_size), key=len, reverse=True):
+        free = next((f for f in range(len(members), max_size) if by_free.get(f)), None)
+        if free is None:
+            bins.append(list(members))
+            b = len(bins) - 1
+        else:
+            b = by_free[free].pop()
+            bins[b].extend(members)
+        left = max_size - len(bins[b])
+        if left:
+            by_free.setdefault(left, []).append(b)
+
+    return full + bins
+
+
+def _check_max_size(max_size: int):
+    if max_size < 2:
+        raise ValueError(f"max_size must be at least 2, got {max_size}")
+
+
+def partition_graph(vertices: Iterable[Hashable],
+                    edges: Iterable[Tuple[Hashable, Hashable, float]],
+                    max_size: int) -> List[List[Hashable]]:
+    """
+    Splits a graph into parts of at most `max_size` vertices, keeping
+    connected vertices together so that few edges cross between parts.
+    Deterministic for a given input order; O(V + E) per pass.
+    Raises ValueError for `max_size` < 2 (no edge could stay inside a part).
+    """
+    _check_max_size(max_size)
+    vertices = list(dict.fromkeys(vertices))
+    if len(vertices) <= max_size:
+        return [vertices] if vertices else []
+
+    adjacency = _adjacency(vertices, edges)
+    position = {v: i for i, v in enumerate(vertices)}
+    order = sorted(vertices, key=lambda v: (-sum(adjacency[v].values()), position[v]))
+
+    part_of = _grow(adjacency, order, max_size)
+    _refine(adjacency, vertices, part_of, max_size)
+    parts = _merge(_collect(vertices, part_of), adjacency, max_size)
+
+    # ordine stabile: per prima occorrenza nell'input
+    for members in parts:
+        members.sort(key=position.__getitem__)
+    parts.sort(key=lambda members: position[members[0]])
+    return parts
+
+
+def cross_edges(parts: List[List[Hashable]],
+                edges: Iterable[Tuple[Hashable, Hashable, float]]) -> Dict[Tuple[int, int], float]:
+    """(source part, target part) -> summed weight of the edges between them."""
+    part_of = {v: i for i, members in enumerate(parts) for v in members}
+    links: Dict[Tuple[int, int], float] = {}
+    for a, b, weight in edges:
+        pa, pb = part_of.get(a), part_of.get(b)
+        if pa is None or pb is None or pa == pb:
+            continue
+        links[(pa, pb)] = links.get((pa, pb), 0) + weight
+    return links
+
+
+def overview_levels(part_count: int, part_links: Dict[Tuple[int, int], float],
+                    max_size: int) -> List[Tuple[List[List[int]], Dict[Tuple[int, int], float]]]:
+    """
+    Groups the parts bottom-up until one group of at most `max_size` items
+    is left, so that every overview diagram stays bounded too.
+    Returns one (groups, links) pair per level: level 0 groups the parts,
+    level k groups the groups of level k-1; `links` are the weighted edges
+    between the items being grouped. The last level holds a single group.
+    Raises ValueError for `max_size` < 2 (the levels would never shrink).
+    """
+    _check_max_size(max_size)
+    levels = []
+    count, links = part_count, part_links
+
+    while count > max_size:
+        groups = partition_graph(range(count), ((a, b, w) for (a, b), w in links.items()), max_size)
+        levels.append((groups, links))
+        links = cross_edges(groups, ((a, b, w) for (a, b), w in links.items()))
+        count = len(groups)
+
+    levels.append(([list(range(count))], links))
+    return levels
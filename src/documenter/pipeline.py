@@ -0,0 +1,221 @@
+import asyncio
+import functools
+import heapq
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.documenter.tracing import span
+
+
+class Stage:
+    """
+    A node of the documentation pipeline.
+
+    `fn` receives the results of `deps`, in order, as positional arguments.
+    `kind` selects where it runs:
+    - "thread":  thread pool (I/O, JVM renders, HTTP calls)
+    - "process": process pool (CPU-bound work; fn and args must be picklable)
+    - "async":   coroutine on the event loop (asyncio subprocesses)
+    `priority` orders ready stages competing for a worker (higher first);
+    it may be set while the pipeline runs, before the stage becomes ready.
+    `attrs` are added to the stage's trace span (e.g. view, diagram_type);
+    like `priority`, they may be filled in by an earlier stage.
+    """
+
+    KINDS = ("thread", "process", "async")
+
+    def __init__(self, name: str, fn: Callable[..., Any],
+                 deps: Iterable[str] = (), kind: str = "thread",
+                 priority: float = 0.0, attrs: Optional[Dict[str, Any]] = None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown stage kind '{kind}' for stage '{name}'.")
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.kind = kind
+        self.priority = priority
+        self.attrs = dict(attrs or {})
+
+    def __repr__(self):
+        return f"Stage({self.name}, deps={self.deps}, kind={self.kind})"
+
+
+def _run_stage(stage: Stage, args: list):
+    with span(stage.name, "stage", kind=stage.kind, **stage.attrs):
+        return stage.fn(*args)
+
+
+async def _run_async_stage(stage: Stage, args: list):
+    with span(stage.name, "stage", kind=stage.kind, **stage.attrs):
+        return await stage.fn(*args)
+
+
+def topological_order(stages: List[Stage]) -> List[Stage]:
+    """Stable topological sort: ties keep declaration order."""
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f"Duplicate stage '{stage.name}'.")
+        by_name[stage.name] = stage
+
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'.")
+
+    ordered = []
+    state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+    def visit(stage: Stage):
+        mark = state.get(stage.name)
+        if mark == 2:
+            return
+        if mark == 1:
+            raise ValueError(f"Dependency cycle through stage '{stage.name}'.")
+        state[stage.name] = 1
+        for dep in stage.deps:
+            visit(by_name[dep])
+        state[stage.name] = 2
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+
+    return ordered
+
+
+class _PriorityGate:
+    """
+    `slots` workers shared by the blocking stages of one pool: a free slot
+    goes to the waiting stage with the highest priority (then declaration order).
+    """
+
+    def __init__(self, slots: int):
+        self.free = slots
+        self.waiting: list = []  # heap di (-priority, order, future)
+        self._scheduled = False
+
+    async def acquire(self, stage: Stage, order: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (-stage.priority, order, future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.free += 1
+        self._schedule()
+
+    def _schedule(self):
+        # assegnazione differita di un giro del loop: gli stage diventati
+        # pronti nello stesso momento competono per lo slot
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self._dispatch)
+
+    def _dispatch(self):
+        self._scheduled = False
+        while self.free and self.waiting:
+            _, _, future = heapq.heappop(self.waiting)
+            if future.cancelled():
+                continue
+            self.free -= 1
+            future.set_result(None)
+
+
+class PipelineExecutor:
+    """
+    Runs a stage graph.
+
+    jobs <= 1 runs the stages one at a time on the calling thread (the
+    serial reference path): among the ready ones, the highest priority
+    first, ties in topological order. Otherwise each stage starts as soon
+    as its dependencies are done: blocking stages go to thread/process
+    pools of `jobs` workers, highest priority first when more are ready
+    than workers; async stages run on the event loop.
+    """
+
+    def __init__(self, jobs: int = 1):
+        self.jobs = max(1, int(jobs))
+
+    def run(self, stages: List[Stage]) -> Dict[str, Any]:
+        ordered = topological_order(stages)
+
+        if self.jobs == 1:
+            return self._run_serial(ordered)
+
+        return asyncio.run(self._run_parallel(ordered))
+
+    # -----------------------------
+    # Serial path
+    # -----------------------------
+
+    @staticmethod
+    def _run_serial(ordered: List[Stage]) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        pending = list(ordered)
+        while pending:
+            # le priorità possono cambiare durante la run: si rileggono a ogni passo
+            ready = [s for s in pending if all(d in results for d in s.deps)]
+            stage = max(ready, key=lambda s: s.priority)
+            pending.remove(stage)
+            args = [results[d] for d in stage.deps]
+            if stage.kind == "async":
+                results[stage.name] = asyncio.run(_run_async_stage(stage, args))
+            else:
+                results[stage.name] = _run_stage(stage, args)
+        return {stage.name: results[stage.name] for stage in ordered}
+
+    # -----------------------------
+    # Parallel path
+    # -----------------------------
+
+    async def _run_parallel(self, ordered: List[Stage]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        thread_pool = ThreadPoolExecutor(max_workers=self.jobs)
+        process_pool: Optional[ProcessPoolExecutor] = None
+
+        if any(s.kind == "process" for s in ordered):
+            process_pool = ProcessPoolExecutor(max_workers=self.jobs)
+
+        gates = {"thread": _PriorityGate(self.jobs), "process": _PriorityGate(self.jobs)}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: Stage, order: int):
+            if stage.deps:
+                await asyncio.gather(*(tasks[d] for d in stage.deps))
+            args = [tasks[d].result() for d in stage.deps]
+
+            if stage.kind == "async":
+                return await _run_async_stage(stage, args)
+
+            gate = gates[stage.kind]
+            await gate.acquire(stage, order)
+            try:
+                if stage.kind == "process":
+                    # lo span del processo figlio non è visibile: si misura dal padre
+                    with span(stage.name, "stage", kind=stage.kind):
+                        return await loop.run_in_executor(process_pool, functools.partial(stage.fn, *args))
+
+                return await loop.run_in_executor(thread_pool, functools.partial(_run_stage, stage, args))
+            finally:
+                gate.release()
+
+        try:
+            # ordine topologico: le dipendenze hanno sempre già un task
+            for order, stage in enumerate(ordered):
+                tasks[stage.name] = asyncio.ensure_future(run_stage(stage, order))
+
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            thread_pool.shutdown(wait=True)
+            if process_pool is not None:
+                process_pool.shutdown(wait=True)
+
+        return {name: task.result() for name, task in tasks.items()}
@@ -0,0 +1,205 @@
+import re
+from typing import Dict, List, Optional
+
+
+# Parole chiave che dichiarano un elemento (partecipanti, componenti, nodi, gruppi)
+ELEMENT_KINDS = (
+    "actor", "participant", "boundary", "control", "entity", "database",
+    "collections", "queue", "component", "node", "rectangle", "package",
+    "cloud", "frame", "folder", "interface", "usecase", "artifact",
+    "storage", "agent", "system",
+)
+
+_DECLARATION = re.compile(
+    r'^(?P<kind>' + "|".join(ELEMENT_KINDS) + r')\s+'
+    r'(?:"(?P<qname>[^"]*)"|(?P<name>[^\s"{#]+))'
+    r'(?:\s+as\s+(?P<alias>[^\s"{#]+))?'
+    r'(?P<rest>.*)$',
+    re.IGNORECASE,
+)
+
+_ENDPOINT = r'(?:"[^"]+"|\[[^\]]+\]|[\w.$@]+)'
+
+_EDGE = re.compile(
+    r'^(?P<source>' + _ENDPOINT + r')\s*'
+    r'(?P<arrow>[ox*]?<{0,2}[-.]+(?:\[[^\]]*\])?[-.]*(?:>{1,2}|[\\/ox*])?)\s*'
+    r'(?P<target>' + _ENDPOINT + r')'
+    r'(?:\s*(?:\+\+|--|\*\*|!!))?'
+    r'\s*(?::\s*(?P<label>.*))?$'
+)
+
+_STYLE = re.compile(r"#\w+")
+
+# Blocchi multi-riga il cui contenuto non è struttura del diagramma
+_BLOCK_END = {
+    "note": "end note",
+    "legend": "endlegend",
+    "header": "endheader",
+    "footer": "endfooter",
+}
+
+
+class Element:
+    """A declared participant, component, node or group."""
+
+    __slots__ = ("kind", "name", "alias", "line", "parent", "style")
+
+    def __init__(self, kind: str, name: str, alias: str, line: int, parent: Optional[str],
+                 style: Optional[str] = None):
+        self.kind = kind
+        self.name = name
+        self.alias = alias
+        self.line = line
+        self.parent = parent
+        # colore inline della dichiarazione (`#LightBlue`)
+        self.style = style
+
+    def __repr__(self):
+        return f"Element({self.kind} {self.alias})"
+
+
+class Edge:
+    """A message or connector between two elements (always source -> target)."""
+
+    __slots__ = ("source", "target", "arrow", "label", "line")
+
+    def __init__(self, source: str, target: str, arrow: str, label: Optional[str], line: int):
+        self.source = source
+        self.target = target
+        self.arrow = arrow
+        self.label = label
+        self.line = line
+
+    @property
+    def style(self) -> str:
+        """Arrow shape without direction and inline color (e.g. '->', '-->', '..>')."""
+        body = re.sub(r"\[[^\]]*\]", "", self.arrow)
+        heads = len(body) - len(body.lstrip("<"))
+        if heads and not body.endswith(">"):
+            return body[heads:] + ">" * heads
+        return body
+
+    def __repr__(self):
+        return f"Edge({self.source} {self.arrow} {self.target})"
+
+
+class Diagram:
+    """AST of one @startuml ... @enduml block."""
+
+    def __init__(self):
+        self.elements: List[Element] = []
+        self.edges: List[Edge] = []
+        self.directives: List[str] = []
+        self.notes = 0
+        self.line_count = 0
+        self._by_alias: Dict[str, Element] = {}
+
+    def add_element(self, element: Element):
+        self.elements.append(element)
+        self._by_alias.setdefault(element.alias, element)
+
+    def element(self, alias: str) -> Optional[Element]:
+        return self._by_alias.get(alias)
+
+    def elements_of(self, *kinds: str) -> List[Element]:
+        return [e for e in self.elements if e.kind in kinds]
+
+    @property
+    def first_edge_line(self) -> Optional[int]:
+        return self.edges[0].line if self.edges else None
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    if len(value) >= 2 and value[0] == "[" and value[-1] == "]":
+        return value[1:-1]
+    return value
+
+
+def parse_plantuml(source: str) -> Diagram:
+    """
+    Single pass over the source, at most two anchored regex attempts per line
+    (edges first: `System --> X` is a message, not a declaration).
+    Linear in the number of lines; comments, skinparams and note/legend
+    blocks are skipped without further matching.
+    """
+    diagram = Diagram()
+    groups: List[str] = []
+    block_end: Optional[str] = None
+    in_comment = False
+
+    for number, raw in enumerate(source.splitlines(), start=1):
+        diagram.line_count = number
+        line = raw.strip()
+        if not line:
+            continue
+
+        if in_comment:
+            if line.endswith("'/"):
+                in_comment = False
+            continue
+
+        if block_end is not None:
+            if line.lower() == block_end:
+                block_end = None
+            continue
+
+        first = line[0]
+
+        if first == "'":
+            continue
+        if line.startswith("/'"):
+            in_comment = not line.endswith("'/")
+            continue
+        if first == "@":
+            continue
+        if line == "}":
+            if groups:
+                groups.pop()
+            continue
+
+        head = line.split(None, 1)[0].lower()
+
+        if head in ("skinparam", "scale", "title", "hide", "show", "autonumber",
+                    "left", "top", "!include", "!theme", "newpage", "box", "end"):
+            diagram.directives.append(line)
+            continue
+
+        if head in _BLOCK_END:
+            diagram.notes += head == "note"
+            # nota su una riga: "note right of X : testo"
+            if ":" not in line:
+                block_end = _BLOCK_END[head]
+            continue
+
+        m = _EDGE.match(line)
+        if m:
+            source_name = _unquote(m.group("source"))
+            target_name = _unquote(m.group("target"))
+            arrow = m.group("arrow")
+            if arrow.lstrip("ox*").startswith("<") and not arrow.endswith(">"):
+                source_name, target_name = target_name, source_name
+            label = m.group("label")
+            diagram.edges.append(Edge(
+                source_name, target_name, arrow,
+                label.strip() if label else None, number,
+            ))
+            continue
+
+        m = _DECLARATION.match(line)
+        if m and m.group("kind").lower() == head:
+            name = m.group("qname") if m.group("qname") is not None else m.group("name")
+            alias = m.group("alias") or name
+            style = _STYLE.search(m.group("rest"))
+            diagram.add_element(Element(
+                head, name, alias, number, groups[-1] if groups else None,
+                style.group(0) if style else None,
+            ))
+            if m.group("rest").rstrip().endswith("{"):
+                groups.append(alias)
+            continue
+
+        diagram.directives.append(line)
+
+    return diagram
@@ -0,0 +1,379 @@
+import atexit
+import collections
+import hashlib
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from src.documenter.tracing import span
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_JAR = BASE_DIR / "tools" / "plantuml.jar"
+
+# Marker written by PlantUML after every image in pipe mode.
+PIPE_DELIMITER = "___DOCUMENTER_PLANTUML_END___"
+
+# Con -pipeNoStderr un errore di sintassi arriva su stdout al posto dell'immagine
+ERROR_HEADER = b"ERROR"
+
+# Secondi massimi di attesa per un'immagine prima di uccidere la JVM
+DEFAULT_READ_TIMEOUT = 120.0
+
+# auto: PlantUML quando jar e java ci sono, altrimenti il renderer nativo
+# native: renderer nativo per i diagrammi strutturali, PlantUML per gli altri
+RENDERER_BACKENDS = ("auto", "plantuml", "native")
+
+
+class PlantUMLSyntaxError(RuntimeError):
+    """A source PlantUML could not parse (it would have drawn an error image)."""
+
+    def __init__(self, line: str, message: str, index: int = 0):
+        super().__init__(f"PlantUML syntax error at line {line}: {message}")
+        self.line = line
+        self.message = message
+        self.index = index
+
+
+class PlantUMLRenderer:
+    """
+    Long-lived PlantUML process in pipe mode.
+
+    A single JVM is started on first use and kept alive for the whole run:
+    diagram sources are written to its stdin and the rendered images are
+    read back from stdout, separated by PIPE_DELIMITER.
+    A source with a syntax error raises PlantUMLSyntaxError instead of
+    returning PlantUML's error image; an image that takes longer than
+    `read_timeout` kills the process.
+    """
+
+    backend = "plantuml"
+
+    def __init__(self, jar_path: Path = DEFAULT_JAR, output_format: str = "png",
+                 java: str = "java", read_timeout: float = DEFAULT_READ_TIMEOUT):
+        self.jar_path = Path(jar_path)
+        self.output_format = output_format
+        self.java = java
+        self.read_timeout = read_timeout
+
+        self._proc: Optional[subprocess.Popen] = None
+        self._buffer = b""
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stderr_tail = collections.deque(maxlen=20)
+        self._timed_out = False
+
+    @property
+    def version(self) -> str:
+        """
+        Fingerprint of the PlantUML jar (content hash).
+        Computed without starting the JVM, so cache lookups stay cheap.
+        """
+        if self._version is None:
+            if not self.jar_path.exists():
+                raise FileNotFoundError(f"PlantUML jar not found at {self.jar_path}")
+
+            digest = hashlib.sha256()
+            with open(self.jar_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            self._version = f"plantuml-{digest.hexdigest()[:16]}"
+        return self._version
+
+    def available(self) -> bool:
+        """True when both the jar and the java executable are present."""
+        return self.jar_path.exists() and shutil.which(self.java) is not None
+
+    # -----------------------------
+    # Process lifecycle
+    # -----------------------------
+
+    def start(self):
+        if self._proc is not None and self._proc.poll() is None:
+            return
+
+        if not self.jar_path.exists():
+            raise FileNotFoundError(f"PlantUML jar not found at {self.jar_path}")
+
+        self._buffer = b""
+        self._stderr_tail.clear()
+        self._proc = subprocess.Popen(
+            [
+                self.java,
+                "-Djava.awt.headless=true",
+                "-jar", str(self.jar_path),
+                "-pipe",
+                f"-t{self.output_format}",
+                "-pipedelimitor", PIPE_DELIMITER,
+                "-pipeNoStderr",
+                "-charset", "UTF-8",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        # stderr va sempre svuotato, altrimenti la JVM si blocca
+        threading.Thread(
+            target=self._drain_stderr, args=(self._proc,), daemon=True
+        ).start()
+
+    def close(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=10)
+        except Exception:
+            proc.kill()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _drain_stderr(self, proc: subprocess.Popen):
+        for line in iter(proc.stderr.readline, b""):
+            self._stderr_tail.append(line.decode("utf-8", errors="replace").rstrip())
+
+    # -----------------------------
+    # Pipe protocol
+    # -----------------------------
+
+    @staticmethod
+    def _prepare_source(source: str) -> bytes:
+        text = source.strip()
+        if not text.endswith("\n"):
+            text += "\n"
+        return text.encode("utf-8")
+
+    def _write(self, payload: bytes):
+        self._proc.stdin.write(payload)
+        self._proc.stdin.flush()
+
+    def _kill(self, proc: subprocess.Popen):
+        # watchdog: lo stdout chiuso sblocca la lettura in corso
+        self._timed_out = True
+        proc.kill()
+
+    def _read_image(self) -> bytes:
+        marker = PIPE_DELIMITER.encode("ascii")
+
+        watchdog = threading.Timer(self.read_timeout, self._kill, args=(self._proc,))
+        watchdog.daemon = True
+        self._timed_out = False
+        watchdog.start()
+        try:
+            while True:
+                index = self._buffer.find(marker)
+                if index != -1:
+                    rest = self._buffer[index + len(marker):]
+                    # PlantUML chiude il delimitatore con println()
+                    if rest.startswith(b"\r\n") or rest.startswith(b"\n"):
+                        image = self._buffer[:index]
+                        self._buffer = rest[2:] if rest.startswith(b"\r") else rest[1:]
+                        return image
+
+                chunk = self._proc.stdout.read1(65536)
+                if not chunk:
+                    details = "\n".join(self._stderr_tail)
+                    self.close()
+                    if self._timed_out:
+                        raise RuntimeError(f"PlantUML renderer timed out after {self.read_timeout:.0f}s.")
+                    raise RuntimeError(f"PlantUML renderer exited unexpectedly.\n{details}")
+
+                self._buffer += chunk
+        finally:
+            watchdog.cancel()
+
+    @staticmethod
+    def _check_image(output: bytes, index: int = 0) -> bytes:
+        """The image, or PlantUMLSyntaxError for an `ERROR / line / message` block."""
+        if not output.startswith(ERROR_HEADER):
+            return output
+        lines = output.decode("utf-8", errors="replace").splitlines()
+        line = lines[1].strip() if len(lines) > 1 else "?"
+        message = " ".join(l.strip() for l in lines[2:] if l.strip()) or "unknown error"
+        raise PlantUMLSyntaxError(line, message, index)
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+
+    def render(self, source: str) -> bytes:
+        """Renders one PlantUML source and returns the image bytes."""
+        with self._lock, span("plantuml.render", "subprocess", format=self.output_format) as s:
+            self.start()
+            try:
+                self._write(self._prepare_source(source))
+                image = self._read_image()
+            except (BrokenPipeError, OSError) as e:
+                self.close()
+                raise RuntimeError(f"PlantUML renderer failed: {e}") from e
+            image = self._check_image(image)
+            s.set(bytes=len(image))
+            return image
+
+    def render_many(self, sources: Iterable[str]) -> List[bytes]:
+        """
+        Renders many sources over the same channel.
+        Sources are written from a separate thread while images are read,
+        so large batches cannot deadlock on full pipe buffers. The whole
+        batch is read even when a source fails, so the channel stays in
+        sync; then the first failing source raises PlantUMLSyntaxError.
+        """
+        payloads = [self._prepare_source(s) for s in sources]
+        if not payloads:
+            return []
+
+        with self._lock, span("plantuml.render_many", "subprocess",
+                              format=self.output_format, count=len(payloads)) as s:
+            self.start()
+            errors = []
+
+            def writer():
+                try:
+                    for payload in payloads:
+                        self._write(payload)
+                except Exception as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=writer, daemon=True)
+            thread.start()
+
+            try:
+                images = [self._read_image() for _ in payloads]
+            finally:
+                thread.join()
+
+            if errors:
+                self.close()
+                raise RuntimeError(f"PlantUML renderer failed: {errors[0]}")
+
+            images = [self._check_image(image, i) for i, image in enumerate(images)]
+            s.set(bytes=sum(len(i) for i in images))
+            return images
+
+    def render_file(self, puml_path: Path, output_path: Optional[Path] = None) -> Path:
+        """Renders a .puml file next to itself, like `java -jar plantuml.jar file.puml`."""
+        puml_path = Path(puml_path)
+        output_path = output_path or puml_path.with_suffix(f".{self.output_format}")
+
+        image = self.render(puml_path.read_text(encoding="utf-8"))
+        output_path.write_bytes(image)
+        return output_path
+
+    def render_files(self, puml_paths: Iterable[Path]) -> List[Path]:
+        puml_paths = [Path(p) for p in puml_paths]
+        images = self.render_many(p.read_text(encoding="utf-8") for p in puml_paths)
+
+        outputs = []
+        for puml_path, image in zip(puml_paths, images):
+            output_path = puml_path.with_suffix(f".{self.output_format}")
+            output_path.write_bytes(image)
+            outputs.append(output_path)
+        return outputs
+
+
+# =========================
+# SHARED INSTANCES
+# =========================
+
+_renderers: Dict[str, PlantUMLRenderer] = {}
+_renderers_lock = threading.Lock()
+_backend = "auto"
+_fallback_reported = False
+
+
+def set_renderer_backend(name: str):
+    """Selects auto / plantuml / native for the renderers created from now on."""
+    global _backend
+    if name not in RENDERER_BACKENDS:
+        raise ValueError(f"Unknown renderer '{name}' (choose from {', '.join(RENDERER_BACKENDS)})")
+    # le istanze create per il backend precedente vanno chiuse
+    shutdown_renderers()
+    _backend = name
+
+
+def _create_renderer(output_format: str):
+    plantuml = PlantUMLRenderer(output_format=output_format)
+    if _backend == "plantuml":
+        return plantuml
+
+    available = plantuml.available()
+    if _backend == "auto" and available:
+        return plantuml
+
+    from src.documenter.native_renderer import NativeRenderer
+
+    global _fallback_reported
+    if not available and not _fallback_reported:
+        _fallback_reported = True
+        print(f"[RENDER] PlantUML not available ({plantuml.jar_path.name} + {plantuml.java}): "
+              "structural diagrams are drawn by the native renderer.")
+    return NativeRenderer(output_format, fallback=plantuml if available else None)
+
+
+def get_renderer(output_format: str = "png") -> PlantUMLRenderer:
+    """Returns the process-wide renderer for the given format (started lazily)."""
+    with _renderers_lock:
+        renderer = _renderers.get(output_format)
+        if renderer is None:
+            renderer = _create_renderer(output_format)
+            _renderers[output_format] = renderer
+        return renderer
+
+
+def renderer_fingerprint() -> str:
+    """Identity of the renderer that draws the images (a build dependency of every diagram)."""
+    try:
+        return get_renderer("png").version
+    except FileNotFoundError:
+        return "unavailable"
+
+
+def render_many_formats(sources_by_format: Dict[str, List[str]]) -> Dict[str, List[bytes]]:
+    """
+    Renders the same request in several formats at once.
+    PlantUML's pipe mode emits one format per process, so each format has
+    its own warm renderer; the batches are driven concurrently.
+    """
+    jobs = {fmt: sources for fmt, sources in sources_by_format.items() if sources}
+    results: Dict[str, List[bytes]] = {fmt: [] for fmt in sources_by_format}
+    if len(jobs) <= 1:
+        for fmt, sources in jobs.items():
+            results[fmt] = get_renderer(fmt).render_many(sources)
+        return results
+
+    errors = []
+
+    def run(fmt, sources):
+        try:
+            results[fmt] = get_renderer(fmt).render_many(sources)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=item, daemon=True) for item in jobs.items()]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+def shutdown_renderers():
+    with _renderers_lock:
+        for renderer in _renderers.values():
+            renderer.close()
+        _renderers.clear()
+
+
+atexit.register(shutdown_renderers)
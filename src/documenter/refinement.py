@@ -0,0 +1,213 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.documenter.models import ArchitectureModel
+from src.documenter.timing_history import get_timing_history
+from src.documenter.uml_generator import (
+    RULE_DRIVEN_DIAGRAM_TYPES,
+    compile_plantuml_files,
+    diagram_files,
+    generate_component_diagram,
+    generate_context_diagram,
+    generate_deployment_diagram,
+    generate_security_diagram,
+    generate_sequence_diagram,
+    render_for_vision,
+)
+from src.documenter.vision_analyzer import analyze_diagram_async
+from src.documenter.vision_memory import save_vision_feedback
+from src.documenter.vision_rule_extractor import extract_rules_from_feedback
+
+
+DEFAULT_MAX_IN_FLIGHT = 2
+DEFAULT_MAX_ITERATIONS = 3
+DEFAULT_TIME_BUDGET = 300.0
+
+
+class RefinementTarget:
+    """
+    One diagram to refine.
+    generate_fn() writes the .puml; regenerate_fn(vision_text) rewrites it
+    using what was learned (by default it just runs generate_fn again).
+    With `learns_rules=False` (the generator takes no learned rules) the
+    diagram is analyzed once and its feedback only goes to the history.
+    """
+
+    def __init__(self, diagram_type: str, puml_path: Path,
+                 generate_fn: Callable[[], None],
+                 regenerate_fn: Optional[Callable[[str], None]] = None,
+                 learns_rules: bool = True):
+        self.diagram_type = diagram_type
+        self.puml_path = puml_path
+        self.generate_fn = generate_fn
+        self.regenerate_fn = regenerate_fn or (lambda vision_text: generate_fn())
+        self.learns_rules = learns_rules
+
+
+class RefinementReport:
+
+    def __init__(self, diagram_type: str):
+        self.diagram_type = diagram_type
+        self.iterations = 0
+        self.seconds = 0.0
+        self.rules_learned: List[str] = []
+        self.stop_reason = ""
+
+
+def build_refinement_targets(model: ArchitectureModel, kb, diagrams_dir: Path) -> List[RefinementTarget]:
+    """One target per diagram type mapped in the KB."""
+    diagrams_dir.mkdir(parents=True, exist_ok=True)
+
+    generators = {
+        "component_diagram": generate_component_diagram,
+        "deployment_diagram": generate_deployment_diagram,
+        "context_diagram": generate_context_diagram,
+        "security_diagram": generate_security_diagram,
+    }
+
+    partitioned = {"component_diagram", "deployment_diagram"}
+    max_components = kb.max_components_per_view()
+
+    targets = []
+    for diagram_type in dict.fromkeys(kb.view_to_diagram_mapping.values()):
+        puml_path = diagrams_dir / f"{diagram_type}.puml"
+
+        if diagram_type == "sequence_diagram":
+            # le regole apprese cambiano il sorgente alla rigenerazione
+            def generate(path=puml_path):
+                generate_sequence_diagram(model, path, rules=kb.rules_for("sequence_diagram"))
+        elif diagram_type in partitioned:
+            # oltre il limite: Vision analizza la panoramica, le parti vengono compilate alla fine
+            def generate(path=puml_path, fn=generators[diagram_type]):
+                fn(model, path, max_components)
+        elif diagram_type in generators:
+            def generate(path=puml_path, fn=generators[diagram_type]):
+                fn(model, path)
+        else:
+            continue
+
+        targets.append(RefinementTarget(
+            diagram_type, puml_path, generate,
+            learns_rules=diagram_type in RULE_DRIVEN_DIAGRAM_TYPES,
+        ))
+
+    return targets
+
+
+async def refine_diagram(target: RefinementTarget, kb, architecture_id: str,
+                         semaphore: asyncio.Semaphore, deadline: float,
+                         max_iterations: int, history_base_dir: Optional[Path] = None) -> RefinementReport:
+    """
+    generate -> render (in memoria) -> vision -> regole -> regenerate,
+    finché il feedback non porta regole nuove o il sorgente non cambia.
+    """
+    report = RefinementReport(target.diagram_type)
+    start = time.perf_counter()
+    short_type = target.diagram_type.replace("_diagram", "")
+
+    await asyncio.to_thread(target.generate_fn)
+    source = target.puml_path.read_text(encoding="utf-8")
+
+    while True:
+        if report.iterations >= max_iterations:
+            report.stop_reason = "iteration cap"
+            break
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            report.stop_reason = "time budget"
+            break
+
+        report.iterations += 1
+
+        try:
+            image = await asyncio.to_thread(render_for_vision, source)
+            async with semaphore:
+                vision_start = time.perf_counter()
+                feedback = await asyncio.wait_for(
+                    analyze_diagram_async(image, short_type),
+                    timeout=max(0.0, deadline - time.monotonic()),
+                )
+                get_timing_history().record(f"vision:{target.diagram_type}", time.perf_counter() - vision_start)
+        except asyncio.TimeoutError:
+            report.stop_reason = "time budget"
+            break
+        except Exception as e:
+            report.stop_reason = f"render error: {e}"
+            break
+
+        if not isinstance(feedback, dict) or "choices" not in feedback:
+            report.stop_reason = f"vision error: {feedback.get('error') if isinstance(feedback, dict) else feedback}"
+            break
+
+        vision_text = feedback["choices"][0]["message"]["content"]
+        if history_base_dir is not None:
+            await asyncio.to_thread(
+                save_vision_feedback, history_base_dir, target.diagram_type, architecture_id, vision_text
+            )
+
+        if not target.learns_rules:
+            # regole che nessun generatore legge: la rigenerazione darebbe lo stesso sorgente
+            report.stop_reason = "analyzed (generator takes no learned rules)"
+            break
+
+        rules = await asyncio.to_thread(extract_rules_from_feedback, target.diagram_type, vision_text)
+        new_rules = await asyncio.to_thread(kb.learn_rules, target.diagram_type, rules)
+        report.rules_learned.extend(new_rules)
+
+        if not new_rules:
+            report.stop_reason = "converged (no new rules)"
+            break
+
+        await asyncio.to_thread(target.regenerate_fn, vision_text)
+        new_source = target.puml_path.read_text(encoding="utf-8")
+        if new_source == source:
+            report.stop_reason = "converged (source unchanged)"
+            break
+        source = new_source
+
+    try:
+        await asyncio.to_thread(compile_plantuml_files, diagram_files(target.puml_path))
+    except Exception as e:
+        print(f"[WARNING] Compile failed for {target.puml_path.name}: {e}")
+
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+async def refine_all_async(targets: List[RefinementTarget], kb, architecture_id: str,
+                           max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                           max_iterations: int = DEFAULT_MAX_ITERATIONS,
+                           time_budget: float = DEFAULT_TIME_BUDGET,
+                           history_base_dir: Optional[Path] = None) -> List[RefinementReport]:
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+    deadline = time.monotonic() + time_budget
+
+    return list(await asyncio.gather(*(
+        refine_diagram(t, kb, architecture_id, semaphore, deadline, max_iterations, history_base_dir)
+        for t in targets
+    )))
+
+
+def refine_all(targets: List[RefinementTarget], kb, architecture_id: str, **options) -> List[RefinementReport]:
+    """All diagrams concurrently; at most `max_in_flight` vision requests at a time."""
+    return asyncio.run(refine_all_async(targets, kb, architecture_id, **options))
+
+
+def print_refinement_report(reports: List[RefinementReport]):
+    print("\n[REFINEMENT SUMMARY]")
+    for r in reports:
+        learned = ", ".join(r.rules_learned) or "-"
+        print(f"- {r.diagram_type}: {r.iterations} iteration(s), {r.seconds:.1f} s, "
+              f"{r.stop_reason}; rules learned: {learned}")
+
+
+def run_refinement(diagrams_dir: Path, kb, model: ArchitectureModel,
+                   history_base_dir: Optional[Path] = None, **options) -> Dict[str, RefinementReport]:
+    targets = build_refinement_targets(model, kb, diagrams_dir)
+    reports = refine_all(targets, kb, model.id, history_base_dir=history_base_dir, **options)
+    get_timing_history().save()
+    print_refinement_report(reports)
+    return {r.diagram_type: r for r in reports}
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_CACHE_DIR = BASE_DIR / ".cache" / "renders"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class RenderCache:
+    """
+    Content-addressed on-disk cache of rendered diagrams.
+
+    Entries are keyed by the hash of (PlantUML source, renderer version,
+    output format), so a changed source can never hit a stale image.
+    The cache is bounded in size: the least recently used entries are
+    evicted first (a hit refreshes the entry's mtime).
+    """
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    @staticmethod
+    def key(source: str, renderer_version: str, output_format: str) -> str:
+        digest = hashlib.sha256()
+        for part in (renderer_version, output_format, source):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str, output_format: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.{output_format}"
+
+    def get(self, key: str, output_format: str) -> Optional[bytes]:
+        path = self._entry_path(key, output_format)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def contains(self, key: str, output_format: str) -> bool:
+        """Lookup without counting a hit or refreshing the entry (dry-run planning)."""
+        return self._entry_path(key, output_format).exists()
+
+    def put(self, key: str, output_format: str, data: bytes):
+        path = self._entry_path(key, output_format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Scrittura atomica: un altro processo non vede mai file parziali
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data)
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        return [p for p in self.cache_dir.glob("*/*") if not p.name.endswith(".tmp")]
+
+    def _scan_size(self) -> int:
+        total = 0
+        for p in self._entries():
+            try:
+                total += p.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _evict(self):
+        entries = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except FileNotFoundError:
+                pass
+
+        self._total_bytes = total
+
+    def stats_line(self) -> str:
+        return f"[RENDER CACHE] hits={self.hits} misses={self.misses}"
+
+
+_cache: Optional[RenderCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_render_cache() -> RenderCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RenderCache()
+        return _cache
@@ -1,48 +1,220 @@
-import re
+from collections import Counter
+from typing import Callable, Dict, List, Optional
 
+from src.documenter.diagram_ir import DiagramIR
+from src.documenter.plantuml_parser import Diagram, parse_plantuml
 
-def analyze_sequence_structural(uml_code: str) -> str:
+
+# Tipi di elemento che compaiono come lifeline in un sequence diagram
+LIFELINE_KINDS = (
+    "actor", "participant", "boundary", "control", "entity",
+    "database", "collections", "queue",
+)
+
+
+def _is_user(element) -> bool:
+    return element.alias.lower() == "user" or (element.name or "").lower() == "user"
+
+
+def as_diagram(uml) -> Diagram:
+    """Sorgente PlantUML, Diagram già parsato o IR dei generatori (nessun parsing)."""
+    if isinstance(uml, Diagram):
+        return uml
+    if isinstance(uml, DiagramIR):
+        return uml.analysis_view()
+    return parse_plantuml(uml or "")
+
+
+def _duplicates(elements) -> List[str]:
+    counts = Counter(e.alias for e in elements)
+    names = Counter(e.name for e in elements if e.name)
+    duplicated = [alias for alias, n in counts.items() if n > 1]
+    duplicated += [f'"{name}"' for name, n in names.items() if n > 1 and name not in counts]
+    return duplicated
+
+
+# =========================
+# KB QUALITY RULES
+# =========================
+
+def check_no_duplicate_participants(diagram: Diagram) -> List[str]:
+    duplicated = _duplicates(diagram.elements_of(*LIFELINE_KINDS))
+    if duplicated:
+        return [f"Duplicate participants: {', '.join(duplicated)}. Declare each participant once."]
+    return []
+
+
+def check_left_to_right_order(diagram: Diagram) -> List[str]:
+    """Participants should be declared in the order they first interact."""
+    declared = [e.alias for e in diagram.elements_of(*LIFELINE_KINDS)]
+    declared_set = set(declared)
+
+    first_use: List[str] = []
+    seen = set()
+    for edge in diagram.edges:
+        for alias in (edge.source, edge.target):
+            if alias in declared_set and alias not in seen:
+                seen.add(alias)
+                first_use.append(alias)
+
+    expected = first_use + [a for a in dict.fromkeys(declared) if a not in seen]
+    # l'attore User resta comunque a sinistra
+    users = [a for a in expected if a.lower() == "user"]
+    expected = users + [a for a in expected if a.lower() != "user"]
+
+    actual = list(dict.fromkeys(declared))
+    if actual != expected:
+        return [
+            "Participants are not in left to right interaction order. "
+            f"Expected: {', '.join(expected)}."
+        ]
+    return []
+
+
+def check_consistent_arrow_style(diagram: Diagram) -> List[str]:
+    styles = Counter(edge.style for edge in diagram.edges)
+    if len(styles) > 1:
+        used = ", ".join(f"'{s}' x{n}" for s, n in styles.most_common())
+        return [f"Inconsistent arrow styles: {used}."]
+    return []
+
+
+def check_single_horizontal_alignment(diagram: Diagram) -> List[str]:
+    """All lifelines on one row: declared up front, none created implicitly mid-diagram."""
+    issues = []
+    first_edge = diagram.first_edge_line
+
+    late = [
+        e.alias for e in diagram.elements_of(*LIFELINE_KINDS)
+        if first_edge is not None and e.line > first_edge
+    ]
+    if late:
+        issues.append(f"Participants declared after the first message: {', '.join(late)}.")
+
+    implicit = []
+    for edge in diagram.edges:
+        for alias in (edge.source, edge.target):
+            if diagram.element(alias) is None and alias not in implicit:
+                implicit.append(alias)
+    if implicit:
+        issues.append(f"Undeclared participants used in messages: {', '.join(implicit)}.")
+
+    return issues
+
+
+def check_separate_user_from_services(diagram: Diagram) -> List[str]:
+    lifelines = diagram.elements_of(*LIFELINE_KINDS)
+    users = [e for e in lifelines if _is_user(e)]
+    if not users:
+        return []
+
+    issues = []
+    if any(e.kind != "actor" for e in users):
+        issues.append("User is declared as a service participant; declare it as an actor.")
+    if lifelines and not _is_user(lifelines[0]):
+        issues.append("Actor User should be the first (leftmost) lifeline, separate from services.")
+    return issues
+
+
+def check_avoid_duplicate_components(diagram: Diagram) -> List[str]:
+    duplicated = _duplicates(diagram.elements_of("component"))
+    if duplicated:
+        return [f"Duplicate components: {', '.join(duplicated)}. Declare each component once."]
+    return []
+
+
+def check_consistent_connector_labels(diagram: Diagram) -> List[str]:
+    issues = []
+    labelled = [e for e in diagram.edges if e.label]
+    unlabelled = [e for e in diagram.edges if not e.label]
+    if labelled and unlabelled:
+        missing = ", ".join(f"{e.source}->{e.target}" for e in unlabelled[:5])
+        issues.append(f"Connectors without label: {missing}.")
+
+    issues += check_consistent_arrow_style(diagram)
+    return issues
+
+
+QUALITY_CHECKS: Dict[str, Callable[[Diagram], List[str]]] = {
+    "no_duplicate_participants": check_no_duplicate_participants,
+    "left_to_right_order": check_left_to_right_order,
+    "consistent_arrow_style": check_consistent_arrow_style,
+    "single_horizontal_alignment": check_single_horizontal_alignment,
+    "separate_user_from_services": check_separate_user_from_services,
+    "avoid_duplicate_components": check_avoid_duplicate_components,
+    "consistent_connector_labels": check_consistent_connector_labels,
+}
+
+
+def validate_diagram(uml, quality_rules: Optional[dict]) -> Dict[str, List[str]]:
+    """
+    Valuta ogni regola attiva di `diagram_quality_rules[diagram_type]`.
+    `uml` è il sorgente PlantUML, un Diagram già parsato o un DiagramIR.
+    Restituisce rule_name -> violazioni (lista vuota = regola rispettata).
+    """
+    diagram = as_diagram(uml)
+
+    results = {}
+    for rule_name, enabled in (quality_rules or {}).items():
+        if not enabled:
+            continue
+        check = QUALITY_CHECKS.get(rule_name)
+        if check is None:
+            print(f"[QUALITY WARNING] No checker for rule '{rule_name}'.")
+            continue
+        results[rule_name] = check(diagram)
+    return results
+
+
+def format_quality_report(diagram_type: str, results: Dict[str, List[str]]) -> str:
+    lines = [f"[QUALITY] {diagram_type}:"]
+    for rule_name, issues in results.items():
+        status = "ok" if not issues else "; ".join(issues)
+        lines.append(f"- {rule_name}: {status}")
+    return "\n".join(lines)
+
+
+# =========================
+# SEQUENCE STRUCTURAL FEEDBACK
+# =========================
+
+def analyze_sequence_structural(uml_code) -> str:
     """
     Analisi strutturale deterministica del diagramma di sequenza.
-    Non usa LLM.
-    Restituisce feedback testuale.
+    Non usa LLM. `uml_code` può essere anche l'IR del generatore.
+    Restituisce feedback testuale sui soli controlli di base: le regole di
+    qualità della KB sono un report (validate_diagram), non feedback da
+    cui imparare regole di generazione.
     """
 
     if not uml_code:
         return "Empty UML code."
 
+    diagram = as_diagram(uml_code)
     feedback = []
 
-    # Normalizza testo
-    lower_code = uml_code.lower()
-
     # ============================
     # 🔹 Regola 1: presenza attore User
     # ============================
 
-    # Match robusto: actor "User" oppure actor User
-    user_actor_pattern = r'actor\s+"?user"?'
-
-    if not re.search(user_actor_pattern, lower_code):
+    if not any(_is_user(e) for e in diagram.elements_of("actor")):
         feedback.append("Missing main actor 'User'. Add actor User at start.")
 
     # ============================
     # 🔹 Regola 2: almeno un participant
     # ============================
 
-    if not re.search(r'\bparticipant\b', lower_code):
+    if not diagram.elements_of("participant"):
         feedback.append("No participants defined.")
 
     # ============================
     # 🔹 Regola 3: almeno un messaggio
     # ============================
 
-    if not re.search(r'\-\>', lower_code):
+    if not diagram.edges:
         feedback.append("No message interactions defined.")
 
-    # ============================
-
     if not feedback:
         return "Structure OK."
 
-    return "\n".join(feedback)
\ No newline at end of file
+    return "\n".join(feedback)
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_HISTORY_PATH = BASE_DIR / ".cache" / "timings.json"
+
+# La media segue le ultime misure: oltre questa finestra i campioni vecchi pesano meno
+HISTORY_WINDOW = 20
+
+# Stime (secondi) per le classi di lavoro mai misurate, per famiglia
+DEFAULT_COSTS = {
+    "generate": 0.05,
+    "render:plantuml": 2.0,   # include l'avvio della JVM
+    "render:native": 0.05,
+    "render": 1.0,
+    "llm": 20.0,
+    "vision": 30.0,
+    "assemble": 0.2,
+    "output:md": 0.0,
+    "output:html": 0.2,
+    "output:pdf": 15.0,
+    "output": 1.0,
+}
+FALLBACK_COST = 0.1
+
+
+class TimingHistory:
+    """
+    Measured duration of every work class (`generate:component_diagram`,
+    `render:plantuml:sequence_diagram`, `llm:description:logical_view`,
+    `output:pdf`...), kept as a running mean over recent runs.
+    New samples are merged into the file on save, so batch workers
+    writing the same history add up instead of overwriting each other
+    (a save racing another one can still drop that save's samples).
+    """
+
+    def __init__(self, path: Path = DEFAULT_HISTORY_PATH):
+        self.path = Path(path)
+        self._entries: Optional[Dict[str, dict]] = None
+        # campioni non ancora salvati: classe -> (conteggio, somma secondi)
+        self._pending: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        return data.get("classes", {}) if isinstance(data, dict) else {}
+
+    def _loaded(self) -> Dict[str, dict]:
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    @staticmethod
+    def _merge(entry: Optional[dict], count: int, total: float) -> dict:
+        if not entry:
+            return {"n": count, "mean": total / count}
+        n = min(entry["n"], HISTORY_WINDOW)
+        return {"n": entry["n"] + count, "mean": (entry["mean"] * n + total) / (n + count)}
+
+    def record(self, work_class: str, seconds: float):
+        with self._lock:
+            entries = self._loaded()
+            entries[work_class] = self._merge(entries.get(work_class), 1, seconds)
+            count, total = self._pending.get(work_class, (0, 0.0))
+            self._pending[work_class] = (count + 1, total + seconds)
+
+    def estimate(self, work_class: str) -> Tuple[float, bool]:
+        """
+        (seconds, measured). Unmeasured classes use their DEFAULT_COSTS entry,
+        else the mean of their measured siblings (`render:plantuml:*`),
+        else the default of their family.
+        """
+        with self._lock:
+            entries = self._loaded()
+            entry = entries.get(work_class)
+            if entry:
+                return entry["mean"], True
+            if work_class in DEFAULT_COSTS:
+                return DEFAULT_COSTS[work_class], False
+
+            family = work_class
+            while ":" in family:
+                family = family.rsplit(":", 1)[0]
+                siblings = [e for name, e in entries.items() if name.startswith(family + ":")]
+                if siblings:
+                    n = sum(e["n"] for e in siblings)
+                    return sum(e["mean"] * e["n"] for e in siblings) / n, True
+                if family in DEFAULT_COSTS:
+                    return DEFAULT_COSTS[family], False
+
+        return FALLBACK_COST, False
+
+    def save(self):
+        with self._lock:
+            if not self._pending:
+                return
+            entries = self._read()
+            for work_class, (count, total) in self._pending.items():
+                entries[work_class] = self._merge(entries.get(work_class), count, total)
+            self._pending.clear()
+            self._entries = entries
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"classes": entries}, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+_history: Optional[TimingHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_timing_history() -> TimingHistory:
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = TimingHistory()
+        return _history
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class _NoopSpan:
+    """Returned when tracing is off: one shared object, no clock reads, nothing recorded."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        return self
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """One timed region; attributes can be added while it is open."""
+
+    __slots__ = ("tracer", "name", "category", "attrs", "start_ns", "tid")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.start_ns = 0
+        self.tid = 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self.tid = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._record(self, end_ns)
+        return False
+
+
+class Tracer:
+    """
+    Collects finished spans of this process.
+    Export: Chrome trace-event JSON (chrome://tracing, Perfetto) and a
+    summary table aggregated by span name.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.events: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _record(self, span: Span, end_ns: int):
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            # clock monotono di sistema: confrontabile tra i processi del batch
+            "ts": span.start_ns / 1000.0,
+            "dur": (end_ns - span.start_ns) / 1000.0,
+            "pid": self.pid,
+            "tid": span.tid,
+            "args": span.attrs,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def drain(self) -> List[dict]:
+        """Returns and clears the recorded events (sent back by batch workers)."""
+        with self._lock:
+            events, self.events = self.events, []
+        return events
+
+    def merge(self, events: List[dict]):
+        with self._lock:
+            self.events.extend(events)
+
+    def export_chrome_trace(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            events = list(self.events)
+
+        thread_names = {}
+        for t in threading.enumerate():
+            thread_names[t.ident] = t.name
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+             "args": {"name": thread_names.get(tid, str(tid)) if pid == self.pid else str(tid)}}
+            for pid, tid in sorted({(e["pid"], e["tid"]) for e in events})
+        ]
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"},
+                      f, default=str)
+        return path
+
+    def summary(self) -> Dict[str, dict]:
+        """name -> count, total/mean/max ms, plus summed numeric bytes/tokens attributes."""
+        with self._lock:
+            events = list(self.events)
+
+        rows: Dict[str, dict] = {}
+        for e in events:
+            row = rows.setdefault(e["name"], {
+                "category": e["cat"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "bytes": 0, "tokens": 0,
+            })
+            ms = e["dur"] / 1000.0
+            row["count"] += 1
+            row["total_ms"] += ms
+            row["max_ms"] = max(row["max_ms"], ms)
+            for key in ("bytes", "tokens"):
+                value = e["args"].get(key)
+                if isinstance(value, (int, float)):
+                    row[key] += value
+
+        for row in rows.values():
+            row["mean_ms"] = row["total_ms"] / row["count"]
+        return rows
+
+    def summary_table(self) -> str:
+        rows = sorted(self.summary().items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+        lines = [
+            f"{'span':<34} {'cat':<10} {'count':>5} {'total ms':>10} {'mean ms':>9} "
+            f"{'max ms':>9} {'bytes':>10} {'tokens':>7}"
+        ]
+        for name, r in rows:
+            lines.append(
+                f"{name[:34]:<34} {r['category'][:10]:<10} {r['count']:>5} {r['total_ms']:>10.1f} "
+                f"{r['mean_ms']:>9.1f} {r['max_ms']:>9.1f} {r['bytes']:>10} {r['tokens']:>7}"
+            )
+        return "\n".join(lines)
+
+
+# =========================
+# MODULE API
+# =========================
+
+_tracer: Optional[Tracer] = None
+
+
+def enable_tracing() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def disable_tracing():
+    global _tracer
+    _tracer = None
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def span(name: str, category: str = "stage", **attrs):
+    """
+    `with span("compile", "subprocess", diagram=...) as s: ... s.set(bytes=n)`
+    With tracing disabled this is a global lookup returning a shared no-op.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return NOOP_SPAN
+    return Span(tracer, name, category, attrs)
@@ -1,291 +1,591 @@
-import subprocess
+import re
+import time
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.documenter.diagram_ir import DiagramIR, Node, write_diagram
 from src.documenter.models import ArchitectureModel
+from src.documenter.partitioning import cross_edges, overview_levels, partition_graph
+from src.documenter.plantuml_renderer import get_renderer, render_many_formats
+from src.documenter.render_cache import get_render_cache
+from src.documenter.timing_history import get_timing_history
+from src.documenter.tracing import span
+
+
+# =========================
+# PARTITIONED DIAGRAMS
+# =========================
+# Oltre `max_components_per_view` il diagramma viene diviso in parti
+# (<tipo>_part_N.puml) e il file principale diventa una panoramica;
+# se le parti sono troppe, panoramiche intermedie (<tipo>_overview_L_N.puml).
+
+_PART_FILE = re.compile(r"_part_(\d+)$")
+_OVERVIEW_FILE = re.compile(r"_overview_(\d+)_(\d+)$")
+
+
+def _part_path(output_path: Path, index: int) -> Path:
+    return output_path.with_name(f"{output_path.stem}_part_{index + 1}.puml")
+
+
+def _overview_path(output_path: Path, level: int, index: int) -> Path:
+    return output_path.with_name(f"{output_path.stem}_overview_{level}_{index + 1}.puml")
+
+
+def _clear_partition_files(output_path: Path):
+    """Removes the parts of a previous run (the architecture may have shrunk)."""
+    for pattern in (f"{output_path.stem}_part_*", f"{output_path.stem}_overview_*"):
+        for stale in output_path.parent.glob(pattern):
+            stale.unlink()
+
+
+def diagram_files(puml_path: Path) -> List[Path]:
+    """
+    The .puml files of one diagram: the main file first, then the
+    intermediate overviews (top-down) and the parts, in order.
+    """
+    puml_path = Path(puml_path)
+    overviews, parts = [], []
+    for path in puml_path.parent.glob(f"{puml_path.stem}_*.puml"):
+        suffix = path.stem[len(puml_path.stem):]
+        m = _OVERVIEW_FILE.fullmatch(suffix)
+        if m:
+            overviews.append(((-int(m.group(1)), int(m.group(2))), path))
+            continue
+        m = _PART_FILE.fullmatch(suffix)
+        if m:
+            parts.append((int(m.group(1)), path))
+
+    files = [puml_path] if puml_path.exists() else []
+    return files + [p for _, p in sorted(overviews)] + [p for _, p in sorted(parts)]
+
+
+def _write_overviews(output_path: Path, directives: List[str], part_labels: List[str],
+                     part_links: Dict[Tuple[int, int], float], max_size: int,
+                     link_label: str) -> List[Path]:
+    """
+    Panoramiche: ogni parte è un rettangolo, gli archi tra parti sono
+    aggregati (link_label formattato con {n}). Ogni panoramica ha al più
+    max_size elementi; quella di livello più alto è output_path.
+    """
+    levels = overview_levels(len(part_labels), part_links, max_size)
+
+    # numero di parti sotto ogni elemento, per livello
+    counts = [[1] * len(part_labels)]
+    for groups, _ in levels[:-1]:
+        counts.append([sum(counts[-1][m] for m in group) for group in groups])
+
+    def item(level: int, index: int):
+        if level == 0:
+            return f"part_{index + 1}", part_labels[index]
+        return (f"overview_{level}_{index + 1}",
+                f"Overview {level}.{index + 1}\\n({counts[level][index]} parts)")
+
+    written = []
+    top = len(levels) - 1
+    for level in range(top, -1, -1):
+        groups, links = levels[level]
+
+        # archi interni a ciascun gruppo (un solo passaggio sui link)
+        group_of = {m: g for g, members in enumerate(groups) for m in members}
+        group_links: Dict[int, List] = {}
+        for (a, b), weight in sorted(links.items()):
+            if group_of[a] == group_of[b]:
+                group_links.setdefault(group_of[a], []).append((a, b, weight))
+
+        for g, members in enumerate(groups):
+            path = output_path if level == top else _overview_path(output_path, level + 1, g)
+            ir = DiagramIR(directives, title=None if level == top else f"Overview {level + 1}.{g + 1}")
+            for m in members:
+                alias, label = item(level, m)
+                ir.node("rectangle", label, alias)
+            for a, b, weight in group_links.get(g, ()):
+                ir.edge(item(level, a)[0], item(level, b)[0],
+                        link_label.format(n=int(weight), s="s" if weight != 1 else ""))
+            written.append(write_diagram(ir, path))
+
+    return written
+
+
+def _summary_label(title: str, names: List[str], noun: str) -> str:
+    shown = ", ".join(names[:3])
+    more = f" +{len(names) - 3}" if len(names) > 3 else ""
+    count = f"{len(names)} {noun}" + ("s" if len(names) != 1 else "")
+    return f"{title}\\n{shown}{more}\\n({count})"
 
 
 # =========================
 # COMPONENT DIAGRAM
 # =========================
 
-def generate_component_diagram(model: ArchitectureModel, output_path: Path):
-    components = model.get_logical_components()
-    connectors = model.get_logical_connectors()
+COMPONENT_DIRECTIVES = ["skinparam componentStyle rectangle"]
 
-    lines = []
-    lines.append("@startuml")
-    lines.append("skinparam componentStyle rectangle")
-    lines.append("")
 
-    for comp in components:
-        safe = comp.id.replace(" ", "")
-        lines.append(f'component "{comp.id}" as {safe}')
+def component_diagram_ir(model: ArchitectureModel) -> DiagramIR:
+    alias = model.aliases.alias
+    ir = DiagramIR(COMPONENT_DIRECTIVES)
+    ir.roots = [Node("component", comp.id, alias(comp.id)) for comp in model.get_logical_components()]
+    ir.edges = [(alias(conn.source), alias(conn.target), conn.type, "-->") for conn in model.get_logical_edges()]
+    return ir
 
-    lines.append("")
 
-    for conn in connectors:
-        if conn.source and conn.target:
-            source = conn.source.replace(" ", "")
-            target = conn.target.replace(" ", "")
-            lines.append(f"{source} --> {target} : {conn.type}")
+def generate_component_diagram(model: ArchitectureModel, output_path: Path,
+                               max_components: Optional[int] = None) -> List[Path]:
+    """
+    Scrive il component diagram; restituisce i .puml scritti (vedi diagram_files).
+    Con max_components e più componenti del limite: parti + panoramica.
+    """
+    _clear_partition_files(output_path)
+    if max_components is not None and len(model.get_logical_components()) > max_components:
+        return _write_component_partitions(model, output_path, max_components)
+
+    return [write_diagram(component_diagram_ir(model), output_path)]
+
+
+def _write_component_partitions(model: ArchitectureModel, output_path: Path,
+                                max_components: int) -> List[Path]:
+    components = model.get_logical_components()
+    connectors = model.get_logical_edges()
+
+    vertices = [c.id for c in components]
+    vertices += [name for conn in connectors for name in (conn.source, conn.target)]
+    edges = [(conn.source, conn.target, 1) for conn in connectors]
+    parts = partition_graph(vertices, edges, max_components)
 
-    lines.append("@enduml")
+    declared = {c.id for c in components}
+    part_of = {name: i for i, members in enumerate(parts) for name in members}
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text("\n".join(lines), encoding="utf-8")
+    print(f"[LAYOUT] component_diagram: {len(part_of)} components "
+          f"in {len(parts)} parts of at most {max_components}.")
+
+    irs = []
+    for i, members in enumerate(parts):
+        ir = DiagramIR(COMPONENT_DIRECTIVES, title=f"Part {i + 1} of {len(parts)}")
+        for name in members:
+            if name in declared:
+                ir.node("component", name, model.alias(name))
+        irs.append(ir)
+
+    # solo gli archi interni alla parte (un solo passaggio)
+    alias = model.aliases.alias
+    for conn in connectors:
+        p = part_of[conn.source]
+        if part_of[conn.target] == p:
+            irs[p].edges.append((alias(conn.source), alias(conn.target), conn.type, "-->"))
+
+    part_paths = [write_diagram(ir, _part_path(output_path, i)) for i, ir in enumerate(irs)]
+
+    labels = [_summary_label(f"Part {i + 1}", members, "component") for i, members in enumerate(parts)]
+    overviews = _write_overviews(
+        output_path,
+        COMPONENT_DIRECTIVES,
+        labels,
+        cross_edges(parts, edges),
+        max_components,
+        "{n} connector{s}",
+    )
+    return overviews + part_paths
 
 
 # =========================
 # DEPLOYMENT DIAGRAM
 # =========================
 
-def generate_deployment_diagram(model: ArchitectureModel, output_path: Path):
+DEPLOYMENT_DIRECTIVES = ["skinparam nodeStyle rectangle"]
+
+
+def _declare_deployment_node(ir: DiagramIR, model: ArchitectureModel, node_name: str,
+                             components: List[str]):
+    """Nodo con i suoi componenti (gruppo) o nodo semplice."""
+    alias = model.aliases.alias
+    group = ir.group("node", node_name, alias(node_name))
+    group.members = [Node("component", comp, alias(comp)) for comp in components]
+
+
+def deployment_diagram_ir(model: ArchitectureModel) -> DiagramIR:
+    deployment_view = model.get_view("deployment_view")
+
+    ir = DiagramIR(DEPLOYMENT_DIRECTIVES)
+    for node in deployment_view.get("nodes", []):
+        if isinstance(node, dict):
+            _declare_deployment_node(ir, model, node.get("name"), node.get("components", []))
+        else:
+            ir.node("node", node, model.alias(node))
+
+    alias = model.aliases.alias
+    ir.edges = [
+        (alias(comp), alias(node), None, "-->")
+        for comp, node in deployment_view.get("component_mapping", {}).items()
+    ]
+    return ir
+
+
+def generate_deployment_diagram(model: ArchitectureModel, output_path: Path,
+                                max_components: Optional[int] = None) -> List[Path]:
+    """
+    Scrive il deployment diagram; restituisce i .puml scritti (vedi diagram_files).
+    Con max_components e più componenti deployati del limite: parti + panoramica.
+    """
     deployment_view = model.get_view("deployment_view")
 
     nodes = deployment_view.get("nodes", [])
     component_mapping = deployment_view.get("component_mapping", {})
 
-    lines = []
-    lines.append("@startuml")
-    lines.append("skinparam nodeStyle rectangle")
-    lines.append("")
+    _clear_partition_files(output_path)
+    if max_components is not None and len(_deployed_components(nodes, component_mapping)) > max_components:
+        return _write_deployment_partitions(model, output_path, nodes, component_mapping, max_components)
 
+    return [write_diagram(deployment_diagram_ir(model), output_path)]
+
+
+def _deployed_components(nodes, component_mapping) -> Dict[str, List[str]]:
+    """component -> nodes hosting it (contained or mapped), in input order."""
+    hosts: Dict[str, List[str]] = {}
+    for node in nodes:
+        if isinstance(node, dict):
+            for comp in node.get("components", []):
+                hosts.setdefault(comp, []).append(node.get("name"))
+    for comp, node in component_mapping.items():
+        hosts.setdefault(comp, []).append(node)
+    return hosts
+
+
+def _write_deployment_partitions(model: ArchitectureModel, output_path: Path,
+                                 nodes, component_mapping, max_components: int) -> List[Path]:
+    hosts = _deployed_components(nodes, component_mapping)
+
+    # componenti sullo stesso nodo collegati a catena: restano insieme
+    by_node: Dict[str, List[str]] = {}
+    for comp, names in hosts.items():
+        for name in names:
+            by_node.setdefault(name, []).append(comp)
+    edges = [
+        (hosted[k], hosted[k + 1], 1)
+        for hosted in by_node.values()
+        for k in range(len(hosted) - 1)
+    ]
+
+    node_names = [n.get("name") if isinstance(n, dict) else n for n in nodes]
+    # i nodi senza componenti entrano nelle parti come elementi a sé
+    idle_nodes = [n for n in node_names if n not in by_node]
+    parts = partition_graph(list(hosts) + idle_nodes, edges, max_components)
+
+    print(f"[LAYOUT] deployment_diagram: {len(hosts)} deployed components "
+          f"in {len(parts)} parts of at most {max_components}.")
+
+    part_of = {name: i for i, members in enumerate(parts) for name in members}
+    irs = [
+        DiagramIR(DEPLOYMENT_DIRECTIVES, title=f"Part {i + 1} of {len(parts)}")
+        for i in range(len(parts))
+    ]
+
+    # un solo passaggio su nodi e mapping: dichiarazioni raggruppate per parte
+    part_nodes: List[List[str]] = [[] for _ in parts]
     for node in nodes:
         if isinstance(node, dict):
             node_name = node.get("name")
-            safe_node = node_name.replace(" ", "")
-            lines.append(f'node "{node_name}" as {safe_node} {{')
+            contained: Dict[int, List[str]] = {}
             for comp in node.get("components", []):
-                safe_comp = comp.replace(" ", "")
-                lines.append(f'  component "{comp}" as {safe_comp}')
-            lines.append("}")
+                contained.setdefault(part_of[comp], []).append(comp)
+            if node_name in part_of:
+                contained.setdefault(part_of[node_name], [])
+            for p, comps in contained.items():
+                part_nodes[p].append(node_name)
+                _declare_deployment_node(irs[p], model, node_name, comps)
         else:
-            safe_node = node.replace(" ", "")
-            lines.append(f'node "{node}" as {safe_node}')
-
-    lines.append("")
-
+            spanned = {part_of[c] for c in by_node.get(node, ())}
+            if node in part_of:
+                spanned.add(part_of[node])
+            for p in sorted(spanned):
+                part_nodes[p].append(node)
+                irs[p].node("node", node, model.alias(node))
+
+    alias = model.aliases.alias
     for comp, node in component_mapping.items():
-        safe_comp = comp.replace(" ", "")
-        safe_node = node.replace(" ", "")
-        lines.append(f"{safe_comp} --> {safe_node}")
-
-    lines.append("@enduml")
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text("\n".join(lines), encoding="utf-8")
+        irs[part_of[comp]].edges.append((alias(comp), alias(node), None, "-->"))
+
+    part_paths = [write_diagram(ir, _part_path(output_path, i)) for i, ir in enumerate(irs)]
+
+    labels = [_summary_label(f"Part {i + 1}", names, "node") for i, names in enumerate(part_nodes)]
+
+    # parti che ospitano lo stesso nodo, collegate a catena
+    shared: Dict[Tuple[int, int], float] = {}
+    for hosted in by_node.values():
+        spanned = sorted({part_of[c] for c in hosted})
+        for a, b in zip(spanned, spanned[1:]):
+            shared[(a, b)] = shared.get((a, b), 0) + 1
+
+    overviews = _write_overviews(
+        output_path,
+        DEPLOYMENT_DIRECTIVES,
+        labels,
+        shared,
+        max_components,
+        "{n} shared node{s}",
+    )
+    return overviews + part_paths
 
 
 # =========================
 # CONTEXT DIAGRAM
 # =========================
 
-def generate_context_diagram(model: ArchitectureModel, output_path: Path):
+def context_diagram_ir(model: ArchitectureModel) -> DiagramIR:
     """
-    Genera un diagramma di contesto (C4 - Level 1).
+    Diagramma di contesto (C4 - Level 1).
     Mostra il sistema come black-box e gli attori esterni.
     """
-
-    system_name = model.id
-
-    lines = []
-    lines.append("@startuml")
-    lines.append("left to right direction")
-    lines.append("skinparam rectangleStyle rounded")
-    lines.append("skinparam shadowing false")
-    lines.append("")
+    ir = DiagramIR([
+        "left to right direction",
+        "skinparam rectangleStyle rounded",
+        "skinparam shadowing false",
+    ])
 
     # Attori esterni
-    lines.append('actor "User" as User')
-    lines.append('rectangle "Payment Provider" as Payment')
-    lines.append('rectangle "Shipping Provider" as Shipping')
-    lines.append("")
+    ir.node("actor", "User", "User")
+    ir.node("rectangle", "Payment Provider", "Payment")
+    ir.node("rectangle", "Shipping Provider", "Shipping")
 
     # Sistema come black-box
-    lines.append(f'rectangle "{system_name}" as System #LightBlue')
-    lines.append("")
+    ir.node("rectangle", model.id, "System", style="#LightBlue")
 
     # Relazioni
-    lines.append("User --> System : Uses platform")
-    lines.append("System --> Payment : Processes payments")
-    lines.append("System --> Shipping : Handles shipments")
+    ir.edge("User", "System", "Uses platform")
+    ir.edge("System", "Payment", "Processes payments")
+    ir.edge("System", "Shipping", "Handles shipments")
+    return ir
 
-    lines.append("@enduml")
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
+def generate_context_diagram(model: ArchitectureModel, output_path: Path) -> DiagramIR:
+    ir = context_diagram_ir(model)
+    write_diagram(ir, output_path)
+    return ir
 
 # =========================
 # SEQUENCE DIAGRAM
 # =========================
 
-def generate_sequence_diagram(model, output_file, rules=None):
-    """
-    Genera un diagramma di sequenza.
-    Applica eventuali regole apprese dalla KB.
-    """
-    output_file.parent.mkdir(parents=True, exist_ok=True)
+# Tipi il cui generatore applica le regole apprese (kb.rules_for): solo per
+# questi la refinement impara regole dal feedback Vision e rigenera
+RULE_DRIVEN_DIAGRAM_TYPES = ("sequence_diagram",)
 
-    components = model.get_logical_components()
-    connectors = model.get_logical_connectors()
+def _sequence_participants(ir: DiagramIR, model):
+    """Participant ordinati e unici."""
+    written = {node.ref for node in ir.roots}
+    lookup = model.aliases.alias
+    for comp in model.get_logical_components():
+        alias = lookup(comp.id)
+        if alias not in written:
+            ir.roots.append(Node("participant", comp.id, alias))
+            written.add(alias)
 
-    rules = rules or []
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write("@startuml\n\n")
+def _sequence_messages(ir: DiagramIR, model):
+    alias = model.aliases.alias
+    ir.edges.extend([
+        (alias(conn.source), alias(conn.target), conn.type, "->")
+        for conn in model.get_logical_edges()
+    ])
+
 
-        # ✅ Applica regola self-evolving: se presente, inserisci User
-        if "require_user_actor" in rules:
-            f.write('actor "User" as User\n\n')
+def sequence_diagram_ir(model, rules=None) -> DiagramIR:
+    """
+    Diagramma di sequenza con le regole apprese dalla KB applicate.
+    """
+    rules = rules or []
+    ir = DiagramIR(sequence=True)
 
-        # Participant ordinati e unici
-        written = set()
-        for comp in components:
-            alias = comp.id.replace(" ", "")
-            if alias not in written:
-                f.write(f'participant "{comp.id}" as {alias}\n')
-                written.add(alias)
+    # ✅ Applica regola self-evolving: se presente, inserisci User
+    if "require_user_actor" in rules:
+        ir.node("actor", "User", "User")
 
-        f.write("\n")
+    _sequence_participants(ir, model)
+    _sequence_messages(ir, model)
+    return ir
 
-        # Messaggi
-        for conn in connectors:
-            source = conn.source.replace(" ", "")
-            target = conn.target.replace(" ", "")
-            f.write(f"{source} -> {target} : {conn.type}\n")
 
-        f.write("\n@enduml\n")
+def generate_sequence_diagram(model, output_file, rules=None) -> DiagramIR:
+    """
+    Genera un diagramma di sequenza.
+    Applica eventuali regole apprese dalla KB.
+    Restituisce l'IR scritto (gli analizzatori lo usano senza riparsare).
+    """
+    ir = sequence_diagram_ir(model, rules)
+    write_diagram(ir, output_file)
+    return ir
 
 
 # =========================
 # SEQUENCE REGENERATION (VISION)
 # =========================
 
-def regenerate_sequence_with_feedback(model, feedback: str, output_path):
+def regenerated_sequence_ir(model, feedback: str) -> DiagramIR:
+    ir = DiagramIR(sequence=True)
+
+    # 👇 1️⃣ USER SEMPRE PRESENTE
+    ir.node("actor", "User")
+
+    # 👇 2️⃣ Participant ordinati e unici, 3️⃣ messaggi sequenziali coerenti
+    _sequence_participants(ir, model)
+    _sequence_messages(ir, model)
+
+    # 👇 4️⃣ Piccolo miglioramento layout automatico
+    if feedback and "spacing" in feedback.lower():
+        ir.comments.append("Vision suggested spacing improvement")
+    return ir
+
+
+def regenerate_sequence_with_feedback(model, feedback: str, output_path) -> DiagramIR:
     """
     Rigenera il diagramma di sequenza tenendo conto del feedback
     ricevuto dal Vision LLM.
     Garantisce la presenza dell'attore User.
     """
+    ir = regenerated_sequence_ir(model, feedback)
+    write_diagram(ir, output_path)
+    return ir
 
-    components = model.get_logical_components()
-    connectors = model.get_logical_connectors()
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("@startuml\n\n")
+# =========================
+# SECURITY DIAGRAM
+# =========================
 
-        # 👇 1️⃣ USER SEMPRE PRESENTE
-        f.write("actor User\n\n")
+def security_diagram_ir(model: ArchitectureModel) -> DiagramIR:
+    ir = DiagramIR()
+    ir.node("actor", "User")
+    ir.node("rectangle", "Web Server", "WebServer")
+    ir.node("rectangle", "Application Server", "AppServer")
+    ir.node("database", "Database Server", "DBServer")
 
-        # 👇 2️⃣ Participant ordinati e unici
-        written = set()
-        for comp in components:
-            alias = comp.id.replace(" ", "")
-            if alias not in written:
-                f.write(f'participant "{comp.id}" as {alias}\n')
-                written.add(alias)
+    ir.edge("User", "WebServer", "HTTPS Request", arrow="->")
+    ir.edge("WebServer", "AppServer", "Forward", arrow="->")
+    ir.edge("AppServer", "DBServer", "Query", arrow="->")
+    ir.edge("AppServer", "WebServer", "Response", arrow="->")
+    ir.edge("WebServer", "User", "HTTPS Response", arrow="->")
 
-        f.write("\n")
+    ir.note("WebServer", "TLS Encryption")
+    return ir
 
-        # 👇 3️⃣ Messaggi sequenziali coerenti
-        for conn in connectors:
-            source = conn.source.replace(" ", "")
-            target = conn.target.replace(" ", "")
-            f.write(f"{source} -> {target} : {conn.type}\n")
 
-        # 👇 4️⃣ Piccolo miglioramento layout automatico
-        if feedback and "spacing" in feedback.lower():
-            f.write("\n' Vision suggested spacing improvement\n")
+def generate_security_diagram(model: ArchitectureModel, output_path: Path) -> DiagramIR:
+    ir = security_diagram_ir(model)
+    write_diagram(ir, output_path)
+    return ir
 
-        f.write("\n@enduml\n")
 
 # =========================
-# SECURITY DIAGRAM
+# PLANTUML COMPILER
 # =========================
 
-def generate_security_diagram(model: ArchitectureModel, output_path: Path):
-    lines = []
-    lines.append("@startuml")
-    lines.append("actor User")
-    lines.append('rectangle "Web Server" as WebServer')
-    lines.append('rectangle "Application Server" as AppServer')
-    lines.append('database "Database Server" as DBServer')
-    lines.append("")
-
-    lines.append("User -> WebServer : HTTPS Request")
-    lines.append("WebServer -> AppServer : Forward")
-    lines.append("AppServer -> DBServer : Query")
-    lines.append("AppServer -> WebServer : Response")
-    lines.append("WebServer -> User : HTTPS Response")
-    lines.append("")
-    lines.append("note right of WebServer")
-    lines.append("TLS Encryption")
-    lines.append("end note")
-    lines.append("@enduml")
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text("\n".join(lines), encoding="utf-8")
+# Tipi che il renderer nativo disegna da solo; gli altri passano dal fallback PlantUML
+NATIVE_DIAGRAM_TYPES = ("component_diagram", "deployment_diagram", "context_diagram")
 
 
-# =========================
-# PLANTUML COMPILER
-# =========================
+def render_work_class(diagram_type: str) -> str:
+    """Timing class of a diagram render: `render:<plantuml|native>:<diagram type>`."""
+    try:
+        backend = get_renderer("png").backend
+    except FileNotFoundError:
+        backend = "plantuml"
+    if backend == "native" and diagram_type not in NATIVE_DIAGRAM_TYPES:
+        backend = "plantuml"
+    return f"render:{backend}:{diagram_type}"
 
-def compile_plantuml(puml_path: Path):
-    BASE_DIR = Path(__file__).resolve().parent.parent.parent
-    plantuml_jar = BASE_DIR / "tools" / "plantuml.jar"
 
-    if not plantuml_jar.exists():
-        raise FileNotFoundError(f"PlantUML jar not found at {plantuml_jar}")
+def render_plantuml(source: str, output_format: str = "png") -> bytes:
+    """
+    Restituisce l'immagine del sorgente PlantUML.
+    Cache hit -> nessuna chiamata alla JVM.
+    """
+    renderer = get_renderer(output_format)
+    cache = get_render_cache()
+
+    with span("render_plantuml", "render", format=output_format) as s:
+        key = cache.key(source, renderer.version, output_format)
+        image = cache.get(key, output_format)
+        s.set(cache_hit=image is not None)
 
-    subprocess.run(
-        ["java", "-jar", str(plantuml_jar), str(puml_path)],
-        check=True
-    )
+        if image is None:
+            image = renderer.render(source)
+            cache.put(key, output_format, image)
+
+        s.set(bytes=len(image))
+        return image
 
-from typing import Callable, Optional
 
-def vision_refine_diagram(
-    diagram_type: str,
-    puml_path: Path,
-    generate_fn: Callable[[], None],
-    analyze_fn: Callable[[str, str], dict],
-    regenerate_fn: Optional[Callable[[str], None]] = None,
-    compile_after_regen: bool = True,
-) -> dict:
+def with_max_size(source: str, max_size: int) -> str:
     """
-    Loop:
-    1) generate_fn() produce puml_path
-    2) compile -> png
-    3) analyze_fn(png_path, diagram_type) -> feedback json
-    4) regenerate_fn(vision_text) aggiorna il .puml (opzionale)
-    5) ricompila -> png (opzionale)
+    Aggiunge `scale max NxN` dopo @startuml, così PlantUML produce
+    direttamente l'immagine alla risoluzione voluta.
+    Un `scale` già presente nel sorgente viene rispettato.
     """
-    # 1) generate
-    generate_fn()
+    lines = source.splitlines()
+    if any(line.strip().lower().startswith("scale ") for line in lines):
+        return source
 
-    # 2) compile
-    compile_plantuml(puml_path)
-    png_path = puml_path.with_suffix(".png")
+    for i, line in enumerate(lines):
+        if line.strip().lower().startswith("@startuml"):
+            lines.insert(i + 1, f"scale max {max_size}*{max_size}")
+            return "\n".join(lines) + ("\n" if source.endswith("\n") else "")
 
-    # 3) analyze
-    feedback = analyze_fn(str(png_path), diagram_type=diagram_type)
+    return source
 
-    # 🔒 Controllo sicurezza
-    if not isinstance(feedback, dict) or "choices" not in feedback:
-        return feedback  # ritorna direttamente (timeout o errore)
 
-    vision_text = feedback["choices"][0]["message"]["content"]
+def render_for_vision(source: str, max_size: int = 800) -> bytes:
+    """PNG in memoria alla risoluzione del modello Vision (nessun file su disco)."""
+    return render_plantuml(with_max_size(source, max_size), "png")
 
-    # 4) regenerate (se disponibile)
-    if regenerate_fn is not None:
-        regenerate_fn(vision_text)
 
-        # 5) compile again
-        if compile_after_regen:
-            compile_plantuml(puml_path)
+def compile_plantuml(puml_path: Path):
+    """
+    Compila un .puml in PNG accanto al sorgente.
+    Usa la render cache e il renderer PlantUML condiviso (una sola JVM per processo).
+    """
+    puml_path = Path(puml_path)
+    source = puml_path.read_text(encoding="utf-8")
+    puml_path.with_suffix(".png").write_bytes(render_plantuml(source))
 
-    return feedback
\ No newline at end of file
+
+def compile_plantuml_files(puml_files: List[Path], formats: Sequence[str] = ("png",)) -> List[Path]:
+    """
+    Compila più diagrammi in un'unica chiamata al renderer, in tutti i
+    formati richiesti (es. svg per il documento, png per il PDF).
+    Solo i sorgenti non presenti in cache vengono inviati al renderer.
+    Restituisce le immagini generate, per file e nell'ordine di `formats`.
+    """
+    cache = get_render_cache()
+
+    puml_files = [Path(p) for p in puml_files]
+    sources = [p.read_text(encoding="utf-8") for p in puml_files]
+
+    images: Dict[str, List[Optional[bytes]]] = {}
+    keys: Dict[str, List[str]] = {}
+    missing: Dict[str, List[int]] = {}
+    for fmt in formats:
+        version = get_renderer(fmt).version
+        keys[fmt] = [cache.key(s, version, fmt) for s in sources]
+        images[fmt] = [cache.get(k, fmt) for k in keys[fmt]]
+        missing[fmt] = [i for i, image in enumerate(images[fmt]) if image is None]
+
+    start = time.perf_counter()
+    rendered = render_many_formats({fmt: [sources[i] for i in missing[fmt]] for fmt in formats})
+    if any(missing.values()):
+        # solo i render veri: un cache hit non dice niente sul costo del renderer
+        get_timing_history().record(render_work_class(puml_files[0].stem), time.perf_counter() - start)
+
+    for fmt in formats:
+        for i, image in zip(missing[fmt], rendered[fmt]):
+            cache.put(keys[fmt][i], fmt, image)
+            images[fmt][i] = image
+
+    outputs = []
+    for n, puml_path in enumerate(puml_files):
+        for fmt in formats:
+            image_path = puml_path.with_suffix(f".{fmt}")
+            image_path.write_bytes(images[fmt][n])
+            outputs.append(image_path)
+    return outputs
+
+
+def compile_plantuml_dir(diagrams_dir: Path, pattern: str = "*.puml",
+                         formats: Sequence[str] = ("png",)) -> List[Path]:
+    """Compila in un'unica chiamata tutti i diagrammi di una cartella."""
+    return compile_plantuml_files(sorted(Path(diagrams_dir).glob(pattern)), formats)
@@ -1,34 +1,85 @@
-import requests
+import asyncio
 import base64
-from typing import Dict
+from pathlib import Path
+from typing import Dict, Tuple, Union
 from PIL import Image
 import io
 
-LM_API_URL = "http://127.0.0.1:1234/v1/chat/completions"
+from src.documenter.llm_client import get_llm_client
+
 DEFAULT_MODEL = "minicpm-v-2_6"
 
+DEFAULT_MAX_SIZE = 800
+
+# encoding -> (formato PIL, mime, opzioni di salvataggio)
+# png-fast usa compressione zlib minima: payload un po' più grande, encode molto più veloce
+ENCODINGS = {
+    "png-fast": ("PNG", "image/png", {"compress_level": 1}),
+    "png-optimized": ("PNG", "image/png", {"optimize": True}),
+    "jpeg": ("JPEG", "image/jpeg", {"optimize": False}),
+    "webp": ("WEBP", "image/webp", {"method": 0}),
+}
+
+DEFAULT_ENCODING = "png-fast"
+DEFAULT_QUALITY = 85
+
+ImageInput = Union[bytes, str, Path]
+
 
-def encode_and_resize_image(image_path: str, max_size=800) -> str:
+def encode_image_bytes(image_bytes: bytes, max_size: int = DEFAULT_MAX_SIZE,
+                       encoding: str = DEFAULT_ENCODING,
+                       quality: int = DEFAULT_QUALITY) -> Tuple[str, str]:
     """
-    Ridimensiona immagine per evitare timeout Vision.
-    Mantiene proporzioni e comprime PNG.
+    Ridimensiona (se serve) e codifica un'immagine in memoria.
+    Restituisce (mime, base64).
+    Un PNG già entro max_size con encoding png-fast viene passato così com'è.
     """
-    img = Image.open(image_path)
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown image encoding '{encoding}'. Choose from: {', '.join(ENCODINGS)}")
+
+    fmt, mime, options = ENCODINGS[encoding]
+
+    img = Image.open(io.BytesIO(image_bytes))
+
+    if img.format == "PNG" and encoding == "png-fast" and max(img.size) <= max_size:
+        return mime, base64.b64encode(image_bytes).decode("utf-8")
 
     img.thumbnail((max_size, max_size))
 
+    options = dict(options)
+    if fmt in ("JPEG", "WEBP"):
+        options["quality"] = quality
+
+    if fmt == "JPEG" and img.mode != "RGB":
+        # niente alpha in JPEG: sfondo bianco come nei diagrammi PlantUML
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        img = background
+
     buffer = io.BytesIO()
-    img.save(buffer, format="PNG", optimize=True)
-    buffer.seek(0)
+    img.save(buffer, format=fmt, **options)
 
-    return base64.b64encode(buffer.read()).decode("utf-8")
+    return mime, base64.b64encode(buffer.getvalue()).decode("utf-8")
 
 
-def analyze_diagram(image_path, diagram_type="generic"):
+def encode_and_resize_image(image_path: str, max_size=DEFAULT_MAX_SIZE,
+                            encoding: str = DEFAULT_ENCODING) -> str:
+    """
+    Ridimensiona immagine per evitare timeout Vision.
+    Mantiene proporzioni e comprime secondo `encoding`.
+    """
+    _, image_base64 = encode_image_bytes(Path(image_path).read_bytes(), max_size, encoding)
+    return image_base64
 
-    # Ridimensionamento automatico
-    image_base64 = encode_and_resize_image(image_path)
 
+def _read_image(image: ImageInput) -> bytes:
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    return Path(image).read_bytes()
+
+
+def build_vision_payload(mime: str, image_base64: str, diagram_type: str) -> Dict:
     prompt_map = {
         "sequence": "Analyze this UML SEQUENCE diagram. Focus only on layout and alignment issues. Do NOT modify semantic structure.",
         "context": "Analyze this UML CONTEXT diagram. Focus only on layout and visual clarity.",
@@ -39,7 +90,7 @@ def analyze_diagram(image_path, diagram_type="generic"):
 
     prompt = prompt_map.get(diagram_type, "Analyze this UML diagram layout only.")
 
-    payload = {
+    return {
         "model": DEFAULT_MODEL,
         "messages": [
             {
@@ -49,7 +100,7 @@ def analyze_diagram(image_path, diagram_type="generic"):
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{image_base64}"
+                            "url": f"data:{mime};base64,{image_base64}"
                         }
                     }
                 ]
@@ -59,23 +110,53 @@ def analyze_diagram(image_path, diagram_type="generic"):
         "max_tokens": 500
     }
 
-    try:
-        response = requests.post(
-            LM_API_URL,
-            json=payload,
-            timeout=60  #  timeout ridotto ma più realistico
-        )
 
-        if response.status_code == 200:
-            return response.json()
+def _vision_result(response) -> Dict:
+    if response.status_code == 200:
+        return response.json()
 
+    return {
+        "error": "bad_status_code",
+        "status": response.status_code
+    }
+
+
+def analyze_diagram(image: ImageInput, diagram_type="generic",
+                    encoding: str = DEFAULT_ENCODING, quality: int = DEFAULT_QUALITY,
+                    max_size: int = DEFAULT_MAX_SIZE):
+    """
+    `image` può essere il path di un PNG o direttamente i byte
+    renderizzati in memoria (nessun passaggio da disco).
+    """
+    # Ridimensionamento automatico
+    mime, image_base64 = encode_image_bytes(_read_image(image), max_size, encoding, quality)
+    payload = build_vision_payload(mime, image_base64, diagram_type)
+
+    try:
+        return _vision_result(get_llm_client().chat(payload, call_type="vision"))
+
+    except Exception as e:
         return {
-            "error": "bad_status_code",
-            "status": response.status_code
+            "error": "timeout_or_connection_error",
+            "message": str(e)
         }
 
+
+async def analyze_diagram_async(image: ImageInput, diagram_type="generic",
+                                encoding: str = DEFAULT_ENCODING, quality: int = DEFAULT_QUALITY,
+                                max_size: int = DEFAULT_MAX_SIZE):
+    """Come analyze_diagram, con encoding in un thread e richiesta sul pool del client."""
+    loop = asyncio.get_running_loop()
+    mime, image_base64 = await loop.run_in_executor(
+        None, lambda: encode_image_bytes(_read_image(image), max_size, encoding, quality)
+    )
+    payload = build_vision_payload(mime, image_base64, diagram_type)
+
+    try:
+        return _vision_result(await get_llm_client().chat_async(payload, call_type="vision"))
+
     except Exception as e:
         return {
             "error": "timeout_or_connection_error",
             "message": str(e)
-        }
\ No newline at end of file
+        }
@@ -1,45 +1,297 @@
+import bisect
 import json
-from pathlib import Path
+import os
+import threading
+import time
 from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
+from src.documenter.kb_loader import FileLock
 
-def save_vision_feedback(base_dir: Path,
-                         diagram_type: str,
-                         architecture_id: str,
-                         feedback_text: str):
+
+SEGMENT_PREFIX = "history-"
+SEGMENT_SUFFIX = ".jsonl"
+
+DEFAULT_MAX_SEGMENT_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_SEGMENT_AGE = 7 * 24 * 3600
+# segmenti conservati: alla rotazione i più vecchi oltre il limite vengono cancellati
+DEFAULT_MAX_SEGMENTS = 52
+
+LEGACY_NAME = "history.json"
+MIGRATED_MARKER = "history.json.migrated"
+
+# (epoch, segment, offset, length)
+IndexEntry = Tuple[float, str, int, int]
+# maggiore di ogni nome di segmento, per cercare per epoch con bisect
+_LAST_SEGMENT = "\U0010ffff"
+
+
+def _epoch(timestamp: str) -> float:
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _insert_sorted(items: List[IndexEntry], item: IndexEntry):
+    # quasi sempre in coda; processi concorrenti possono interlacciarsi
+    if not items or items[-1] <= item:
+        items.append(item)
+    else:
+        bisect.insort(items, item)
+
+
+class VisionFeedbackStore:
     """
-    Salva lo storico dei feedback Vision in:
-    data/vision_feedback/history.json
-
-    Struttura:
-    [
-      {
-        timestamp,
-        architecture_id,
-        diagram_type,
-        feedback
-      }
-    ]
+    Append-only history of Vision feedbacks.
+
+    Entries are JSON lines in size/age-rotated segments
+    (`history-<created>.jsonl`). An in-memory index keyed by
+    (architecture_id, diagram_type) keeps byte offsets in time order,
+    so appends are O(1) and queries only read the lines they return.
+    Rotation keeps at most `max_segments` segments, dropping the oldest.
+    The legacy `history.json` array is copied into a segment once on first
+    open; the file itself is left in place and a marker records the migration.
     """
 
-    history_dir = base_dir / "data" / "vision_feedback"
-    history_dir.mkdir(parents=True, exist_ok=True)
+    def __init__(self, history_dir: Path,
+                 max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES,
+                 max_segment_age: float = DEFAULT_MAX_SEGMENT_AGE,
+                 max_segments: int = DEFAULT_MAX_SEGMENTS):
+        self.history_dir = Path(history_dir)
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.max_segments = max(1, max_segments)
+
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        self.lock_path = self.history_dir / "history.lock"
+
+        self._by_key: Dict[Tuple[str, str], List[IndexEntry]] = {}
+        self._all: List[IndexEntry] = []
+        self._scanned: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        with FileLock(self.lock_path):
+            self._migrate_legacy()
+        self._scan()
+
+    # -----------------------------
+    # Segments
+    # -----------------------------
+
+    def _segments(self) -> List[str]:
+        return sorted(
+            p.name for p in self.history_dir.iterdir()
+            if p.name.startswith(SEGMENT_PREFIX) and p.name.endswith(SEGMENT_SUFFIX)
+        )
+
+    @staticmethod
+    def _segment_created(name: str) -> float:
+        stamp = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+        try:
+            return int(stamp.split("-")[0]) / 1000.0
+        except ValueError:
+            return 0.0
+
+    def _new_segment_name(self) -> str:
+        # Nomi strettamente crescenti anche con rotazioni nello stesso millisecondo
+        created = int(time.time() * 1000)
+        segments = self._segments()
+        if segments:
+            created = max(created, int(self._segment_created(segments[-1]) * 1000) + 1)
+        return f"{SEGMENT_PREFIX}{created:015d}-{os.getpid()}{SEGMENT_SUFFIX}"
+
+    def _active_segment(self) -> str:
+        """Last segment, rotated when too large or too old."""
+        segments = self._segments()
+        if segments:
+            name = segments[-1]
+            size = (self.history_dir / name).stat().st_size
+            age = time.time() - self._segment_created(name)
+            if size < self.max_segment_bytes and age < self.max_segment_age:
+                return name
+            print(f"[VISION HISTORY] Rotating segment {name}")
+        return self._new_segment_name()
+
+    def _prune_segments(self):
+        """Deletes the oldest segments beyond `max_segments` (called under the file lock)."""
+        segments = self._segments()
+        for name in segments[:-self.max_segments]:
+            try:
+                (self.history_dir / name).unlink()
+            except FileNotFoundError:
+                continue
+            print(f"[VISION HISTORY] Dropped old segment {name}")
+
+    # -----------------------------
+    # Index
+    # -----------------------------
+
+    def _index_line(self, segment: str, offset: int, line: bytes):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return
+        item = (_epoch(entry.get("timestamp")), segment, offset, len(line))
+        key = (entry.get("architecture_id"), entry.get("diagram_type"))
+        _insert_sorted(self._by_key.setdefault(key, []), item)
+        _insert_sorted(self._all, item)
+
+    def _forget(self, removed: set):
+        self._all = [i for i in self._all if i[1] not in removed]
+        for key, items in list(self._by_key.items()):
+            items = [i for i in items if i[1] not in removed]
+            if items:
+                self._by_key[key] = items
+            else:
+                del self._by_key[key]
+        for segment in removed:
+            del self._scanned[segment]
 
-    history_file = history_dir / "history.json"
+    def _scan(self):
+        """Indexes lines appended since the last scan (also by other processes)."""
+        with self._lock:
+            segments = self._segments()
+            removed = set(self._scanned) - set(segments)
+            if removed:
+                self._forget(removed)
 
-    # Carica storico esistente
-    if history_file.exists():
-        with open(history_file, "r", encoding="utf-8") as f:
+            for segment in segments:
+                path = self.history_dir / segment
+                start = self._scanned.get(segment, 0)
+                if path.stat().st_size <= start:
+                    continue
+
+                offset = start
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # append in corso
+                        self._index_line(segment, offset, line)
+                        offset += len(line)
+                self._scanned[segment] = offset
+
+    def _read(self, item: IndexEntry) -> Optional[dict]:
+        _, segment, offset, length = item
+        try:
+            with open(self.history_dir / segment, "rb") as f:
+                f.seek(offset)
+                return json.loads(f.read(length))
+        except FileNotFoundError:
+            return None  # segmento cancellato da una rotazione concorrente
+
+    def _read_all(self, items: List[IndexEntry]) -> List[dict]:
+        return [entry for entry in map(self._read, items) if entry is not None]
+
+    # -----------------------------
+    # Append / query
+    # -----------------------------
+
+    def append(self, diagram_type: str, architecture_id: str, feedback_text: str) -> dict:
+        entry = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "architecture_id": architecture_id,
+            "diagram_type": diagram_type,
+            "feedback": feedback_text,
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with FileLock(self.lock_path):
+            segment = self._active_segment()
+            rotated = not (self.history_dir / segment).exists()
+            with open(self.history_dir / segment, "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            if rotated:
+                self._prune_segments()
+
+        self._scan()
+        return entry
+
+    def last_feedbacks(self, diagram_type: str, architecture_id: Optional[str] = None,
+                       limit: int = 5) -> List[dict]:
+        """Most recent feedbacks (newest first) for a diagram type, optionally per architecture."""
+        self._scan()
+        with self._lock:
+            if architecture_id is not None:
+                items = self._by_key.get((architecture_id, diagram_type), [])
+            else:
+                items = [
+                    i for (arch, dt), entries in self._by_key.items()
+                    if dt == diagram_type for i in entries
+                ]
+                items.sort()
+            selected = items[-limit:] if limit else list(items)
+        return self._read_all(list(reversed(selected)))
+
+    def since(self, timestamp: float) -> List[dict]:
+        """Feedbacks newer than an epoch timestamp, oldest first."""
+        self._scan()
+        with self._lock:
+            # _all è ordinato per epoch: la chiave sta dopo ogni voce con epoch == timestamp
+            start = bisect.bisect_right(self._all, (timestamp, _LAST_SEGMENT))
+            selected = self._all[start:]
+        return self._read_all(selected)
+
+    def __len__(self) -> int:
+        self._scan()
+        return len(self._all)
+
+    # -----------------------------
+    # Legacy migration
+    # -----------------------------
+
+    def _migrate_legacy(self):
+        legacy = self.history_dir / LEGACY_NAME
+        marker = self.history_dir / MIGRATED_MARKER
+        if not legacy.exists() or marker.exists() or self._segments():
+            return
+
+        with open(legacy, "r", encoding="utf-8") as f:
             history = json.load(f)
-    else:
-        history = []
 
-    history.append({
-        "timestamp": datetime.utcnow().isoformat(),
-        "architecture_id": architecture_id,
-        "diagram_type": diagram_type,
-        "feedback": feedback_text
-    })
+        segment = self.history_dir / self._new_segment_name()
+        tmp = segment.with_name(f"{segment.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in history:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp, segment)
+
+        # il file legacy è versionato: resta com'è, il marker evita una seconda migrazione
+        marker.write_text(f"{segment.name}\n", encoding="utf-8")
+        print(f"[VISION HISTORY] Migrated {len(history)} entries from history.json")
+
+
+_stores: Dict[Path, VisionFeedbackStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_vision_store(base_dir: Path) -> VisionFeedbackStore:
+    history_dir = (Path(base_dir) / "data" / "vision_feedback").resolve()
+    with _stores_lock:
+        if history_dir not in _stores:
+            _stores[history_dir] = VisionFeedbackStore(history_dir)
+        return _stores[history_dir]
+
+
+def save_vision_feedback(base_dir: Path,
+                         diagram_type: str,
+                         architecture_id: str,
+                         feedback_text: str):
+    """
+    Salva un feedback Vision nello storico append-only in:
+    data/vision_feedback/history-*.jsonl
+
+    Ogni riga:
+    { timestamp, architecture_id, diagram_type, feedback }
+    """
+    return get_vision_store(base_dir).append(diagram_type, architecture_id, feedback_text)
+
 
-    with open(history_file, "w", encoding="utf-8") as f:
-        json.dump(history, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+def last_vision_feedbacks(base_dir: Path, diagram_type: str,
+                          architecture_id: Optional[str] = None,
+                          limit: int = 5) -> List[dict]:
+    return get_vision_store(base_dir).last_feedbacks(diagram_type, architecture_id, limit)
@@ -1,11 +1,138 @@
+import hashlib
 import json
 import re
-import requests
-from typing import Any, List
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.documenter.llm_cache import get_llm_cache
+from src.documenter.llm_client import get_llm_client
 
-LM_API_URL = "http://127.0.0.1:1234/v1/completions"
 MODEL_NAME = "qwen2.5-coder-1.5b-instruct"
 
+EXTRACTION_PARAMS = {"temperature": 0, "max_tokens": 120}
+
+# Regole ammesse per tipo di diagramma (whitelist dell'estrattore)
+ALLOWED_RULES = {
+    "sequence_diagram": (
+        "require_user_actor",
+        "enforce_left_to_right_alignment",
+        "avoid_duplicate_participants",
+    ),
+}
+
+# Sotto questa confidenza il classificatore deterministico chiede all'LLM
+CONFIDENCE_THRESHOLD = 0.8
+
+# Punteggio oltre il quale una regola è considerata certa
+ACCEPT_SCORE = 1.0
+
+
+# =========================
+# DETERMINISTIC CLASSIFIER
+# =========================
+
+# rule -> [(pattern, peso)]; pesi negativi = evidenza contraria
+RULE_SIGNALS: Dict[str, List[Tuple[re.Pattern, float]]] = {
+    "require_user_actor": [
+        (re.compile(r"missing (main )?actor '?user'?"), 1.0),
+        (re.compile(r"add (an? )?actor '?user'?"), 1.0),
+        (re.compile(r"\b(no|without( an?)?) (user )?actor\b"), 0.6),
+        (re.compile(r"\buser\b.*\b(missing|absent|not (shown|present|represented))"), 0.6),
+        (re.compile(r"\bactor\b"), 0.2),
+        (re.compile(r"\buser\b.*\b(is|are) (present|shown|represented)"), -0.6),
+    ],
+    "enforce_left_to_right_alignment": [
+        (re.compile(r"not in left[ -]to[ -]right (interaction )?order"), 1.0),
+        (re.compile(r"left[ -]to[ -]right"), 0.6),
+        (re.compile(r"\b(misaligned|out of order|reorder)\b"), 0.4),
+        (re.compile(r"\balign(ment|ed)?\b"), 0.2),
+        (re.compile(r"\b(well|properly|correctly) (aligned|ordered)\b"), -0.6),
+    ],
+    "avoid_duplicate_participants": [
+        (re.compile(r"duplicate participants?"), 1.0),
+        (re.compile(r"\b(duplicated?|repeated|twice)\b.*\b(participants?|lifelines?)\b"), 0.8),
+        (re.compile(r"\b(participants?|lifelines?)\b.*\b(duplicated?|repeated|twice)\b"), 0.8),
+        (re.compile(r"\bno duplicate"), -1.0),
+    ],
+}
+
+# Righe del feedback strutturale che non implicano regole (note e già coperte)
+_NEUTRAL_LINES = (
+    re.compile(r"^structure ok\.?$"),
+    re.compile(r"^no participants defined\.?$"),
+    re.compile(r"^no message interactions defined\.?$"),
+    re.compile(r"^empty uml code\.?$"),
+    re.compile(r"^inconsistent arrow styles"),
+    re.compile(r"^participants declared after the first message"),
+    re.compile(r"^undeclared participants used in messages"),
+    re.compile(r"^user is declared as a service participant"),
+    re.compile(r"^actor user should be the first"),
+)
+
+# Parole che indicano che il testo parla di temi coperti dalle regole
+_TOPIC_WORDS = re.compile(r"\b(actor|user|participant|lifeline|order|left|right|align|duplicate)")
+
+
+def normalize_feedback_text(feedback: str) -> str:
+    """Minuscolo, spazi compressi: chiave stabile per la memoizzazione."""
+    return re.sub(r"\s+", " ", feedback.lower()).strip()
+
+
+def classify_feedback(diagram_type: str, feedback: str) -> Tuple[List[str], float]:
+    """
+    Classificatore deterministico con punteggio di confidenza.
+    Restituisce (regole, confidenza in [0, 1]).
+    """
+    allowed = ALLOWED_RULES.get(diagram_type, ())
+    if not allowed:
+        return [], 1.0
+
+    lines = [normalize_feedback_text(l) for l in feedback.splitlines()]
+    lines = [l for l in lines if l]
+    if not lines:
+        return [], 1.0
+
+    scores = {rule: 0.0 for rule in allowed}
+    unexplained = []
+
+    for line in lines:
+        matched = False
+        for rule in allowed:
+            for pattern, weight in RULE_SIGNALS.get(rule, ()):
+                if pattern.search(line):
+                    scores[rule] += weight
+                    matched = True
+        if not matched and not any(p.search(line) for p in _NEUTRAL_LINES):
+            unexplained.append(line)
+
+    rules = [rule for rule in allowed if scores[rule] >= ACCEPT_SCORE]
+
+    # Evidenza parziale su una regola -> incerto in proporzione
+    confidence = 1.0
+    for rule in allowed:
+        score = scores[rule]
+        if 0 < score < ACCEPT_SCORE:
+            confidence = min(confidence, 1.0 - score / ACCEPT_SCORE * 0.5 - 0.25)
+
+    # Testo libero che tocca i temi delle regole senza segnali chiari
+    if any(_TOPIC_WORDS.search(l) for l in unexplained):
+        confidence = min(confidence, 0.5)
+
+    return rules, max(0.0, confidence)
+
+
+def _fallback_rules(diagram_type: str, feedback: str) -> List[str]:
+    """
+    Fallback deterministico: se il modello non risponde bene,
+    usa il classificatore a regole.
+    """
+    rules, _ = classify_feedback(diagram_type, feedback)
+    return rules
+
+
+# =========================
+# LLM EXTRACTION
+# =========================
 
 def _normalize_feedback(text: Any) -> str:
     """Rende sempre stringa l'input, anche se arriva list/dict."""
@@ -30,38 +157,13 @@ def _extract_json_object(raw: str) -> str:
     return match.group(0).strip() if match else ""
 
 
-def _fallback_rules(diagram_type: str, feedback: str) -> List[str]:
-    """
-    Fallback deterministico: se il modello non risponde bene,
-    facciamo mapping semplice -> regole.
-    """
-    f = feedback.lower()
-
-    rules = []
-
-    # Sequence: user actor
-    if diagram_type == "sequence_diagram":
-        if ("missing" in f or "add" in f) and "actor" in f and "user" in f:
-            rules.append("require_user_actor")
-
-        if "left to right" in f or "left-to-right" in f:
-            rules.append("enforce_left_to_right_alignment")
-
-        if "duplicate" in f and ("participant" in f or "lifeline" in f):
-            rules.append("avoid_duplicate_participants")
-
-    return rules
-
-
-def extract_rules_from_feedback(diagram_type: str, vision_text: Any) -> List[str]:
+def _llm_rules(diagram_type: str, feedback: str) -> Optional[List[str]]:
     """
     Usa un LLM deterministico per estrarre regole strutturate dal feedback.
-    Se LLM fallisce/parsing fallisce -> fallback rule-based.
-    Restituisce una lista di rule names (stringhe).
+    Se LLM fallisce/parsing fallisce -> None (il chiamante usa il fallback).
     """
-    feedback = _normalize_feedback(vision_text)
-    if not feedback:
-        return []
+    allowed = ALLOWED_RULES.get(diagram_type, ())
+    allowed_text = "\n".join(f"- {r}" for r in allowed)
 
     prompt = f"""
 You are a strict rule extractor for UML diagram improvements.
@@ -70,9 +172,7 @@ Return ONLY valid JSON.
 No explanations. No markdown.
 
 Allowed rule names (use only these):
-- require_user_actor
-- enforce_left_to_right_alignment
-- avoid_duplicate_participants
+{allowed_text}
 
 Output format:
 {{
@@ -87,35 +187,32 @@ Feedback:
 
     # 1) Prova LLM
     try:
-        response = requests.post(
-            LM_API_URL,
-            json={
+        response = get_llm_client().completion(
+            {
                 "model": MODEL_NAME,
                 "prompt": prompt,
-                "temperature": 0,
-                "max_tokens": 120,
+                **EXTRACTION_PARAMS,
             },
-            timeout=25,
+            call_type="rule_extraction",
         )
 
         data = response.json()
         if "choices" not in data or not data["choices"]:
-            # fallback
-            return _fallback_rules(diagram_type, feedback)
+            return None
 
         raw_text = (data["choices"][0].get("text") or "").strip()
 
         # 2) Parsing robusto
         json_text = _extract_json_object(raw_text)
         if not json_text:
-            return _fallback_rules(diagram_type, feedback)
+            return None
 
         parsed = json.loads(json_text)
         rules = parsed.get("rules", [])
 
         # 3) Normalizza output
         if not isinstance(rules, list):
-            return _fallback_rules(diagram_type, feedback)
+            return None
 
         cleaned = []
         for r in rules:
@@ -123,15 +220,63 @@ Feedback:
                 cleaned.append(r.strip())
 
         # Se LLM ha sparato regole fuori whitelist -> fallback
-        whitelist = {
-            "require_user_actor",
-            "enforce_left_to_right_alignment",
-            "avoid_duplicate_participants",
-        }
-        cleaned = [r for r in cleaned if r in whitelist]
+        cleaned = [r for r in cleaned if r in allowed]
 
-        return cleaned if cleaned else _fallback_rules(diagram_type, feedback)
+        return cleaned or None
 
     except Exception:
         # fallback sicuro
-        return _fallback_rules(diagram_type, feedback)
\ No newline at end of file
+        return None
+
+
+# =========================
+# MEMOIZED ENTRY POINT
+# =========================
+
+_memo: Dict[str, List[str]] = {}
+_memo_lock = threading.Lock()
+
+
+def _memo_key(diagram_type: str, normalized: str) -> str:
+    return hashlib.sha256(f"{diagram_type}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def extract_rules_from_feedback(diagram_type: str, vision_text: Any) -> List[str]:
+    """
+    Estrae regole strutturate dal feedback.
+    1) memo per hash del feedback normalizzato (processo + cache LLM su disco)
+    2) classificatore deterministico, se sufficientemente sicuro
+    3) LLM solo per il testo ambiguo
+    Restituisce una lista di rule names (stringhe).
+    """
+    feedback = _normalize_feedback(vision_text)
+    if not feedback:
+        return []
+
+    normalized = normalize_feedback_text(feedback)
+    key = _memo_key(diagram_type, normalized)
+
+    with _memo_lock:
+        if key in _memo:
+            return list(_memo[key])
+
+    rules, confidence = classify_feedback(diagram_type, feedback)
+
+    if confidence < CONFIDENCE_THRESHOLD:
+        cache = get_llm_cache()
+        cache_key = cache.key(MODEL_NAME, normalized, {"diagram_type": diagram_type, **EXTRACTION_PARAMS})
+        cached = cache.get(cache_key)
+
+        if cached is not None:
+            rules = json.loads(cached)
+        else:
+            print(f"[RULE EXTRACTION] Ambiguous feedback (confidence {confidence:.2f}), asking LLM.")
+            llm_rules = _llm_rules(diagram_type, feedback)
+            if llm_rules is not None:
+                rules = llm_rules
+                cache.put(cache_key, MODEL_NAME, json.dumps(rules))
+
+    with _memo_lock:
+        _memo[key] = list(rules)
+
+    return list(rules)
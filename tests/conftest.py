@@ -0,0 +1,62 @@
+import shutil
+from pathlib import Path
+
+import pytest
+import requests
+
+from benchmarks.stubs import StubLLMClient, StubRenderer
+from src.documenter import llm_cache, llm_client, plantuml_renderer, render_cache, timing_history
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+KB_PATH = BASE_DIR / "data" / "kb" / "documentation_rules.json"
+INPUT_PATH = BASE_DIR / "data" / "input" / "finalArchitecture.json"
+ARCHITECTURE_ID = "Microservices Architecture"
+
+
+class CountingLLMClient(StubLLMClient):
+    """Stub LLM that counts the description streams it serves."""
+
+    def __init__(self):
+        self.streams = 0
+
+    def stream_chat(self, payload: dict, call_type: str):
+        self.streams += 1
+        yield from super().stream_chat(payload, call_type)
+
+
+class DroppingLLMClient(CountingLLMClient):
+    """Stub LLM whose streams break after a few tokens (server gone mid-answer)."""
+
+    def stream_chat(self, payload: dict, call_type: str):
+        self.streams += 1
+        yield "The architecture "
+        yield "decomposes "
+        raise requests.ConnectionError("Stream ended before the response was complete")
+
+
+@pytest.fixture
+def kb_path(tmp_path) -> Path:
+    """Private copy of the KB: learned rules and compactions stay in tmp_path."""
+    path = tmp_path / "kb" / KB_PATH.name
+    path.parent.mkdir()
+    shutil.copy(KB_PATH, path)
+    return path
+
+
+@pytest.fixture
+def stubs(tmp_path, monkeypatch):
+    """
+    Process-wide singletons replaced for one test: stub LLM and renderer,
+    caches and timing history under tmp_path. Returns a setter for the LLM client.
+    """
+    monkeypatch.setattr(llm_cache, "_cache", llm_cache.LLMResponseCache(tmp_path / "llm"))
+    monkeypatch.setattr(render_cache, "_cache", render_cache.RenderCache(tmp_path / "renders"))
+    monkeypatch.setattr(timing_history, "_history", timing_history.TimingHistory(tmp_path / "timings.json"))
+    monkeypatch.setattr(plantuml_renderer, "_renderers", {fmt: StubRenderer(fmt) for fmt in ("png", "svg")})
+
+    def use_client(client):
+        monkeypatch.setattr(llm_client, "_client", client)
+        return client
+
+    use_client(CountingLLMClient())
+    return use_client
@@ -0,0 +1,19 @@
+import pytest
+
+from src.documenter.main import parse_args
+
+
+@pytest.mark.parametrize("argv", [
+    ["--batch", "--refine"],
+    ["--input", "a.json", "--input", "b.json"],
+    ["--architecture", "A", "--architecture", "B"],
+])
+def test_unsupported_combinations_rejected(argv, capsys):
+    with pytest.raises(SystemExit):
+        parse_args(argv)
+    assert "error:" in capsys.readouterr().err
+
+
+def test_repeated_options_accepted_in_batch_mode():
+    args = parse_args(["--batch", "--input", "a.json", "--input", "b.json", "--architecture", "A"])
+    assert len(args.input) == 2
@@ -0,0 +1,47 @@
+from src.documenter.lm_integration import DescriptionCleaner
+
+RAW = (
+    "\n\n## Overview\n"
+    "The **API Gateway** routes requests to the services.\n\n\n"
+    "- 1. Orders are **persisted** first\n"
+    "* Payments follow\n"
+)
+CLEAN = (
+    "Overview\n"
+    "The API Gateway routes requests to the services.\n\n"
+    "Orders are persisted first\n"
+    "Payments follow"
+)
+
+
+def _stream(tokens):
+    cleaner = DescriptionCleaner()
+    pieces = [cleaner.feed(token) for token in tokens]
+    return pieces, cleaner.flush()
+
+
+def test_partial_line_released_before_flush():
+    tokens = ["The **API", " Gate", "way** routes", " requests ", "to the services"]
+    pieces, tail = _stream(tokens)
+
+    assert pieces[:3] == ["The API", " Gate", "way routes"]
+    assert "".join(pieces) + tail == "The API Gateway routes requests to the services"
+
+
+def test_line_start_held_until_settled():
+    cleaner = DescriptionCleaner()
+    assert cleaner.feed("  -") == ""
+    assert cleaner.feed(" 2") == ""
+    assert cleaner.feed(". Step") == "Step"
+    assert cleaner.feed(" two *") == " two"
+    assert cleaner.feed("*") == ""
+    assert cleaner.feed("x") == " x"
+
+
+def test_output_independent_of_token_boundaries():
+    whole, tail = _stream([RAW])
+    assert "".join(whole) + tail == CLEAN
+
+    for size in (1, 2, 3, 7):
+        pieces, tail = _stream(RAW[i:i + size] for i in range(0, len(RAW), size))
+        assert "".join(pieces) + tail == CLEAN
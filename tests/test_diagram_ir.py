@@ -0,0 +1,53 @@
+import pytest
+
+from benchmarks.synthetic import synthetic_input
+from src.documenter.diagram_ir import render_text
+from src.documenter.input_index import ArchitectureInput
+from src.documenter.models import ArchitectureModel
+from src.documenter.plantuml_parser import parse_plantuml
+from src.documenter.uml_generator import (
+    component_diagram_ir,
+    context_diagram_ir,
+    deployment_diagram_ir,
+    regenerated_sequence_ir,
+    security_diagram_ir,
+    sequence_diagram_ir,
+)
+
+from tests.conftest import ARCHITECTURE_ID, INPUT_PATH
+
+BUILDERS = {
+    "component": component_diagram_ir,
+    "deployment": deployment_diagram_ir,
+    "context": context_diagram_ir,
+    "security": security_diagram_ir,
+    "sequence": sequence_diagram_ir,
+    "sequence_with_rules": lambda model: sequence_diagram_ir(model, ["require_user_actor"]),
+    "sequence_regenerated": lambda model: regenerated_sequence_ir(model, "Missing main actor 'User'."),
+}
+
+
+def _models():
+    source = ArchitectureInput(INPUT_PATH)
+    yield "input", ArchitectureModel(source.architecture(ARCHITECTURE_ID))
+    yield "synthetic", ArchitectureModel(synthetic_input(40, 160, 7)["architectural_views"][0])
+
+
+MODELS = dict(_models())
+
+
+def _snapshot(diagram):
+    return {
+        "elements": [(e.kind, e.name, e.alias, e.line, e.parent, e.style) for e in diagram.elements],
+        "edges": [(e.source, e.target, e.arrow, e.label, e.line) for e in diagram.edges],
+        "directives": diagram.directives,
+        "notes": diagram.notes,
+        "line_count": diagram.line_count,
+    }
+
+
+@pytest.mark.parametrize("model_name", sorted(MODELS))
+@pytest.mark.parametrize("builder", sorted(BUILDERS))
+def test_analysis_view_matches_parsed_text(model_name, builder):
+    ir = BUILDERS[builder](MODELS[model_name])
+    assert _snapshot(ir.analysis_view()) == _snapshot(parse_plantuml(render_text(ir)))
@@ -0,0 +1,147 @@
+import re
+
+from src.documenter import tracing
+from src.documenter.build_manifest import MANIFEST_NAME, BuildManifest
+from src.documenter.document_builder import FRAGMENTS_DIR, DocumentSection, FragmentCache, write_document
+from src.documenter.main import run_documentation
+
+from tests.conftest import ARCHITECTURE_ID, INPUT_PATH, CountingLLMClient, DroppingLLMClient
+
+FULL_DESCRIPTION = "Each service owns its data and scales independently."
+
+
+def _run(docs_dir, kb_path, **kwargs):
+    return run_documentation(docs_dir, kb_path, INPUT_PATH, ARCHITECTURE_ID, formats=("md",), **kwargs)
+
+
+def _descriptions(docs_dir):
+    manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+    manifest.load()
+    return {name: entry.get("result") for name, entry in manifest.artifacts.items()
+            if name.startswith("description:")}
+
+
+# =========================
+# MANIFEST / DOCUMENT FRESHNESS
+# =========================
+
+def test_failed_description_is_not_recorded(tmp_path, kb_path, stubs):
+    docs_dir = tmp_path / "docs"
+    dropping = stubs(DroppingLLMClient())
+
+    _run(docs_dir, kb_path)
+
+    assert dropping.streams > 0
+    assert _descriptions(docs_dir) == {}
+    assert FULL_DESCRIPTION not in (docs_dir / "documentation.md").read_text(encoding="utf-8")
+
+
+def test_document_rebuilt_once_descriptions_complete(tmp_path, kb_path, stubs):
+    docs_dir = tmp_path / "docs"
+    stubs(DroppingLLMClient())
+    _run(docs_dir, kb_path)
+
+    # LLM di nuovo disponibile: le descrizioni mancanti vengono richieste
+    client = stubs(CountingLLMClient())
+    _run(docs_dir, kb_path)
+
+    descriptions = _descriptions(docs_dir)
+    assert client.streams == len(descriptions) > 0
+    assert all(FULL_DESCRIPTION in text for text in descriptions.values())
+    document = (docs_dir / "documentation.md").read_text(encoding="utf-8")
+    assert all(text in document for text in descriptions.values())
+
+    # niente di cambiato: nessuna chiamata e documento invariato
+    client = stubs(CountingLLMClient())
+    mtime = (docs_dir / "documentation.md").stat().st_mtime_ns
+    _run(docs_dir, kb_path)
+
+    assert client.streams == 0
+    assert (docs_dir / "documentation.md").stat().st_mtime_ns == mtime
+
+
+def test_document_from_fragments_is_byte_identical(tmp_path, kb_path, stubs, capsys):
+    docs_dir = tmp_path / "docs"
+    output_md = docs_dir / "documentation.md"
+
+    builds = []
+    for _ in range(3):
+        _run(docs_dir, kb_path)
+        builds.append(output_md.read_bytes())
+        output_md.unlink()  # forza il riassemblaggio dai frammenti
+    _run(docs_dir, kb_path, rebuild_all=True)
+    builds.append(output_md.read_bytes())
+
+    reused = re.findall(r"\((\d+)/(\d+) sections reused\)", capsys.readouterr().out)
+    assert [int(n) == int(total) for n, total in reused] == [False, False, True, False]
+    assert len(set(builds)) == 1
+
+
+def test_view_stages_traced_with_view_and_diagram_type(tmp_path, kb_path, stubs, monkeypatch):
+    monkeypatch.setattr(tracing, "_tracer", None)
+    tracer = tracing.enable_tracing()
+    _run(tmp_path / "docs", kb_path)
+
+    spans = {e["name"]: e["args"] for e in tracer.events if e["cat"] == "stage"}
+    for stage in ("generate", "compile", "describe"):
+        assert spans[f"{stage}:logical_view"]["view"] == "logical_view"
+        assert spans[f"{stage}:logical_view"]["diagram_type"] == "component_diagram"
+    assert "view" not in spans["assemble"]
+
+
+# =========================
+# FRAGMENTS
+# =========================
+
+def _counting_section(name, calls, inputs):
+    def render():
+        calls.append(name)
+        return [f"{name}\n"]
+    return DocumentSection(name, render, inputs)
+
+
+def test_fragments_reused_when_inputs_unchanged(tmp_path):
+    calls = []
+    sections = [_counting_section("a", calls, ["one"]), _counting_section("b", calls, ["two"])]
+    fragments = FragmentCache(tmp_path / FRAGMENTS_DIR)
+
+    first = write_document(tmp_path, sections, fragments).read_text(encoding="utf-8")
+    second = write_document(tmp_path, sections, fragments).read_text(encoding="utf-8")
+
+    assert calls == ["a", "b"]
+    assert first == second
+
+    changed = [sections[0], _counting_section("b", calls, ["changed"])]
+    write_document(tmp_path, changed, fragments)
+    assert calls == ["a", "b", "b"]
+
+
+def test_uncached_and_failed_sections_never_reused(tmp_path):
+    calls = []
+
+    def failing():
+        calls.append("partial")
+        yield "half a section\n"
+        raise RuntimeError("renderer failed")
+
+    fragments = FragmentCache(tmp_path / FRAGMENTS_DIR)
+    for _ in range(2):
+        sections = [_counting_section("stream", calls, None)]
+        write_document(tmp_path, sections, fragments)
+        try:
+            write_document(tmp_path, [DocumentSection("partial", failing, ["key"])], fragments)
+        except RuntimeError:
+            pass
+
+    assert calls == ["stream", "partial", "stream", "partial"]
+
+
+def test_rebuild_all_rewrites_fragments(tmp_path):
+    calls = []
+    sections = [_counting_section("a", calls, ["one"])]
+
+    write_document(tmp_path, sections, FragmentCache(tmp_path / FRAGMENTS_DIR))
+    write_document(tmp_path, sections, FragmentCache(tmp_path / FRAGMENTS_DIR, reuse=False))
+    write_document(tmp_path, sections, FragmentCache(tmp_path / FRAGMENTS_DIR))
+
+    assert calls == ["a", "a"]
@@ -0,0 +1,59 @@
+import json
+import multiprocessing
+
+from src.documenter import kb_loader
+from src.documenter.kb_loader import load_knowledge_base
+
+WORKERS = 4
+RULES_PER_WORKER = 12
+
+
+def _learn(args):
+    """Worker process: one rule per load, compacting every few entries."""
+    path, worker = args
+    kb_loader.COMPACT_AFTER_ENTRIES = 3
+    for i in range(RULES_PER_WORKER):
+        kb = load_knowledge_base(path)
+        kb.learn_rules("sequence_diagram", [f"test_rule_{worker}_{i}"])
+
+
+def _learned(kb):
+    return {rule for rule in kb.learned_rules if rule.startswith("test_rule_")}
+
+
+def test_journal_replayed_by_other_instances(kb_path):
+    writer = load_knowledge_base(kb_path)
+    reader = load_knowledge_base(kb_path)
+
+    assert writer.learn_rules("sequence_diagram", ["test_rule_a", "test_rule_a"]) == ["test_rule_a"]
+    assert writer.learn_rules("sequence_diagram", ["test_rule_a"]) == []
+
+    reader.refresh()
+    assert "test_rule_a" in reader.rules_for("sequence_diagram")
+    # nel journal, non ancora nel JSON
+    with open(kb_path, "r", encoding="utf-8") as f:
+        assert "test_rule_a" not in json.load(f)["learned_rules"]
+
+
+def test_compaction_seen_by_other_instances(kb_path):
+    writer = load_knowledge_base(kb_path)
+    reader = load_knowledge_base(kb_path)
+
+    writer.learn_rules("sequence_diagram", ["test_rule_a"])
+    reader.refresh()
+    writer.compact()
+    writer.learn_rules("sequence_diagram", ["test_rule_b"])
+
+    reader.refresh()
+    assert _learned(reader) == {"test_rule_a", "test_rule_b"}
+    with open(kb_path, "r", encoding="utf-8") as f:
+        assert "test_rule_a" in json.load(f)["learned_rules"]
+
+
+def test_concurrent_learning_with_compaction_loses_no_rule(kb_path):
+    with multiprocessing.get_context("spawn").Pool(WORKERS) as pool:
+        pool.map(_learn, [(kb_path, w) for w in range(WORKERS)])
+
+    kb = load_knowledge_base(kb_path)
+    assert len(_learned(kb)) == WORKERS * RULES_PER_WORKER
+    assert set(kb.rules_for("sequence_diagram")) >= _learned(kb)
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from src.documenter.partitioning import cross_edges, overview_levels, partition_graph
+
+
+def _random_graph(vertex_count: int, edge_count: int, seed: int):
+    rng = random.Random(seed)
+    vertices = [f"v{i}" for i in range(vertex_count)]
+    edges = [(rng.choice(vertices), rng.choice(vertices), rng.randint(1, 3)) for _ in range(edge_count)]
+    return vertices, edges
+
+
+def _assert_partition(parts, vertices, max_size):
+    assigned = [v for members in parts for v in members]
+    assert sorted(assigned) == sorted(set(vertices))
+    assert len(assigned) == len(set(assigned))
+    assert all(0 < len(members) <= max_size for members in parts)
+
+
+@pytest.mark.parametrize("vertex_count,edge_count", [(1, 0), (7, 3), (50, 200), (300, 80), (500, 2000)])
+@pytest.mark.parametrize("max_size", [2, 3, 10, 64])
+def test_every_vertex_assigned_once_within_limit(vertex_count, edge_count, max_size):
+    vertices, edges = _random_graph(vertex_count, edge_count, seed=vertex_count * max_size)
+    # duplicati ed estremi non dichiarati come negli input reali
+    parts = partition_graph(vertices + vertices[:5], edges, max_size)
+    _assert_partition(parts, vertices, max_size)
+
+
+def test_partition_is_deterministic():
+    vertices, edges = _random_graph(200, 600, seed=1)
+    assert partition_graph(vertices, edges, 10) == partition_graph(vertices, edges, 10)
+
+
+def test_empty_graph():
+    assert partition_graph([], [], 10) == []
+
+
+@pytest.mark.parametrize("max_size", [1, 0])
+def test_limit_below_two_rejected(max_size):
+    vertices, edges = _random_graph(10, 20, seed=3)
+    with pytest.raises(ValueError):
+        partition_graph(vertices, edges, max_size)
+    with pytest.raises(ValueError):
+        overview_levels(10, {}, max_size)
+
+
+@pytest.mark.parametrize("vertex_count,max_size", [(50, 3), (400, 10), (1000, 2), (10, 10)])
+def test_overview_levels_group_every_item_once(vertex_count, max_size):
+    vertices, edges = _random_graph(vertex_count, vertex_count * 3, seed=vertex_count)
+    parts = partition_graph(vertices, edges, max_size)
+    levels = overview_levels(len(parts), cross_edges(parts, edges), max_size)
+
+    count = len(parts)
+    for groups, _ in levels:
+        _assert_partition(groups, list(range(count)), max_size)
+        count = len(groups)
+
+    last_groups, _ = levels[-1]
+    assert len(last_groups) == 1
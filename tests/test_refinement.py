@@ -0,0 +1,32 @@
+from src.documenter import refinement
+from src.documenter.input_index import ArchitectureInput
+from src.documenter.kb_loader import load_knowledge_base
+from src.documenter.models import ArchitectureModel
+
+from tests.conftest import ARCHITECTURE_ID, INPUT_PATH
+
+
+def test_only_rule_driven_diagrams_learn(tmp_path, kb_path, stubs, monkeypatch):
+    analyzed = []
+
+    async def analyze(image, diagram_type):
+        analyzed.append(diagram_type)
+        return {"choices": [{"message": {"content": "Add the user actor; align left to right."}}]}
+
+    learned = iter(range(1000))
+    monkeypatch.setattr(refinement, "analyze_diagram_async", analyze)
+    monkeypatch.setattr(refinement, "extract_rules_from_feedback",
+                        lambda diagram_type, text: [f"test_rule_{next(learned)}"])
+
+    kb = load_knowledge_base(kb_path)
+    model = ArchitectureModel(ArchitectureInput(INPUT_PATH).architecture(ARCHITECTURE_ID))
+    reports = refinement.run_refinement(tmp_path / "diagrams", kb, model, max_iterations=3)
+
+    for diagram_type, report in reports.items():
+        if diagram_type == "sequence_diagram":
+            assert report.rules_learned
+        else:
+            assert report.iterations == 1
+            assert report.rules_learned == []
+            assert kb.rules_for(diagram_type) == []
+    assert analyzed.count("component") == 1